@@ -1,7 +1,18 @@
 """Administrative API endpoints."""
-from fastapi import APIRouter
+from __future__ import annotations
+
+import uuid
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.responses import Response
 from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from ..core.db import get_session
+from ..models import NamespaceMember
+from ..rag import retrieval
 
 router = APIRouter()
 
@@ -18,3 +29,41 @@ async def admin_metrics() -> Response:
 
     payload = generate_latest()
     return Response(content=payload, media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/vector-index", summary="Check that retrieval uses the vector index")
+async def admin_vector_index(
+    request: Request,
+    session: Session = Depends(get_session),
+    namespace_id: uuid.UUID = Query(...),
+    limit: int | None = Query(None, ge=1, le=1000),
+) -> dict[str, Any]:
+    """Return the EXPLAIN plan of the retrieval query for ``namespace_id``."""
+
+    user_id = _require_user_id(request)
+    _assert_namespace_membership(session, namespace_id, user_id)
+    try:
+        return retrieval.explain_vector_search(session, namespace_id, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc)) from exc
+
+
+def _require_user_id(request: Request) -> uuid.UUID:
+    # /admin is outside the session middleware's prefix, so read the session directly
+    raw_user_id = request.session.get("user_id")
+    if not raw_user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    try:
+        return uuid.UUID(str(raw_user_id))
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid session") from exc
+
+
+def _assert_namespace_membership(session: Session, namespace_id: uuid.UUID, user_id: uuid.UUID) -> None:
+    stmt: Select[Any] = select(NamespaceMember.id).where(
+        NamespaceMember.namespace_id == namespace_id,
+        NamespaceMember.user_id == user_id,
+    )
+    exists = session.execute(stmt).scalar_one_or_none()
+    if exists is None:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Namespace access denied")
@@ -9,6 +9,7 @@ from datetime import datetime, timezone
 from typing import Any, AsyncIterator, Dict, Iterable, List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import Select, select
@@ -203,7 +204,8 @@ async def chat_stream(
         )
         has_library_content = session.execute(doc_exists_stmt).scalar_one_or_none() is not None
 
-        retrieved_chunks = retrieval.retrieve(question, namespace_id, session=session)
+        # embedding and reranking block for up to RERANKER_BUDGET_MS; keep them off the event loop
+        retrieved_chunks = await run_in_threadpool(retrieval.retrieve, question, namespace_id, session=session)
         context, citations = _build_context(retrieved_chunks)
 
         conversation.updated_at = datetime.now(timezone.utc)
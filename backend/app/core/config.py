@@ -24,12 +24,34 @@ class Settings(BaseSettings):
     MINIO_PUBLIC_ENDPOINT: str | None = Field(default=None)
 
     EMBEDDING_MODEL_NAME: str = Field(default="sentence-transformers/all-MiniLM-L6-v2")
-    EMBEDDING_DIM: int = Field(default=1536)
+    # None: use the model's native dimension; see app/models/vector_types.py
+    EMBEDDING_DIM: int | None = Field(default=None)
+    EMBEDDING_STORAGE: str = Field(default="vector")
+
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(default=2048)
+    QUERY_EMBEDDING_CACHE_REDIS: bool = Field(default=False)
+    QUERY_EMBEDDING_CACHE_TTL: int = Field(default=7 * 24 * 3600)
 
     RETRIEVAL_TOP_K: int = Field(default=5)
     RETRIEVAL_USE_RERANKER: bool = Field(default=False)
     RERANKER_CANDIDATE_MULTIPLIER: int = Field(default=3)
+    RERANKER_BACKEND: str = Field(default="cross-encoder")
+    RERANKER_MODEL_NAME: str = Field(default="BAAI/bge-reranker-v2-m3")
+    RERANKER_BATCH_SIZE: int = Field(default=4)
+    RERANKER_MAX_PASSAGE_CHARS: int = Field(default=1200)
+    RERANKER_BUDGET_MS: float = Field(default=300.0)
+    RERANKER_CACHE_SIZE: int = Field(default=4096)
     RETRIEVAL_RELEVANCE_THRESHOLD: float = Field(default=0.55)
+    # Per-query ANN search breadth; raised to the candidate limit when lower
+    RETRIEVAL_HNSW_EF_SEARCH: int = Field(default=64)
+    RETRIEVAL_IVFFLAT_PROBES: int = Field(default=10)
+    RETRIEVAL_HYBRID: bool = Field(default=False)
+    RETRIEVAL_HYBRID_TRIGRAM: bool = Field(default=True)
+    RETRIEVAL_RRF_K: int = Field(default=60)
+    # Lexical ranks up to this one skip RETRIEVAL_RELEVANCE_THRESHOLD
+    RETRIEVAL_HYBRID_LEXICAL_BYPASS_RANKS: int = Field(default=3)
+    # {"<namespace slug or id>": {"vector": 1.0, "lexical": 1.0}}
+    RETRIEVAL_HYBRID_WEIGHTS: dict[str, dict[str, float]] = Field(default_factory=dict)
 
     OIDC_CLIENT_ID: str = Field(default="client-id")
     OIDC_CLIENT_SECRET: str = Field(default="client-secret")
@@ -38,6 +38,25 @@ TASK_RESULTS = Counter(
     ("task", "status"),
 )
 
+RERANK_REQUESTS = Counter(
+    "rag_rerank_requests_total",
+    "Rerank calls by outcome (scored/cached/budget_exceeded)",
+    ("outcome",),
+)
+
+RERANK_LATENCY = Histogram(
+    "rag_rerank_latency_seconds",
+    "Wall time of rerank calls, including waits for the reranker thread",
+    ("outcome",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    ("cache", "result"),
+)
+
 
 def record_request(method: str, path: str, status_code: int, duration: float) -> None:
     """Record counters and histograms for a processed HTTP request."""
@@ -36,7 +36,11 @@ def embed(
     model_name: str | None = None,
     embedding_dim: int | None = None,
 ) -> List[List[float]]:
-    """Generate embeddings for the provided chunks."""
+    """Generate embeddings for the provided chunks.
+
+    Vectors keep the model's native dimension unless ``embedding_dim`` (or the
+    ``EMBEDDING_DIM`` setting) asks for a fixed width.
+    """
 
     texts = [chunk.strip() for chunk in chunks if chunk and chunk.strip()]
     if not texts:
@@ -52,6 +56,8 @@ def embed(
     )
 
     target_dim = embedding_dim or settings.EMBEDDING_DIM
+    if not target_dim:
+        return [row.tolist() for row in embeddings]
     return [_pad_vector(row.tolist(), target_dim) for row in embeddings]
 
 
@@ -59,6 +65,11 @@ def embed(
 def embedding_dimension(model_name: str | None = None) -> int:
     """Return the dimension of the configured embedding model."""
 
+    from ..models.vector_types import KNOWN_EMBEDDING_DIMS
+
+    name = model_name or settings.EMBEDDING_MODEL_NAME
+    if name in KNOWN_EMBEDDING_DIMS:
+        return KNOWN_EMBEDDING_DIMS[name]
     model = get_model(model_name)
     vector = model.encode(["dimension probe"], convert_to_numpy=True)
     return int(vector.shape[1]) if hasattr(vector, "shape") else len(vector[0])
@@ -1,4 +1,10 @@
 """FastAPI application entry point for the RAG platform."""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi.errors import RateLimitExceeded
@@ -9,11 +15,28 @@ from .api import routes_admin, routes_auth, routes_chat, routes_crawl, routes_do
 from .core.config import settings
 from .core.middleware import AuthenticatedSessionMiddleware, RequestLoggingMiddleware
 from .core.rate_limiter import limiter, rate_limit_handler
+from .rag import ranker
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Load the cross-encoder before the app accepts requests.
+
+    A request arriving during the load would wait behind it and blow the
+    reranking budget, so startup waits until the model is ready.
+    """
+    if settings.RETRIEVAL_USE_RERANKER and settings.RERANKER_BACKEND != "lexical":
+        start = time.perf_counter()
+        await asyncio.wrap_future(ranker.get_reranker().warmup())
+        logger.info("Reranker %s loaded in %.1f s", settings.RERANKER_MODEL_NAME, time.perf_counter() - start)
+    yield
 
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
-    app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION)
+    app = FastAPI(title=settings.PROJECT_NAME, version=settings.VERSION, lifespan=lifespan)
 
     app.state.limiter = limiter
     app.add_exception_handler(RateLimitExceeded, rate_limit_handler)
@@ -1,13 +1,12 @@
 """Vector chunk metadata."""
 from __future__ import annotations
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, Text, func
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Text, func
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
-from pgvector.sqlalchemy import Vector
-
 from . import Base
+from .vector_types import embedding_column_type
 
 
 class Chunk(Base):
@@ -31,7 +30,9 @@ class Chunk(Base):
     token_count = Column(Integer, nullable=False, default=0)
     text = Column(Text, nullable=False)
     metadata_ = Column("metadata", JSONB, nullable=True)
-    vector = Column(Vector(1536), nullable=True)
+    vector = Column(embedding_column_type(), nullable=True)
+    # EMBEDDING_MODEL_NAME that produced ``vector``; NULL for rows written before it was recorded
+    embedding_model = Column(String, nullable=True)
     ordinal = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
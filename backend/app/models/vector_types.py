@@ -0,0 +1,67 @@
+"""Column type for stored embeddings.
+
+The width of ``chunks.vector`` follows the embedding model instead of a fixed
+1536 dimensions, and ``EMBEDDING_STORAGE=halfvec`` stores it as pgvector
+``halfvec`` (2 bytes per dimension, pgvector >= 0.7).
+"""
+from __future__ import annotations
+
+from pgvector.sqlalchemy import Vector
+
+from ..core.config import settings
+
+# Output sizes of common sentence-transformers models, so that importing the
+# models does not have to load one just to learn its dimension.
+KNOWN_EMBEDDING_DIMS: dict[str, int] = {
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "sentence-transformers/all-MiniLM-L12-v2": 384,
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2": 384,
+    "sentence-transformers/all-mpnet-base-v2": 768,
+    "sentence-transformers/paraphrase-multilingual-mpnet-base-v2": 768,
+    "intfloat/multilingual-e5-base": 768,
+    "intfloat/multilingual-e5-large": 1024,
+    "BAAI/bge-m3": 1024,
+}
+
+STORAGE_TYPES = ("vector", "halfvec")
+
+
+class HalfVector(Vector):
+    """``halfvec(n)``; values are exchanged as the same text literal as ``vector``."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "HALFVEC"
+        return "HALFVEC(%d)" % self.dim
+
+
+def configured_embedding_dim() -> int:
+    """Dimension of ``chunks.vector``: ``EMBEDDING_DIM`` if set, else the known model's size.
+
+    This runs when the models are imported, so it never loads the model; an
+    unknown model needs an explicit ``EMBEDDING_DIM``.
+    """
+
+    if settings.EMBEDDING_DIM:
+        return settings.EMBEDDING_DIM
+    try:
+        return KNOWN_EMBEDDING_DIMS[settings.EMBEDDING_MODEL_NAME]
+    except KeyError:
+        raise ValueError(
+            f"Unknown embedding dimension for EMBEDDING_MODEL_NAME={settings.EMBEDDING_MODEL_NAME!r}; "
+            "set EMBEDDING_DIM to the model's output size"
+        ) from None
+
+
+def embedding_storage() -> str:
+    storage = settings.EMBEDDING_STORAGE.lower()
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"EMBEDDING_STORAGE must be one of {STORAGE_TYPES}, got {settings.EMBEDDING_STORAGE!r}")
+    return storage
+
+
+def embedding_column_type() -> Vector:
+    dim = configured_embedding_dim()
+    return HalfVector(dim) if embedding_storage() == "halfvec" else Vector(dim)
@@ -0,0 +1,168 @@
+"""Two-tier cache for query embeddings.
+
+Chat turns repeat questions often enough that embedding every turn shows up in
+latency. ``embed_query`` looks in an in-process LRU first, then (with
+``QUERY_EMBEDDING_CACHE_REDIS``) in Redis. Redis stores the raw float32 bytes,
+so every API worker shares its entries. Keys combine the embedding model,
+the configured dimension and the query text after NFKC and whitespace
+normalization. Case is kept, because cased models embed "VPN" and "vpn"
+differently. Changing ``EMBEDDING_MODEL_NAME`` or ``EMBEDDING_DIM``
+therefore never returns a stale vector, and the in-process tier is cleared
+when it notices the change.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, List
+
+import numpy as np
+
+from ..core.config import settings
+from ..core.metrics import CACHE_REQUESTS
+from ..ingest import embeddings
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "rag:qemb:"
+# Skip Redis for this long after an error instead of paying its timeout on every turn
+REDIS_RETRY_AFTER = 30.0
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def model_tag() -> str:
+    return f"{settings.EMBEDDING_MODEL_NAME}:{settings.EMBEDDING_DIM or 'native'}"
+
+
+def cache_key(tag: str, text: str) -> str:
+    digest = hashlib.sha256(f"{tag}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+    return REDIS_KEY_PREFIX + digest
+
+
+class QueryEmbeddingCache:
+    """In-process LRU in front of an optional Redis client."""
+
+    def __init__(self, maxsize: int = 2048, redis_client: Any = None, ttl: int = 7 * 24 * 3600) -> None:
+        self.maxsize = maxsize
+        self.redis = redis_client
+        self.ttl = ttl
+        self._data: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self._tag: str | None = None
+        self._redis_down_until = 0.0
+
+    def _check_tag(self, tag: str) -> None:
+        if tag != self._tag:
+            if self._tag is not None:
+                logger.info("Embedding model changed to %s; clearing query embedding cache", tag)
+            self._data.clear()
+            self._tag = tag
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, exc: Exception) -> None:
+        logger.warning("Query embedding cache: Redis unavailable (%s); retrying in %.0fs", exc, REDIS_RETRY_AFTER)
+        self._redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+
+    def get(self, tag: str, text: str) -> np.ndarray | None:
+        key = cache_key(tag, text)
+        with self._lock:
+            self._check_tag(tag)
+            vector = self._data.get(key)
+            if vector is not None:
+                self._data.move_to_end(key)
+        CACHE_REQUESTS.labels("query_embedding_memory", "hit" if vector is not None else "miss").inc()
+        if vector is not None or not self._redis_available():
+            return vector
+
+        try:
+            raw = self.redis.get(key)
+        except Exception as exc:  # redis.RedisError and socket errors
+            self._redis_failed(exc)
+            return None
+        CACHE_REQUESTS.labels("query_embedding_redis", "hit" if raw else "miss").inc()
+        if not raw:
+            return None
+        vector = np.frombuffer(raw, dtype=np.float32)
+        self._remember(tag, key, vector)
+        return vector
+
+    def put(self, tag: str, text: str, vector: Any) -> np.ndarray:
+        key = cache_key(tag, text)
+        array = np.asarray(vector, dtype=np.float32)
+        self._remember(tag, key, array)
+        if self._redis_available():
+            try:
+                self.redis.set(key, array.tobytes(), ex=self.ttl)
+            except Exception as exc:
+                self._redis_failed(exc)
+        return array
+
+    def _remember(self, tag: str, key: str, vector: np.ndarray) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_tag(tag)
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_cache_lock = threading.Lock()
+_cache: QueryEmbeddingCache | None = None
+
+
+def _redis_client() -> Any:
+    import redis
+
+    return redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.1, socket_connect_timeout=0.1)
+
+
+def get_cache() -> QueryEmbeddingCache:
+    """Return the process-wide query embedding cache."""
+
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            client = _redis_client() if settings.QUERY_EMBEDDING_CACHE_REDIS else None
+            _cache = QueryEmbeddingCache(
+                maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE,
+                redis_client=client,
+                ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+            )
+    return _cache
+
+
+def embed_query(text: str) -> List[float] | None:
+    """Return the embedding of ``text``, computing it only on a cache miss.
+
+    The normalized text is embedded, so every spelling that shares a cache
+    key also shares the vector stored under it.
+    """
+
+    cache = get_cache()
+    tag = model_tag()
+    text = normalize_query(text)
+    vector = cache.get(tag, text)
+    if vector is None:
+        vectors = embeddings.embed([text])
+        if not vectors:
+            return None
+        vector = cache.put(tag, text, vectors[0])
+    return vector.tolist()
@@ -1,14 +1,218 @@
-"""Lightweight reranking utilities for retrieval results."""
+"""Reranking of retrieval results.
+
+``rerank`` scores (query, passage) pairs with a cross-encoder. Scores are
+computed in batches on a single worker thread and cached per
+``(model, query, chunk_id)``. Reranking has a hard latency budget: if the
+uncached pairs are not scored within ``RERANKER_BUDGET_MS`` the results keep
+their ANN order, and the worker stops after its current batch. Batches are
+small so that an overrun is short. Scores that were computed are still
+cached, so a repeated question can use them.
+``RERANKER_BACKEND=lexical`` selects the term-overlap heuristic instead.
+
+``rerank`` blocks its caller for up to the budget, so async code must call it
+(or ``retrieval.retrieve``) from a worker thread. Concurrent requests share the
+scoring worker; the budget counts from submission, so time spent waiting
+behind another request's batches falls back to ANN order instead of adding
+latency. While the worker is still busy with work whose budget has already run
+out, new requests are not queued at all and keep their ANN order at once.
+"""
 from __future__ import annotations
 
+import logging
 import re
-from typing import List, Sequence, TYPE_CHECKING
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Hashable, List, Sequence, TYPE_CHECKING
+
+from ..core.config import settings
+from ..core.metrics import CACHE_REQUESTS, RERANK_LATENCY, RERANK_REQUESTS
 
 if TYPE_CHECKING:  # pragma: no cover - typing aid only
+    from sentence_transformers import CrossEncoder
+
     from .retrieval import RetrievedChunk
 
+logger = logging.getLogger(__name__)
 
-def rerank(query: str, results: Sequence["RetrievedChunk"]) -> List["RetrievedChunk"]:
+_model_lock = threading.Lock()
+_cached_model: "CrossEncoder | None" = None
+_cached_model_name: str | None = None
+_reranker_lock = threading.Lock()
+_reranker: "CrossEncoderReranker | None" = None
+
+
+def get_model(model_name: str | None = None) -> "CrossEncoder":
+    """Return a cached cross-encoder instance."""
+
+    from sentence_transformers import CrossEncoder
+
+    name = model_name or settings.RERANKER_MODEL_NAME
+
+    global _cached_model, _cached_model_name
+    with _model_lock:
+        if _cached_model is None or _cached_model_name != name:
+            logger.info("Loading reranker model: %s", name)
+            _cached_model = CrossEncoder(name, max_length=512)
+            _cached_model_name = name
+    return _cached_model
+
+
+class ScoreCache:
+    """Thread-safe LRU of cross-encoder scores."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> float | None:
+        with self._lock:
+            score = self._data.get(key)
+            if score is not None:
+                self._data.move_to_end(key)
+            return score
+
+    def put(self, key: Hashable, score: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CrossEncoderReranker:
+    """Batched cross-encoder scoring with a score cache and a latency budget."""
+
+    def __init__(
+        self,
+        model_name: str,
+        *,
+        batch_size: int = 4,
+        max_passage_chars: int = 1200,
+        budget_seconds: float = 0.3,
+        cache_size: int = 4096,
+        model_loader: Callable[[str], "CrossEncoder"] = get_model,
+    ) -> None:
+        self.model_name = model_name
+        self.batch_size = max(batch_size, 1)
+        self.max_passage_chars = max_passage_chars
+        self.budget_seconds = budget_seconds
+        self.cache = ScoreCache(cache_size)
+        self._model_loader = model_loader
+        # one worker: the model is not shared across concurrent predict calls
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self._queue_lock = threading.Lock()
+        self._pending = 0
+        self._last_deadline = 0.0
+
+    def warmup(self) -> "Future[CrossEncoder]":
+        """Load the model on the worker thread; the returned future completes once it is loaded."""
+
+        return self._executor.submit(self._model_loader, self.model_name)
+
+    def passage(self, chunk: "RetrievedChunk") -> str:
+        text = chunk.text
+        if self.max_passage_chars > 0 and len(text) > self.max_passage_chars:
+            text = text[: self.max_passage_chars]
+        return f"{chunk.title}\n{text}" if chunk.title else text
+
+    def _key(self, query: str, chunk: "RetrievedChunk") -> Hashable:
+        return (self.model_name, query, chunk.chunk_id)
+
+    def _submit(self, query: str, chunks: Sequence["RetrievedChunk"], deadline: float) -> "Future[None] | None":
+        """Queue a scoring job, or return None while the worker is behind its last job's budget."""
+
+        with self._queue_lock:
+            if self._pending and time.monotonic() > self._last_deadline:
+                return None
+            self._pending += 1
+            self._last_deadline = deadline
+        return self._executor.submit(self._score_batches, query, chunks, deadline)
+
+    def _score_batches(self, query: str, chunks: Sequence["RetrievedChunk"], deadline: float) -> None:
+        try:
+            self._score_until(query, chunks, deadline)
+        finally:
+            with self._queue_lock:
+                self._pending -= 1
+
+    def _score_until(self, query: str, chunks: Sequence["RetrievedChunk"], deadline: float) -> None:
+        model = self._model_loader(self.model_name)
+        for start in range(0, len(chunks), self.batch_size):
+            if time.monotonic() > deadline:
+                return
+            batch = chunks[start : start + self.batch_size]
+            scores = model.predict(
+                [(query, self.passage(chunk)) for chunk in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+            for chunk, score in zip(batch, scores):
+                self.cache.put(self._key(query, chunk), float(score))
+
+    def rerank(self, query: str, results: Sequence["RetrievedChunk"]) -> List["RetrievedChunk"]:
+        """Return ``results`` sorted by cross-encoder score, or unchanged on timeout."""
+
+        if len(results) < 2:
+            return list(results)
+
+        start = time.perf_counter()
+        missing = [chunk for chunk in results if self.cache.get(self._key(query, chunk)) is None]
+        CACHE_REQUESTS.labels("rerank", "hit").inc(len(results) - len(missing))
+        CACHE_REQUESTS.labels("rerank", "miss").inc(len(missing))
+
+        outcome = "cached"
+        if missing:
+            outcome = "scored"
+            deadline = time.monotonic() + self.budget_seconds
+            future = self._submit(query, missing, deadline)
+            if future is None:
+                outcome = "budget_exceeded"
+            else:
+                try:
+                    future.result(timeout=self.budget_seconds)
+                except FutureTimeoutError:
+                    outcome = "budget_exceeded"
+
+        scores = [self.cache.get(self._key(query, chunk)) for chunk in results]
+        if any(score is None for score in scores):
+            # the worker stopped at the deadline between two batches
+            outcome = "budget_exceeded"
+        RERANK_REQUESTS.labels(outcome).inc()
+        RERANK_LATENCY.labels(outcome).observe(time.perf_counter() - start)
+        if outcome == "budget_exceeded":
+            logger.info("Reranking exceeded %.0f ms; keeping ANN order", self.budget_seconds * 1000)
+            return list(results)
+
+        for chunk, score in zip(results, scores):
+            chunk.rerank_score = score
+        return sorted(results, key=lambda chunk: chunk.rerank_score, reverse=True)
+
+
+def get_reranker() -> CrossEncoderReranker:
+    """Return the process-wide reranker for the current settings."""
+
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None or _reranker.model_name != settings.RERANKER_MODEL_NAME:
+            _reranker = CrossEncoderReranker(
+                settings.RERANKER_MODEL_NAME,
+                batch_size=settings.RERANKER_BATCH_SIZE,
+                max_passage_chars=settings.RERANKER_MAX_PASSAGE_CHARS,
+                budget_seconds=settings.RERANKER_BUDGET_MS / 1000.0,
+                cache_size=settings.RERANKER_CACHE_SIZE,
+            )
+    return _reranker
+
+
+def lexical_rerank(query: str, results: Sequence["RetrievedChunk"]) -> List["RetrievedChunk"]:
     """Sort results using a simple lexical overlap heuristic."""
 
     terms = {
@@ -27,3 +231,11 @@ def rerank(query: str, results: Sequence["RetrievedChunk"]) -> List["RetrievedCh
 
     sorted_results = sorted(results, key=overlap_score, reverse=True)
     return sorted_results
+
+
+def rerank(query: str, results: Sequence["RetrievedChunk"]) -> List["RetrievedChunk"]:
+    """Rerank with the configured backend (``cross-encoder`` or ``lexical``)."""
+
+    if settings.RERANKER_BACKEND == "lexical":
+        return lexical_rerank(query, results)
+    return get_reranker().rerank(query, results)
@@ -1,23 +1,32 @@
 """Vector retrieval utilities used by the chat endpoints."""
 from __future__ import annotations
 
+import json
 import logging
 import math
+import re
 import uuid
 from dataclasses import dataclass
-from typing import List, Sequence
+from typing import Any, List, Sequence
 
-from sqlalchemy import Select, select
+from sqlalchemy import Float, Select, func, literal, literal_column, or_, select, text
 from sqlalchemy.orm import Session
 
 from ..core.config import settings
-from ..ingest import embeddings
-from ..models import Chunk, Document
+from ..models import Chunk, Document, Namespace
 from ..models.documents import DocumentStatus
-from . import ranker
+from . import query_cache, ranker
 
 logger = logging.getLogger(__name__)
 
+# Must match the expression of ix_chunks_text_fts (migration 0008)
+TS_CONFIG = literal_column("'simple'::regconfig")
+# Words of the lexical query; \w never contains tsquery operators or quotes
+LEXEME_RE = re.compile(r"\w{2,}")
+MAX_LEXICAL_TERMS = 16
+# Trigram similarity of shorter terms matches almost every chunk
+MIN_TRIGRAM_TERM_CHARS = 3
+
 
 @dataclass(slots=True)
 class RetrievedChunk:
@@ -30,6 +39,17 @@ class RetrievedChunk:
     ordinal: int
     title: str | None
     metadata: dict | None
+    lexical_rank: int | None = None
+    rerank_score: float | None = None
+
+
+def _current_vectors() -> tuple[Any, ...]:
+    """Chunks with a vector from ``EMBEDDING_MODEL_NAME`` (or from an unrecorded model)."""
+
+    return (
+        Chunk.vector.isnot(None),
+        or_(Chunk.embedding_model.is_(None), Chunk.embedding_model == settings.EMBEDDING_MODEL_NAME),
+    )
 
 
 def _build_query_statement(vector: Sequence[float], namespace_id: uuid.UUID, limit: int) -> Select:
@@ -49,7 +69,7 @@ def _build_query_statement(vector: Sequence[float], namespace_id: uuid.UUID, lim
         .join(Document, Document.id == Chunk.document_id)
         .where(
             Chunk.namespace_id == namespace_id,
-            Chunk.vector.isnot(None),
+            *_current_vectors(),
             Document.status == DocumentStatus.INGESTED.value,
             Document.deleted_at.is_(None),
         )
@@ -59,6 +79,195 @@ def _build_query_statement(vector: Sequence[float], namespace_id: uuid.UUID, lim
     return stmt
 
 
+def _hybrid_weights(session: Session, namespace_id: uuid.UUID) -> tuple[float, float]:
+    """Return ``(vector, lexical)`` RRF weights; namespaces are matched by id or slug."""
+
+    weights = settings.RETRIEVAL_HYBRID_WEIGHTS
+    entry = weights.get(str(namespace_id))
+    if entry is None and weights:
+        namespace = session.get(Namespace, namespace_id)
+        entry = weights.get(namespace.slug) if namespace is not None else None
+    entry = entry or {}
+    return float(entry.get("vector", 1.0)), float(entry.get("lexical", 1.0))
+
+
+# pg_trgm is optional (migration 0002 installs it only where available); keyed by database URL
+_trigram_support: dict[str, bool] = {}
+
+
+def _trigram_enabled(session: Session) -> bool:
+    """``RETRIEVAL_HYBRID_TRIGRAM`` is on and pg_trgm is installed; checked once per database."""
+
+    if not settings.RETRIEVAL_HYBRID_TRIGRAM:
+        return False
+    bind = session.get_bind()
+    key = str(getattr(getattr(bind, "engine", bind), "url", ""))
+    available = _trigram_support.get(key)
+    if available is None:
+        available = bool(session.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar())
+        if not available:
+            logger.warning("pg_trgm is not installed; hybrid retrieval runs without trigram matching")
+        _trigram_support[key] = available
+    return available
+
+
+def _lexical_terms(query: str) -> List[str]:
+    """Distinct lowercased words of ``query`` in order, at most ``MAX_LEXICAL_TERMS``."""
+
+    return list(dict.fromkeys(word.lower() for word in LEXEME_RE.findall(query)))[:MAX_LEXICAL_TERMS]
+
+
+def _build_hybrid_statement(
+    vector: Sequence[float],
+    query: str,
+    namespace_id: uuid.UUID,
+    limit: int,
+    weights: tuple[float, float],
+    trigram: bool = False,
+) -> Select:
+    """Return one statement fusing vector and lexical candidates with reciprocal rank fusion.
+
+    Each side contributes ``weight / (RETRIEVAL_RRF_K + rank)`` for its top
+    ``limit`` chunks. The lexical side ORs the words of ``query``, so a chunk
+    matching "Fehler 809" is found for a whole question about it; ``ts_rank_cd``
+    ranks chunks that match more of the words higher. With ``trigram``, each
+    word is also matched with pg_trgm word similarity, which catches parts of
+    German compounds and codes that the tokenizer splits.
+    """
+
+    # both sides skip stale vectors, or lexical hits would bring them back without a usable distance
+    visible = (
+        Chunk.namespace_id == namespace_id,
+        Document.status == DocumentStatus.INGESTED.value,
+        Document.deleted_at.is_(None),
+        *_current_vectors(),
+    )
+    distance = Chunk.vector.cosine_distance(vector)
+    vector_hits = (
+        select(Chunk.id.label("chunk_id"), func.row_number().over(order_by=distance).label("rank"))
+        .join(Document, Document.id == Chunk.document_id)
+        .where(*visible)
+        .order_by(distance)
+        .limit(limit)
+        .cte("vector_hits")
+    )
+
+    terms = _lexical_terms(query)
+    tsvector = func.to_tsvector(TS_CONFIG, Chunk.text)
+    tsquery = func.to_tsquery(TS_CONFIG, " | ".join(terms))
+    match = tsvector.op("@@")(tsquery)
+    lexical_score = func.ts_rank_cd(tsvector, tsquery)
+    if trigram:
+        for term in terms:
+            if len(term) >= MIN_TRIGRAM_TERM_CHARS:
+                match = match | literal(term).op("<%")(Chunk.text)
+                lexical_score = lexical_score + func.word_similarity(term, Chunk.text)
+    lexical_hits = (
+        select(Chunk.id.label("chunk_id"), func.row_number().over(order_by=lexical_score.desc()).label("rank"))
+        .join(Document, Document.id == Chunk.document_id)
+        .where(*visible, match)
+        .order_by(lexical_score.desc())
+        .limit(limit)
+        .cte("lexical_hits")
+    )
+
+    k = float(max(settings.RETRIEVAL_RRF_K, 1))
+    vector_weight, lexical_weight = (literal(w, Float) for w in weights)
+    rrf = func.coalesce(vector_weight / (vector_hits.c.rank + k), 0.0) + func.coalesce(
+        lexical_weight / (lexical_hits.c.rank + k), 0.0
+    )
+    fused = (
+        select(
+            func.coalesce(vector_hits.c.chunk_id, lexical_hits.c.chunk_id).label("chunk_id"),
+            rrf.label("rrf"),
+            lexical_hits.c.rank.label("lexical_rank"),
+        )
+        .select_from(
+            vector_hits.join(lexical_hits, vector_hits.c.chunk_id == lexical_hits.c.chunk_id, full=True)
+        )
+        .cte("fused")
+    )
+
+    return (
+        select(
+            Chunk.id.label("chunk_id"),
+            Chunk.document_id.label("document_id"),
+            Chunk.text.label("text"),
+            Chunk.metadata_.label("metadata"),
+            Chunk.ordinal.label("ordinal"),
+            Document.title.label("title"),
+            distance.label("distance"),
+            fused.c.lexical_rank,
+        )
+        .select_from(fused)
+        .join(Chunk, Chunk.id == fused.c.chunk_id)
+        .join(Document, Document.id == Chunk.document_id)
+        .order_by(fused.c.rrf.desc())
+        .limit(limit)
+    )
+
+
+def _is_postgres(session: Session) -> bool:
+    get_bind = getattr(session, "get_bind", None)
+    return get_bind is not None and get_bind().dialect.name == "postgresql"
+
+
+def _apply_search_settings(session: Session, limit: int) -> None:
+    """Set transaction-local ANN search parameters for the next vector query.
+
+    HNSW returns at most ``ef_search`` rows, so it is raised to ``limit``.
+    """
+
+    if not _is_postgres(session):
+        return
+    session.execute(
+        text("SELECT set_config('hnsw.ef_search', :ef_search, true), set_config('ivfflat.probes', :probes, true)"),
+        {
+            "ef_search": str(max(settings.RETRIEVAL_HNSW_EF_SEARCH, limit)),
+            "probes": str(max(settings.RETRIEVAL_IVFFLAT_PROBES, 1)),
+        },
+    )
+
+
+def _plan_index_names(plan: Any) -> List[str]:
+    names: List[str] = []
+    if isinstance(plan, dict):
+        if "Index Name" in plan:
+            names.append(plan["Index Name"])
+        for value in plan.values():
+            names.extend(_plan_index_names(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            names.extend(_plan_index_names(item))
+    return names
+
+
+def explain_vector_search(session: Session, namespace_id: uuid.UUID, limit: int | None = None) -> dict:
+    """Run EXPLAIN on the retrieval query and report whether it uses a vector index.
+
+    Returns ``{"uses_vector_index": bool, "indexes": [...], "plan": ...}``.
+    Small tables are legitimately served by a sequential scan, so run this
+    against production-sized data. Raises ``ValueError`` on other databases.
+    """
+
+    if not _is_postgres(session):
+        raise ValueError("Vector index check requires PostgreSQL")
+
+    candidate_limit = limit or settings.RETRIEVAL_TOP_K * settings.RERANKER_CANDIDATE_MULTIPLIER
+    probe = [1.0] + [0.0] * (Chunk.__table__.c.vector.type.dim - 1)
+    stmt = _build_query_statement(probe, namespace_id, candidate_limit)
+    compiled = stmt.compile(dialect=session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    _apply_search_settings(session, candidate_limit)
+    raw = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+    plan = json.loads(raw) if isinstance(raw, str) else raw
+    indexes = _plan_index_names(plan)
+    return {
+        "uses_vector_index": any(name.startswith("ix_chunks_vector") for name in indexes),
+        "indexes": indexes,
+        "plan": plan,
+    }
+
+
 def retrieve(
     query: str,
     namespace_id: uuid.UUID,
@@ -66,14 +275,14 @@ def retrieve(
     session: Session,
     top_k: int | None = None,
 ) -> List[RetrievedChunk]:
-    """Embed the query, run ANN search, and optionally rerank results."""
+    """Embed the query, run ANN (or hybrid) search, and optionally rerank results."""
 
     search_text = query.strip()
     if not search_text:
         return []
 
-    vectors = embeddings.embed([search_text])
-    if not vectors:
+    query_vector = query_cache.embed_query(search_text)
+    if query_vector is None:
         logger.debug("Embedding model returned no vector for query")
         return []
 
@@ -83,7 +292,14 @@ def retrieve(
     )
     candidate_limit = max(target_top_k * candidate_multiplier, target_top_k)
 
-    stmt = _build_query_statement(vectors[0], namespace_id, candidate_limit)
+    if settings.RETRIEVAL_HYBRID and _is_postgres(session) and _lexical_terms(search_text):
+        weights = _hybrid_weights(session, namespace_id)
+        stmt = _build_hybrid_statement(
+            query_vector, search_text, namespace_id, candidate_limit, weights, trigram=_trigram_enabled(session)
+        )
+    else:
+        stmt = _build_query_statement(query_vector, namespace_id, candidate_limit)
+    _apply_search_settings(session, candidate_limit)
     rows = session.execute(stmt).all()
 
     results: List[RetrievedChunk] = [
@@ -91,10 +307,12 @@ def retrieve(
             chunk_id=row.chunk_id,
             document_id=row.document_id,
             text=row.text,
-            score=float(row.distance or 0.0),
+            # no distance means no comparable vector: lowest similarity, not a perfect match
+            score=float(row.distance) if row.distance is not None else math.inf,
             ordinal=int(row.ordinal or 0),
             title=row.title,
             metadata=row.metadata if isinstance(row.metadata, dict) else None,
+            lexical_rank=getattr(row, "lexical_rank", None),
         )
         for row in rows
     ]
@@ -119,7 +337,14 @@ def retrieve(
         return max(min(1.0 - distance, 1.0), -1.0)
 
     threshold = settings.RETRIEVAL_RELEVANCE_THRESHOLD
-    relevant = [chunk for chunk in top_results if similarity(chunk.score) >= threshold]
+    bypass_ranks = settings.RETRIEVAL_HYBRID_LEXICAL_BYPASS_RANKS
+    # the best lexical matches stay even when their embedding similarity is low
+    relevant = [
+        chunk
+        for chunk in top_results
+        if similarity(chunk.score) >= threshold
+        or (chunk.lexical_rank is not None and chunk.lexical_rank <= bypass_ranks)
+    ]
 
     if len(relevant) > 3:
         return relevant
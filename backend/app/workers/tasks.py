@@ -7,7 +7,7 @@ import uuid
 from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import delete
+from sqlalchemy import delete, or_, select
 
 from ..core import metrics
 from ..core.config import settings
@@ -105,6 +105,7 @@ def ingest_document(document_id: str, job_id: str | None = None) -> str:
                     token_count=_estimate_tokens(chunk.text),
                     metadata_dict=chunk_meta or None,
                     vector=vector,
+                    embedding_model=settings.EMBEDDING_MODEL_NAME,
                     ordinal=idx,
                 )
             )
@@ -156,6 +157,40 @@ def ingest_document(document_id: str, job_id: str | None = None) -> str:
         session.close()
 
 
+@celery_app.task(name="workers.reembed_stale_documents")
+def reembed_stale_documents(namespace_id: str | None = None) -> int:
+    """Queue re-ingestion of documents with chunks missing a current embedding.
+
+    A chunk is stale when its vector is NULL (migration 0007) or its
+    ``embedding_model`` is not ``EMBEDDING_MODEL_NAME``. Chunks written before
+    the model was recorded count as stale too, so the first run after a model
+    change re-embeds everything. Returns the number of queued documents.
+    """
+
+    stale_chunks = select(Chunk.document_id).where(
+        or_(
+            Chunk.vector.is_(None),
+            Chunk.embedding_model.is_(None),
+            Chunk.embedding_model != settings.EMBEDDING_MODEL_NAME,
+        )
+    )
+    stmt = select(Document.id).where(
+        Document.deleted_at.is_(None),
+        Document.status.in_([DocumentStatus.INGESTED.value, DocumentStatus.UPLOADED.value]),
+        Document.id.in_(stale_chunks),
+    )
+    if namespace_id:
+        stmt = stmt.where(Document.namespace_id == uuid.UUID(namespace_id))
+
+    with SessionLocal() as session:
+        document_ids = session.execute(stmt).scalars().all()
+    for document_id in document_ids:
+        ingest_document.delay(str(document_id))
+    logger.info("Queued %s documents for re-embedding with %s", len(document_ids), settings.EMBEDDING_MODEL_NAME)
+    metrics.record_task_result("reembed_stale_documents", "succeeded")
+    return len(document_ids)
+
+
 @celery_app.task(name="workers.crawl_site")
 def crawl_site(job_id: str) -> str:
     """Run the asynchronous crawler for the provided job identifier."""
@@ -0,0 +1,70 @@
+"""ANN index helpers shared by the chunks.vector migrations.
+
+Revisions import these instead of the application models so that a later
+change to the models cannot alter what an old revision does.
+"""
+from __future__ import annotations
+
+import math
+
+import sqlalchemy as sa
+
+HNSW_INDEX = "ix_chunks_vector_hnsw"
+IVFFLAT_COSINE_INDEX = "ix_chunks_vector_ivfflat_cosine"
+LEGACY_INDEX = "ix_chunks_vector_ivfflat"
+VECTOR_INDEXES = (HNSW_INDEX, IVFFLAT_COSINE_INDEX, LEGACY_INDEX)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+
+def pgvector_version(conn: sa.engine.Connection) -> tuple[int, ...]:
+    version = conn.execute(sa.text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+    return tuple(int(part) for part in (version or "0").split(".") if part.isdigit())
+
+
+def ivfflat_lists(conn: sa.engine.Connection) -> int:
+    """pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above."""
+
+    rows = conn.execute(sa.text("SELECT count(*) FROM chunks WHERE vector IS NOT NULL")).scalar() or 0
+    lists = rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows))
+    return max(lists, 10)
+
+
+def drop_invalid_index(conn: sa.engine.Connection, name: str) -> None:
+    """Drop ``name`` if an earlier concurrent build failed and left it INVALID."""
+
+    invalid = conn.execute(
+        sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    ).scalar()
+    if invalid:
+        conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def create_cosine_index(conn: sa.engine.Connection, storage: str = "vector") -> None:
+    """Build the cosine ANN index on chunks.vector concurrently.
+
+    HNSW on pgvector >= 0.5, otherwise an ivfflat index sized from the row
+    count. Must run inside ``autocommit_block()``.
+    """
+
+    if pgvector_version(conn) >= (0, 5):
+        drop_invalid_index(conn, HNSW_INDEX)
+        conn.execute(
+            sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {HNSW_INDEX} ON chunks "
+                f"USING hnsw (vector {storage}_cosine_ops) "
+                f"WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})"
+            )
+        )
+    else:
+        drop_invalid_index(conn, IVFFLAT_COSINE_INDEX)
+        conn.execute(
+            sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {IVFFLAT_COSINE_INDEX} ON chunks "
+                f"USING ivfflat (vector {storage}_cosine_ops) WITH (lists = {ivfflat_lists(conn)})"
+            )
+        )
@@ -0,0 +1,48 @@
+"""Replace the L2 ivfflat index on chunks.vector with a cosine HNSW index.
+
+Retrieval orders by ``cosine_distance`` (``<=>``), which only an index built
+with ``vector_cosine_ops`` can serve; the ivfflat index from 0002 used the
+default L2 opclass and a fixed ``lists=100``. Both indexes are built and
+dropped concurrently so ingestion keeps running during the migration. On
+pgvector < 0.5 (no HNSW) a cosine ivfflat index sized from the row count is
+built instead.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+from backend.migrations.vector_index import (
+    HNSW_INDEX,
+    IVFFLAT_COSINE_INDEX,
+    LEGACY_INDEX,
+    create_cosine_index,
+    drop_invalid_index,
+)
+
+# revision identifiers, used by Alembic.
+revision = "0006_chunks_vector_hnsw"
+down_revision = "0005_add_crawl_tables"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        create_cosine_index(conn)
+        conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {LEGACY_INDEX}"))
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        drop_invalid_index(conn, LEGACY_INDEX)
+        conn.execute(
+            sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {LEGACY_INDEX} ON chunks "
+                "USING ivfflat (vector) WITH (lists = 100)"
+            )
+        )
+        conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {HNSW_INDEX}"))
+        conn.execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {IVFFLAT_COSINE_INDEX}"))
@@ -0,0 +1,153 @@
+"""Store chunks.vector at the embedding model's native dimension.
+
+Vectors used to be zero-padded to 1536 dimensions whatever the model produced
+(384 for all-MiniLM-L6-v2). The column is rewritten to ``vector(384)``, the
+native size of the default model. Deployments with another model pass the
+target explicitly, e.g. ``alembic -x embedding_column=halfvec(768) upgrade
+head``; the revision never derives the schema from the environment. It
+refuses to run when the target differs from the column type the application
+is configured for, since the application could not use the result.
+
+Padded rows keep their leading components, which is lossless. Rows whose
+dropped tail is not all zeros cannot be truncated and are set to NULL; their
+documents go back to ``uploaded`` so that they are visibly waiting for
+``workers.reembed_stale_documents`` instead of silently missing from
+retrieval.
+
+This migration changes the column, not the model: vectors of a different
+model with the same dimension look valid here and are kept. Migration 0009
+records the model per chunk for that case.
+
+``ALTER COLUMN ... TYPE`` rewrites the table under an exclusive lock, so the
+ANN index is dropped first and rebuilt concurrently afterwards.
+"""
+from __future__ import annotations
+
+import re
+
+import sqlalchemy as sa
+from alembic import context, op
+
+from backend.migrations.vector_index import VECTOR_INDEXES, create_cosine_index, pgvector_version
+
+# revision identifiers, used by Alembic.
+revision = "0007_native_embedding_dim"
+down_revision = "0006_chunks_vector_hnsw"
+branch_labels = None
+depends_on = None
+
+TARGET_STORAGE = "vector"
+TARGET_DIM = 384
+LEGACY_DIM = 1536
+COLUMN_SPEC = re.compile(r"(vector|halfvec)\((\d+)\)")
+# DocumentStatus values, spelled out so the migration does not follow later model changes
+INGESTED = "ingested"
+UPLOADED = "uploaded"
+
+
+def _column_type(conn: sa.engine.Connection) -> tuple[str, int | None]:
+    """Return ``(type_name, dim)`` of chunks.vector, e.g. ``("vector", 1536)``."""
+
+    spec = conn.execute(
+        sa.text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = 'chunks'::regclass AND attname = 'vector'"
+        )
+    ).scalar()
+    name, _, rest = spec.partition("(")
+    return name, int(rest.rstrip(")")) if rest else None
+
+
+def _target_type() -> tuple[str, int]:
+    """The pinned ``vector(384)``, or the ``-x embedding_column=...`` override."""
+
+    spec = context.get_x_argument(as_dictionary=True).get("embedding_column")
+    if spec is None:
+        return TARGET_STORAGE, TARGET_DIM
+    match = COLUMN_SPEC.fullmatch(spec.strip().lower())
+    if match is None:
+        raise RuntimeError(f"-x embedding_column must look like vector(768) or halfvec(1024), got {spec!r}")
+    return match.group(1), int(match.group(2))
+
+
+def _check_application_type(storage: str, dim: int) -> None:
+    from backend.app.models.vector_types import configured_embedding_dim, embedding_storage
+
+    try:
+        configured = (embedding_storage(), configured_embedding_dim())
+    except ValueError as exc:
+        raise RuntimeError(f"Cannot tell which chunks.vector type the application expects: {exc}") from None
+    if configured != (storage, dim):
+        raise RuntimeError(
+            f"Migration 0007 would convert chunks.vector to {storage}({dim}), but EMBEDDING_MODEL_NAME, "
+            f"EMBEDDING_DIM and EMBEDDING_STORAGE configure {configured[0]}({configured[1]}). Run "
+            f"'alembic -x embedding_column={configured[0]}({configured[1]}) upgrade head' to convert to that "
+            "type, or fix the settings."
+        )
+
+
+def _drop_vector_indexes() -> None:
+    for name in VECTOR_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def _create_ann_index(storage: str) -> None:
+    with op.get_context().autocommit_block():
+        create_cosine_index(op.get_bind(), storage)
+
+
+def _mark_unembedded_documents() -> None:
+    op.execute(
+        f"UPDATE documents SET status = '{UPLOADED}', "
+        "error = 'Embeddings removed by migration 0007; re-ingest required' "
+        f"WHERE status = '{INGESTED}' AND deleted_at IS NULL AND EXISTS ("
+        "SELECT 1 FROM chunks WHERE chunks.document_id = documents.id AND chunks.vector IS NULL)"
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    storage, dim = _target_type()
+    _check_application_type(storage, dim)
+    current_type, current_dim = _column_type(conn)
+    if (current_type, current_dim) == (storage, dim):
+        return
+    if storage == "halfvec" and pgvector_version(conn) < (0, 7):
+        raise RuntimeError("halfvec storage requires pgvector >= 0.7")
+
+    if current_dim is not None and dim < current_dim:
+        op.execute(
+            "UPDATE chunks SET vector = NULL WHERE vector IS NOT NULL AND EXISTS ("
+            f"SELECT 1 FROM unnest((vector::real[])[{dim + 1}:]) AS tail(x) WHERE x <> 0)"
+        )
+    elif current_dim is not None and dim > current_dim:
+        # a wider model: the stored vectors cannot be reused
+        op.execute("UPDATE chunks SET vector = NULL")
+    _mark_unembedded_documents()
+
+    _drop_vector_indexes()
+    op.execute(
+        f"ALTER TABLE chunks ALTER COLUMN vector TYPE {storage}({dim}) "
+        f"USING ((vector::real[])[1:{dim}])::{storage}({dim})"
+    )
+    _create_ann_index(storage)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    current_type, current_dim = _column_type(conn)
+    if (current_type, current_dim) == ("vector", LEGACY_DIM):
+        return
+    if current_dim is None or current_dim > LEGACY_DIM:
+        raise RuntimeError(
+            f"Cannot downgrade chunks.vector from {current_type}({current_dim}) to vector({LEGACY_DIM}): "
+            f"only vectors of at most {LEGACY_DIM} dimensions can be zero-padded back. Switch to a model of "
+            f"at most {LEGACY_DIM} dimensions and re-embed first."
+        )
+    _drop_vector_indexes()
+    op.execute(
+        f"ALTER TABLE chunks ALTER COLUMN vector TYPE vector({LEGACY_DIM}) "
+        f"USING (vector::real[] || array_fill(0::real, "
+        f"ARRAY[{LEGACY_DIM} - cardinality(vector::real[])]))::vector({LEGACY_DIM})"
+    )
+    _create_ann_index("vector")
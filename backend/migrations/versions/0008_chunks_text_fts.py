@@ -0,0 +1,35 @@
+"""Add a full-text index on chunks.text for hybrid retrieval.
+
+The expression must stay identical to the one in ``rag.retrieval``
+(``to_tsvector('simple'::regconfig, text)``) for the planner to use it. The
+``simple`` configuration does no stemming, which keeps German and English
+text, product names and error codes matchable with one index.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008_chunks_text_fts"
+down_revision = "0007_native_embedding_dim"
+branch_labels = None
+depends_on = None
+
+FTS_INDEX = "ix_chunks_text_fts"
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        conn.execute(
+            sa.text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {FTS_INDEX} ON chunks "
+                "USING gin (to_tsvector('simple'::regconfig, text))"
+            )
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.get_bind().execute(sa.text(f"DROP INDEX CONCURRENTLY IF EXISTS {FTS_INDEX}"))
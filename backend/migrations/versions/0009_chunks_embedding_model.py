@@ -0,0 +1,27 @@
+"""Record which embedding model produced each chunk vector.
+
+Vectors of two models with the same dimension cannot be told apart by their
+values, so a model change used to leave the old vectors searchable next to
+query embeddings from the new model. Retrieval skips chunks whose
+``embedding_model`` differs from ``EMBEDDING_MODEL_NAME``, and the
+``workers.reembed_stale_documents`` task re-ingests them. Existing rows keep
+NULL because their model is unknown.
+"""
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0009_chunks_embedding_model"
+down_revision = "0008_chunks_text_fts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("chunks", sa.Column("embedding_model", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("chunks", "embedding_model")
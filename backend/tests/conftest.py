@@ -29,6 +29,7 @@ from backend.app.main import create_app
 from backend.app.models import Base
 from backend.app.workers import tasks as tasks_module
 from backend.app.api import routes_docs, routes_chat, routes_crawl
+from backend.app.rag import query_cache
 
 
 class FakeScanner:
@@ -89,6 +90,12 @@ class FakeMinio:
         return obj
 
 
+@pytest.fixture(autouse=True)
+def _clear_query_embedding_cache() -> Iterator[None]:
+    query_cache.get_cache().clear()
+    yield
+
+
 @pytest.fixture()
 def fake_minio(monkeypatch: pytest.MonkeyPatch) -> FakeMinio:
     client = FakeMinio()
@@ -12,9 +12,10 @@ from backend.app.api import routes_crawl, routes_docs
 from backend.app.api.routes_docs import UploadCompleteRequest
 from backend.app.core.config import settings
 from backend.app.ingest import crawler as crawler_module
-from backend.app.models import Conversation, CrawlResult, Document, Job, Namespace, NamespaceMember, User
+from backend.app.models import Chunk, Conversation, CrawlResult, Document, Job, Namespace, NamespaceMember, User
 from backend.app.models.documents import DocumentStatus
-from backend.app.rag import ollama_client, retrieval
+from backend.app.rag import ollama_client, query_cache, retrieval
+from backend.app.workers import tasks as tasks_module
 
 
 def test_local_login_success(app: Any) -> None:
@@ -297,7 +298,7 @@ def test_retrieval_namespace_isolation(monkeypatch: pytest.MonkeyPatch) -> None:
 
     namespace_id = uuid.uuid4()
 
-    monkeypatch.setattr(retrieval.embeddings, "embed", lambda texts: [[0.1, 0.2]])
+    monkeypatch.setattr(query_cache.embeddings, "embed", lambda texts: [[0.1, 0.2]])
     retrieval.retrieve("hello", namespace_id, session=DummySession(), top_k=1)
 
     stmt = captured["statement"]
@@ -305,6 +306,9 @@ def test_retrieval_namespace_isolation(monkeypatch: pytest.MonkeyPatch) -> None:
     assert compiled.params["namespace_id_1"] == namespace_id
     sql = str(stmt)
     assert "chunks" in sql and "namespace_id" in sql
+    # vectors of another embedding model are not comparable with the query vector
+    assert "chunks.embedding_model IS NULL OR chunks.embedding_model = " in sql
+    assert settings.EMBEDDING_MODEL_NAME in compiled.params.values()
 
 
 def test_chat_stream_sse_smoke(
@@ -361,3 +365,407 @@ def test_chat_stream_sse_smoke(
     assert b"Hello" in events
     assert b"done" in events
     assert response.headers["content-type"].startswith("text/event-stream")
+
+
+class _PostgresSession:
+    """Records statements; pretends to be bound to PostgreSQL."""
+
+    def __init__(self, plan: Any = None) -> None:
+        from sqlalchemy.dialects import postgresql
+
+        self.dialect = postgresql.psycopg.dialect()
+        self.statements: list[tuple[Any, Any]] = []
+        self.driver_sql: list[str] = []
+        self.plan = plan
+
+    def get_bind(self) -> Any:
+        return self
+
+    def execute(self, stmt, params=None):
+        self.statements.append((stmt, params))
+        return self
+
+    def all(self) -> list[Any]:
+        return []
+
+    def connection(self) -> Any:
+        return self
+
+    def exec_driver_sql(self, sql: str):
+        self.driver_sql.append(sql)
+        return self
+
+    def scalar(self) -> Any:
+        return json.dumps(self.plan)
+
+
+def test_retrieval_sets_ann_search_parameters(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = _PostgresSession()
+    dim = retrieval.Chunk.__table__.c.vector.type.dim
+    monkeypatch.setattr(query_cache.embeddings, "embed", lambda texts: [[0.1] * dim])
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_HNSW_EF_SEARCH", 10)
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_IVFFLAT_PROBES", 7)
+
+    retrieval.retrieve("hello", uuid.uuid4(), session=session, top_k=20)
+
+    set_config, params = session.statements[0]
+    assert "hnsw.ef_search" in str(set_config) and "ivfflat.probes" in str(set_config)
+    # ef_search never drops below the number of requested candidates
+    assert params == {"ef_search": "20", "probes": "7"}
+    assert "ORDER BY" in str(session.statements[1][0])
+
+
+def test_explain_vector_search_reports_index_usage() -> None:
+    plan = [
+        {
+            "Plan": {
+                "Node Type": "Limit",
+                "Plans": [
+                    {"Node Type": "Index Scan", "Index Name": "ix_chunks_vector_hnsw", "Relation Name": "chunks"},
+                ],
+            }
+        }
+    ]
+    session = _PostgresSession(plan)
+
+    report = retrieval.explain_vector_search(session, uuid.uuid4(), limit=5)
+
+    assert report["uses_vector_index"] is True
+    assert report["indexes"] == ["ix_chunks_vector_hnsw"]
+    assert session.driver_sql[0].startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "<=>" in session.driver_sql[0]
+
+    session = _PostgresSession([{"Plan": {"Node Type": "Seq Scan", "Relation Name": "chunks"}}])
+    assert retrieval.explain_vector_search(session, uuid.uuid4())["uses_vector_index"] is False
+
+
+def test_admin_vector_index_route(
+    app: Any,
+    session_factory,
+    auth_session: dict[str, str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    namespace_id = uuid.uuid4()
+    user_id = uuid.UUID(auth_session["user_id"])
+    with session_factory() as session:
+        session.add_all(
+            [
+                User(id=user_id, email="ops@example.com"),
+                Namespace(id=namespace_id, slug="ops", name="Ops"),
+                NamespaceMember(namespace_id=namespace_id, user_id=user_id),
+            ]
+        )
+        session.commit()
+
+    assert app.get("/admin/vector-index", params={"namespace_id": str(namespace_id)}).status_code == 401
+
+    app.cookies.set(settings.SESSION_COOKIE_NAME, auth_session["cookie"])
+    response = app.get("/admin/vector-index", params={"namespace_id": str(uuid.uuid4())})
+    assert response.status_code == 403
+
+    # the test database is SQLite, which has no vector index to explain
+    response = app.get("/admin/vector-index", params={"namespace_id": str(namespace_id)})
+    assert response.status_code == 409
+
+    calls: list[tuple[uuid.UUID, int | None]] = []
+
+    def _explain(session, ns_id, limit=None):
+        calls.append((ns_id, limit))
+        return {"uses_vector_index": True, "indexes": ["ix_chunks_vector_hnsw"], "plan": []}
+
+    monkeypatch.setattr(retrieval, "explain_vector_search", _explain)
+    response = app.get("/admin/vector-index", params={"namespace_id": str(namespace_id), "limit": 50})
+    assert response.status_code == 200
+    assert response.json()["uses_vector_index"] is True
+    assert calls == [(namespace_id, 50)]
+
+
+def test_embeddings_keep_native_dimension(monkeypatch: pytest.MonkeyPatch) -> None:
+    import numpy as np
+
+    from backend.app.ingest import embeddings
+    from backend.app.models import Chunk
+    from backend.app.models import vector_types
+
+    class _Model:
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 384), dtype=np.float32)
+
+    monkeypatch.setattr(embeddings, "get_model", lambda model_name=None: _Model())
+    assert [len(v) for v in embeddings.embed(["a", "b"])] == [384, 384]
+    assert len(embeddings.embed(["a"], embedding_dim=512)[0]) == 512
+
+    assert Chunk.__table__.c.vector.type.dim == embeddings.embedding_dimension() == 384
+    monkeypatch.setattr(vector_types.settings, "EMBEDDING_STORAGE", "halfvec")
+    assert vector_types.embedding_column_type().get_col_spec() == "HALFVEC(384)"
+    monkeypatch.setattr(vector_types.settings, "EMBEDDING_STORAGE", "float")
+    with pytest.raises(ValueError):
+        vector_types.embedding_column_type()
+
+
+def test_unknown_embedding_model_requires_configured_dim(monkeypatch: pytest.MonkeyPatch) -> None:
+    from backend.app.ingest import embeddings
+    from backend.app.models import vector_types
+
+    def _no_model(model_name=None):
+        raise AssertionError("the embedding model must not be loaded for the column type")
+
+    monkeypatch.setattr(embeddings, "get_model", _no_model)
+    monkeypatch.setattr(vector_types.settings, "EMBEDDING_MODEL_NAME", "acme/custom-embedder")
+    monkeypatch.setattr(vector_types.settings, "EMBEDDING_DIM", None)
+    with pytest.raises(ValueError, match="EMBEDDING_DIM"):
+        vector_types.configured_embedding_dim()
+    monkeypatch.setattr(vector_types.settings, "EMBEDDING_DIM", 640)
+    assert vector_types.embedding_column_type().dim == 640
+
+
+def test_hybrid_retrieval_fuses_lexical_and_vector_hits(monkeypatch: pytest.MonkeyPatch) -> None:
+    session = _PostgresSession()
+    namespace_id = uuid.uuid4()
+    dim = retrieval.Chunk.__table__.c.vector.type.dim
+    monkeypatch.setattr(query_cache.embeddings, "embed", lambda texts: [[0.1] * dim])
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_HYBRID", True)
+    monkeypatch.setattr(
+        retrieval.settings, "RETRIEVAL_HYBRID_WEIGHTS", {str(namespace_id): {"vector": 0.7, "lexical": 1.3}}
+    )
+
+    monkeypatch.setattr(retrieval, "_trigram_support", {})
+    retrieval.retrieve("VPN Fehler 809", namespace_id, session=session, top_k=4)
+
+    assert any("pg_extension" in str(stmt) for stmt, _ in session.statements)
+    stmt = session.statements[-1][0]
+    compiled = stmt.compile(dialect=session.dialect)
+    sql = str(compiled)
+    assert sql.startswith("WITH vector_hits AS")
+    assert "lexical_hits AS" in sql and "FULL OUTER JOIN" in sql
+    assert "to_tsvector('simple'::regconfig, chunks.text) @@ to_tsquery" in sql
+    assert sql.count("<%%") == 3
+    params = list(compiled.params.values())
+    assert 0.7 in params and 1.3 in params and "vpn | fehler | 809" in params
+    assert all(term in params for term in ("vpn", "fehler", "809"))
+    lexical_cte = sql.split("lexical_hits AS", 1)[1].split("fused AS", 1)[0]
+    assert "chunks.vector IS NOT NULL" in lexical_cte and "chunks.embedding_model" in lexical_cte
+
+    # a lexical hit survives the similarity threshold, a weak vector-only hit does not
+    from types import SimpleNamespace
+
+    def _row(distance: float | None, lexical_rank: int | None) -> SimpleNamespace:
+        return SimpleNamespace(
+            chunk_id=uuid.uuid4(),
+            document_id=uuid.uuid4(),
+            text="Fehler 809",
+            metadata=None,
+            ordinal=0,
+            title=None,
+            distance=distance,
+            lexical_rank=lexical_rank,
+        )
+
+    # only the best lexical ranks bypass the threshold
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_HYBRID_LEXICAL_BYPASS_RANKS", 2)
+    rows = [_row(0.9, 1), _row(0.8, None), _row(0.1, None), _row(0.9, 3)]
+    monkeypatch.setattr(session, "all", lambda: rows, raising=False)
+    results = retrieval.retrieve("VPN Fehler 809", namespace_id, session=session, top_k=4)
+    assert [r.chunk_id for r in results] == [rows[0].chunk_id, rows[2].chunk_id]
+
+    # a row without a distance is not treated as a perfect vector match
+    rows = [_row(None, None), _row(0.1, None)]
+    results = retrieval.retrieve("VPN Fehler 809", namespace_id, session=session, top_k=4)
+    assert [r.chunk_id for r in results] == [rows[1].chunk_id]
+
+    terms = retrieval._lexical_terms("Wie behebe ich VPN-Fehler 809? vpn")
+    assert terms == ["wie", "behebe", "ich", "vpn", "fehler", "809"]
+
+    # without pg_trgm the lexical side uses full-text search only
+    monkeypatch.setattr(retrieval, "_trigram_support", {})
+    monkeypatch.setattr(session, "scalar", lambda: None, raising=False)
+    retrieval.retrieve("VPN Fehler 809", namespace_id, session=session, top_k=4)
+    sql = str(session.statements[-1][0].compile(dialect=session.dialect))
+    assert "lexical_hits AS" in sql and "<%%" not in sql
+
+    session.get = lambda model, key: Namespace(id=key, slug="it-support", name="IT")
+    monkeypatch.setattr(retrieval.settings, "RETRIEVAL_HYBRID_WEIGHTS", {"it-support": {"lexical": 2.0}})
+    assert retrieval._hybrid_weights(session, uuid.uuid4()) == (1.0, 2.0)
+
+
+def _retrieved(text: str, score: float = 0.2) -> retrieval.RetrievedChunk:
+    return retrieval.RetrievedChunk(
+        chunk_id=uuid.uuid4(),
+        document_id=uuid.uuid4(),
+        text=text,
+        score=score,
+        ordinal=0,
+        title=None,
+        metadata=None,
+    )
+
+
+def test_cross_encoder_reranker_batches_and_caches_scores() -> None:
+    import time
+
+    from backend.app.rag import ranker
+
+    calls: list[list[tuple[str, str]]] = []
+
+    class _Model:
+        delay = 0.0
+
+        def predict(self, pairs, **kwargs):
+            calls.append(list(pairs))
+            time.sleep(self.delay)
+            return [float(len(passage)) for _, passage in pairs]
+
+    model = _Model()
+    reranker = ranker.CrossEncoderReranker(
+        "fake", batch_size=2, max_passage_chars=5, budget_seconds=1.0, model_loader=lambda name: model
+    )
+    results = [_retrieved("a"), _retrieved("abc"), _retrieved("ab"), _retrieved("abcdefgh")]
+
+    ranked = reranker.rerank("q", results)
+    assert [c.text for c in ranked] == ["abcdefgh", "abc", "ab", "a"]
+    assert [len(batch) for batch in calls] == [2, 2]
+    assert calls[1][1] == ("q", "abcde")  # passages are cut at max_passage_chars
+
+    calls.clear()
+    assert reranker.rerank("q", results) == ranked
+    assert not calls  # every (query, chunk_id) score came from the cache
+
+    model.delay = 0.2
+    reranker.budget_seconds = 0.05
+    fresh = [_retrieved("a"), _retrieved("abc")]
+    assert reranker.rerank("other", fresh) == fresh  # over budget: ANN order
+    time.sleep(0.3)
+    assert [c.text for c in reranker.rerank("other", fresh)] == ["abc", "a"]
+
+
+def test_cross_encoder_reranker_skips_queueing_while_the_worker_is_behind() -> None:
+    import threading
+
+    from backend.app.rag import ranker
+
+    release = threading.Event()
+    calls: list[int] = []
+
+    class _Model:
+        def predict(self, pairs, **kwargs):
+            calls.append(len(pairs))
+            release.wait(2)
+            return [1.0] * len(pairs)
+
+    reranker = ranker.CrossEncoderReranker(
+        "fake", batch_size=2, budget_seconds=0.05, model_loader=lambda name: _Model()
+    )
+    results = [_retrieved("a"), _retrieved("b"), _retrieved("c")]
+    assert reranker.rerank("q1", results) == results  # first batch overruns the budget
+    assert reranker.rerank("q2", results) == results  # not queued: the worker is still behind
+    release.set()
+    reranker._executor.submit(lambda: None).result(timeout=2)
+
+    # the overrunning job stopped after its batch and q2 never reached the model
+    assert calls == [2]
+    assert [c.text for c in reranker.rerank("q2", results[:2])] == ["a", "b"]
+    assert calls == [2, 2]
+
+
+def test_lifespan_waits_for_the_reranker(monkeypatch: pytest.MonkeyPatch) -> None:
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from backend.app import main
+    from backend.app.rag import ranker
+
+    loaded: list[str] = []
+
+    def _load(name):
+        time.sleep(0.1)
+        loaded.append(name)
+
+    reranker = ranker.CrossEncoderReranker("fake", model_loader=_load)
+    monkeypatch.setattr(main.settings, "RETRIEVAL_USE_RERANKER", True)
+    monkeypatch.setattr(main.settings, "RERANKER_BACKEND", "cross-encoder")
+    monkeypatch.setattr(ranker, "get_reranker", lambda: reranker)
+
+    with TestClient(main.create_app()):
+        assert loaded == ["fake"]
+
+
+def test_query_embedding_cache_tiers(monkeypatch: pytest.MonkeyPatch) -> None:
+    import numpy as np
+
+
+    class _Redis:
+        def __init__(self) -> None:
+            self.data: dict[str, bytes] = {}
+
+        def get(self, key: str) -> bytes | None:
+            return self.data.get(key)
+
+        def set(self, key: str, value: bytes, ex: int | None = None) -> None:
+            self.data[key] = value
+
+    calls: list[str] = []
+
+    def fake_embed(texts):
+        calls.extend(texts)
+        return [[0.5, 0.25, float(len(texts[0]))]]
+
+    redis_client = _Redis()
+    cache = query_cache.QueryEmbeddingCache(maxsize=8, redis_client=redis_client)
+    monkeypatch.setattr(query_cache, "_cache", cache)
+    monkeypatch.setattr(query_cache.embeddings, "embed", fake_embed)
+
+    first = query_cache.embed_query("Wie  verbinde ich\tVPN?")
+    assert query_cache.embed_query("Wie verbinde ich VPN?") == first
+    assert calls == ["Wie verbinde ich VPN?"]
+
+    # raw float32 bytes in Redis serve a process with a cold in-memory tier
+    (raw,) = redis_client.data.values()
+    assert np.frombuffer(raw, dtype=np.float32).tolist() == first
+    cache.clear()
+    assert query_cache.embed_query("Wie verbinde ich VPN?") == first
+    assert len(calls) == 1
+
+    # a different model never sees the old entries
+    monkeypatch.setattr(query_cache.settings, "EMBEDDING_MODEL_NAME", "other-model")
+    query_cache.embed_query("Wie verbinde ich VPN?")
+    assert len(calls) == 2 and len(cache) == 1
+
+
+def test_reembed_stale_documents_queues_other_model_chunks(
+    monkeypatch: pytest.MonkeyPatch, session_factory, ingest_calls: list[tuple[str, str | None]]
+) -> None:
+    monkeypatch.setattr(tasks_module, "SessionLocal", session_factory)
+    namespace_id = uuid.uuid4()
+    current = settings.EMBEDDING_MODEL_NAME
+    specs = {
+        "current": ("ingested", current, True, False),
+        "unrecorded": ("ingested", None, True, False),
+        "other": ("ingested", "other-model", True, False),
+        "nulled": ("uploaded", current, False, False),
+        "deleted": ("ingested", "other-model", True, True),
+    }
+    ids: dict[str, uuid.UUID] = {}
+    with session_factory() as session:
+        session.add(Namespace(id=namespace_id, slug="demo", name="Demo"))
+        for name, (status, model, has_vector, deleted) in specs.items():
+            document = Document(id=uuid.uuid4(), namespace_id=namespace_id, uri=name, status=status)
+            if deleted:
+                document.mark_deleted()
+            session.add(document)
+            session.add(
+                Chunk(
+                    document_id=document.id,
+                    namespace_id=namespace_id,
+                    text=name,
+                    vector=None if not has_vector else [0.0] * Chunk.__table__.c.vector.type.dim,
+                    embedding_model=model,
+                )
+            )
+            ids[name] = document.id
+        session.commit()
+
+    assert tasks_module.reembed_stale_documents() == 3
+    assert {document_id for document_id, _ in ingest_calls} == {
+        str(ids[name]) for name in ("unrecorded", "other", "nulled")
+    }
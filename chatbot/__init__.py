@@ -1,3 +1,11 @@
-from .server import create_app
-
 __all__ = ["create_app"]
+
+
+def __getattr__(name):
+    # Importing the package must stay cheap: tooling such as
+    # ``python -m chatbot.build_index`` should not pull in Flask and the engine.
+    if name == "create_app":
+        from .server import create_app
+
+        return create_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
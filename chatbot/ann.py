@@ -0,0 +1,195 @@
+"""FAISS index factory for the legacy vector store (flat / IVF / HNSW / IVF-PQ)."""
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from .utils import atomic_write_path, env_int
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+# Top-level files of stores written before the index joined the node store generation
+FAISS_INDEX_FILE = "faiss.index"
+VECTORS_FILE = "vectors.npy"
+
+
+@dataclass
+class AnnConfig:
+    """Build and search parameters; ``0`` for ``nlist`` means ``4 * sqrt(n)``."""
+
+    index_type: str = "flat"
+    nlist: int = 0
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    pq_m: int = 48
+    pq_bits: int = 8
+    train_sample: int = 50_000
+
+    @classmethod
+    def from_env(cls) -> "AnnConfig":
+        index_type = os.getenv("FAISS_INDEX_TYPE", "flat").lower()
+        if index_type not in INDEX_TYPES:
+            logger.warning("Invalid FAISS_INDEX_TYPE=%s (expected one of %s)", index_type, ", ".join(INDEX_TYPES))
+            index_type = "flat"
+        return cls(
+            index_type=index_type,
+            nlist=env_int("FAISS_NLIST", 0),
+            nprobe=env_int("FAISS_NPROBE", 16),
+            hnsw_m=env_int("FAISS_HNSW_M", 32),
+            ef_construction=env_int("FAISS_EF_CONSTRUCTION", 200),
+            ef_search=env_int("FAISS_EF_SEARCH", 64),
+            pq_m=env_int("FAISS_PQ_M", 48),
+            pq_bits=env_int("FAISS_PQ_BITS", 8),
+            train_sample=env_int("FAISS_TRAIN_SAMPLE", 50_000),
+        )
+
+
+def _training_sample(vectors: np.ndarray, size: int, seed: int = 0) -> np.ndarray:
+    if len(vectors) <= size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), size=size, replace=False)]
+
+
+def build_index(vectors: np.ndarray, config: AnnConfig) -> faiss.Index:
+    """Build (and train, if needed) an L2 index of ``config.index_type``.
+
+    Corpora too small to train the requested quantizers fall back to flat.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, dim = vectors.shape
+    kind = config.index_type
+
+    nlist = config.nlist or max(1, int(4 * math.sqrt(max(n, 1))))
+    if kind in ("ivf", "ivfpq") and n < nlist * 39:
+        # FAISS wants ~39 training points per centroid
+        nlist = max(1, n // 39)
+    if kind == "ivfpq" and (dim % config.pq_m or n < 39 * 2 ** config.pq_bits):
+        logger.warning("IVF-PQ needs dim %% pq_m == 0 and >= %d vectors; using IVF-Flat", 39 * 2 ** config.pq_bits)
+        kind = "ivf"
+    if kind in ("ivf", "ivfpq") and nlist < 2:
+        logger.warning("Only %d vectors; too few to train %s, using flat", n, kind)
+        kind = "flat"
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, config.hnsw_m)
+        index.hnsw.efConstruction = config.ef_construction
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if kind == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, config.pq_m, config.pq_bits)
+        start = time.perf_counter()
+        index.train(_training_sample(vectors, config.train_sample))
+        logger.info("Trained %s (nlist=%d) in %.1fs", kind, nlist, time.perf_counter() - start)
+
+    if n:
+        index.add(vectors)
+    configure_search(index, config)
+    return index
+
+
+def configure_search(index: faiss.Index, config: AnnConfig) -> faiss.Index:
+    """Apply query-time knobs (``nprobe`` / ``efSearch``) to a loaded index."""
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        ivf = None
+    if ivf is not None:
+        ivf.nprobe = max(1, min(config.nprobe, ivf.nlist))
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        hnsw.efSearch = config.ef_search
+    return index
+
+
+def reconstruct_vectors(index: faiss.Index) -> np.ndarray:
+    """Return the stored vectors of a flat index (lossy indexes cannot)."""
+    if not index.ntotal:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def save_vectors(path: str, vectors: np.ndarray) -> None:
+    with atomic_write_path(path) as tmp, open(tmp, "wb") as f:
+        np.save(f, np.asarray(vectors, dtype="float32"))
+
+
+def write_index(index: faiss.Index, path: str) -> str:
+    with atomic_write_path(path) as tmp:
+        faiss.write_index(index, tmp)
+    return path
+
+
+def perturbed_queries(vectors: np.ndarray, num_queries: int, seed: int = 0, scale: float = 1.0) -> np.ndarray:
+    """Sampled vectors moved off their stored position by Gaussian noise.
+
+    The noise norm is ``scale`` times the sample's median distance to its
+    nearest other vector. The source vector is then no longer a guaranteed
+    exact hit, which would otherwise inflate recall, most of all for IVF/PQ.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    sample = _training_sample(vectors, num_queries, seed=seed)
+    if len(vectors) < 2 or not len(sample):
+        return sample
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    dists, _ = flat.search(sample, 2)  # squared L2; column 0 is the vector itself
+    radius = float(np.median(np.sqrt(np.maximum(dists[:, 1], 0.0)))) * scale
+    rng = np.random.default_rng(seed + 1)
+    noise = rng.standard_normal(sample.shape).astype("float32")
+    noise *= radius / np.maximum(np.linalg.norm(noise, axis=1, keepdims=True), 1e-12)
+    return np.ascontiguousarray(sample + noise, dtype="float32")
+
+
+def evaluate_recall(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    k: int = 10,
+    num_queries: int = 200,
+    seed: int = 0,
+    queries: Optional[np.ndarray] = None,
+) -> Dict[str, float]:
+    """Recall@k of ``index`` against exact flat search, plus per-query latency.
+
+    Pass real query embeddings as ``queries`` where available. Without them,
+    ``perturbed_queries`` is used. Stored vectors are not used as queries
+    as-is, because their exact match is always in the index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    if queries is None:
+        queries = perturbed_queries(vectors, num_queries, seed=seed)
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    k = min(k, len(vectors))
+    if not len(queries) or k <= 0:
+        return {"recall": 1.0, "flat_ms": 0.0, "ann_ms": 0.0, "queries": 0}
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+
+    start = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    return {
+        "recall": hits / float(len(queries) * k),
+        "flat_ms": flat_ms,
+        "ann_ms": ann_ms,
+        "queries": len(queries),
+    }
@@ -0,0 +1,107 @@
+"""Run the async chain from WSGI request threads.
+
+One event loop per process lives on a background thread. Request threads
+submit coroutines with ``run_coroutine_threadsafe`` and read streamed items
+from a bounded ``queue.Queue``, so many ``/chat`` streams share the loop
+without re-entering it.
+"""
+import asyncio
+import logging
+import queue
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class LoopThread:
+    def __init__(self, name: str = "heibot-loop", queue_size: int = 64):
+        self.queue_size = queue_size
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._started = threading.Event()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        self.loop.run_forever()
+        try:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+
+    def start(self) -> "LoopThread":
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Block the calling thread until ``coro`` finishes on the loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stream(self, agen_factory: Callable[[], AsyncIterator[T]]) -> Iterator[T]:
+        """Iterate an async generator from a synchronous thread.
+
+        When the queue is full the producer awaits an event that the consumer
+        sets (via ``call_soon_threadsafe``) after taking an item, so a slow
+        client throttles only its own stream and costs no loop wakeups while
+        it stalls. Closing the returned iterator cancels the producer.
+        """
+        items: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        producer_waiting = threading.Event()
+        space: Optional[asyncio.Event] = None
+
+        async def _put(item) -> None:
+            while True:
+                try:
+                    items.put_nowait(item)
+                    return
+                except queue.Full:
+                    space.clear()
+                    producer_waiting.set()
+                    # the consumer may have taken an item before it saw the flag
+                    if items.full():
+                        await space.wait()
+
+        async def _produce() -> None:
+            nonlocal space
+            space = asyncio.Event()
+            try:
+                async for item in agen_factory():
+                    await _put(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                await _put(_Failure(exc))
+                return
+            await _put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(_produce(), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if producer_waiting.is_set():
+                    producer_waiting.clear()
+                    self.loop.call_soon_threadsafe(space.set)
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise item.exc
+                yield item
+        finally:
+            if not future.done():
+                future.cancel()
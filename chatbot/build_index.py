@@ -0,0 +1,132 @@
+"""Offline build/convert of the legacy FAISS index.
+
+Rebuilds the FAISS index of ``<persist_dir>/node_store`` from the stored raw
+vectors with the requested index type and reports recall@k against exact flat
+search::
+
+    python -m chatbot.build_index --type hnsw --ef-search 64
+    python -m chatbot.build_index --type ivfpq --nprobe 32 --dry-run
+    python -m chatbot.build_index --type ivfpq --query-file questions.txt --dry-run
+
+A pre-node-store ``nodes.pkl`` is converted once with ``--migrate-pickle``;
+the server no longer reads or renames it at startup::
+
+    python -m chatbot.build_index --migrate-pickle --type hnsw
+"""
+import argparse
+import dataclasses
+import logging
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from .ann import (
+    INDEX_TYPES,
+    AnnConfig,
+    build_index,
+    evaluate_recall,
+    reconstruct_vectors,
+)
+from .node_store import NodeStore, publish_index
+
+logger = logging.getLogger(__name__)
+
+
+def _load_or_recover_vectors(store: NodeStore):
+    vectors = store.load_vectors()
+    if vectors is not None:
+        return vectors
+    index = store.read_index()
+    if index is None:
+        raise SystemExit(f"No vectors or FAISS index in {store.path}; start the server once to build them.")
+    if not isinstance(index, faiss.IndexFlat):
+        raise SystemExit(f"The store's index is {type(index).__name__}; raw vectors are needed to convert it.")
+    vectors = reconstruct_vectors(index)
+    logger.info("Recovered %d vectors from the flat index", len(vectors))
+    return vectors
+
+
+def _load_queries(path: str) -> np.ndarray:
+    """Query embeddings from a ``.npy`` file, or one question per line embedded with the app's model."""
+    if path.endswith(".npy"):
+        return np.load(path).astype("float32")
+    with open(path, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    from .engine import get_embed_model
+
+    return np.asarray(get_embed_model().get_text_embedding_batch(questions), dtype="float32")
+
+
+def _parse_args(argv=None):
+    env = AnnConfig.from_env()
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--persist-dir", default="index_store")
+    p.add_argument("--type", dest="index_type", choices=INDEX_TYPES, default=env.index_type)
+    p.add_argument("--nlist", type=int, default=env.nlist, help="IVF lists (0 = 4*sqrt(n))")
+    p.add_argument("--nprobe", type=int, default=env.nprobe)
+    p.add_argument("--hnsw-m", type=int, default=env.hnsw_m)
+    p.add_argument("--ef-construction", type=int, default=env.ef_construction)
+    p.add_argument("--ef-search", type=int, default=env.ef_search)
+    p.add_argument("--pq-m", type=int, default=env.pq_m)
+    p.add_argument("--pq-bits", type=int, default=env.pq_bits)
+    p.add_argument("--train-sample", type=int, default=env.train_sample)
+    p.add_argument("--k", type=int, default=10, help="recall@k cut-off")
+    p.add_argument("--queries", type=int, default=200, help="number of perturbed sample queries")
+    p.add_argument("--query-file", help="real queries: .npy embeddings or a text file with one question per line")
+    p.add_argument("--dry-run", action="store_true", help="evaluate without publishing the index")
+    p.add_argument(
+        "--migrate-pickle",
+        action="store_true",
+        help="convert <persist-dir>/nodes.pkl into a node store first (skipped if a node store exists)",
+    )
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    args = _parse_args(argv)
+    config = AnnConfig(**{f.name: getattr(args, f.name) for f in dataclasses.fields(AnnConfig)})
+
+    store = NodeStore.open(args.persist_dir)
+    if store is None and args.migrate_pickle:
+        from .engine import LEGACY_NODES_FILE, migrate_legacy_nodes
+
+        if not os.path.exists(os.path.join(args.persist_dir, LEGACY_NODES_FILE)):
+            raise SystemExit(f"No {LEGACY_NODES_FILE} in {args.persist_dir} to migrate.")
+        store = migrate_legacy_nodes(args.persist_dir)
+        print(f"migrated {LEGACY_NODES_FILE}: {len(store)} nodes")
+    elif args.migrate_pickle:
+        print(f"node store already present in {args.persist_dir}; not migrating")
+    if store is None:
+        raise SystemExit(f"No node store in {args.persist_dir}; start the server once to build it.")
+    vectors = _load_or_recover_vectors(store)
+
+    start = time.perf_counter()
+    index = build_index(vectors, config)
+    build_s = time.perf_counter() - start
+    queries = _load_queries(args.query_file) if args.query_file else None
+    report = evaluate_recall(index, vectors, k=args.k, num_queries=args.queries, queries=queries)
+    size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+    print(f"index:        {type(index).__name__} ({config.index_type})")
+    print(f"vectors:      {len(vectors)} x {vectors.shape[1]}")
+    print(f"build:        {build_s:.2f}s")
+    print(f"size:         {size_mb:.1f} MB (flat: {vectors.nbytes / 1e6:.1f} MB)")
+    source = "real" if queries is not None else "perturbed sample"
+    print(f"recall@{args.k}:    {report['recall']:.4f} over {report['queries']} {source} queries")
+    print(f"latency:      {report['ann_ms']:.3f} ms/query (flat: {report['flat_ms']:.3f} ms/query)")
+
+    if args.dry_run:
+        return 0
+    try:
+        print(f"wrote {publish_index(args.persist_dir, index, store.fingerprint)}")
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Small in-process caches shared by the retrieval chain."""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .metrics import CACHE_REQUESTS
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire after ``ttl`` seconds.
+
+    ``ttl <= 0`` disables expiry; ``maxsize <= 0`` disables the cache.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: Hashable, now: float):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires and expires < now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return the live entries among ``keys``; one lock round-trip."""
+        found: Dict[Hashable, Any] = {}
+        if self.maxsize <= 0:
+            return found
+        now = time.monotonic()
+        requested = 0
+        with self._lock:
+            for key in keys:
+                requested += 1
+                item = self._lookup(key, now)
+                if item is not None:
+                    found[key] = item[1]
+            self.hits += len(found)
+            self.misses += requested - len(found)
+        if found:
+            CACHE_REQUESTS.labels(self.name, "hit").inc(len(found))
+        if requested > len(found):
+            CACHE_REQUESTS.labels(self.name, "miss").inc(requested - len(found))
+        return found
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.put_many({key: value})
+
+    def put_many(self, items: Dict[Hashable, Any]) -> None:
+        if self.maxsize <= 0 or not items:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    think: str = ""
+    citations: List[str] = field(default_factory=list)
+
+
+class SemanticAnswerCache:
+    """Finished answers looked up by cosine similarity of the question embedding.
+
+    Entries are partitioned by language so a German paraphrase never returns
+    an English answer, and by index generation so an answer computed against
+    a previous index is never returned once a new one is published. Matching is a dot product against at most ``maxsize``
+    unit vectors, which is negligible next to retrieval and generation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, threshold: float, name: str = "answers"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.name = name
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def lookup(
+        self, embedding: Sequence[float], is_german: bool, generation: Hashable = None
+    ) -> Optional[CachedAnswer]:
+        if not self.enabled:
+            return None
+        partition = (is_german, generation)
+        query = self._unit(embedding)
+        now = time.monotonic()
+        best_key = None
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e[0] and e[0] < now]:
+                del self._entries[key]
+            keys = [k for k, e in self._entries.items() if e[1] == partition]
+            if keys:
+                sims = np.stack([self._entries[k][2] for k in keys]) @ query
+                i = int(np.argmax(sims))
+                if float(sims[i]) >= self.threshold:
+                    best_key = keys[i]
+            if best_key is None:
+                self.misses += 1
+                hit = None
+            else:
+                self.hits += 1
+                self._entries.move_to_end(best_key)
+                hit = self._entries[best_key][3]
+        CACHE_REQUESTS.labels(self.name, "miss" if hit is None else "hit").inc()
+        return hit
+
+    def add(
+        self, embedding: Sequence[float], is_german: bool, answer: CachedAnswer, generation: Hashable = None
+    ) -> None:
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            self._entries[next(self._ids)] = (expires, (is_german, generation), self._unit(embedding), answer)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
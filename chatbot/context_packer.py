@@ -0,0 +1,215 @@
+"""Token-budgeted prompt context for the legacy engine.
+
+Chunks are added in rerank order until the budget is spent. Neighbouring
+chunks of the same page share ``chunk_overlap`` tokens from the splitter;
+when both are packed, the overlapping span is cut from the later one. The
+nodes' character offsets locate the overlap. Nodes without usable offsets
+fall back to matching a packed chunk's suffix against the new chunk's prefix
+(and the reverse). This matters most for a question that names a page's URL,
+which packs all chunks of that page.
+
+Tokens are counted with a Hugging Face tokenizer when
+``HEIBOT_CONTEXT_TOKENIZER`` names one (e.g. the tokenizer of the Ollama
+model). Otherwise they are estimated: one token per ``CHARS_PER_TOKEN``
+letters of a word, and one per digit or punctuation character. That matches
+a character-based estimate on prose but does not undercount token-dense text
+such as URLs, version numbers or code, so the budget needs no extra headroom.
+"""
+import logging
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .utils import env_int
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SEPARATOR = "\n\n"
+# Letters per token within a word; German prose averages ~3.5 characters per
+# token (spaces included) on Gemma/Llama tokenizers
+CHARS_PER_TOKEN = 4
+MIN_PARTIAL_TOKENS = 64
+# Role markers and turn delimiters the chat template adds around the prompt
+CHAT_TEMPLATE_TOKENS = 32
+# words, single digits (Gemma and Llama 3 split numbers) and single symbols
+_PIECES = re.compile(r"[^\W\d_]+|\d|\S")
+# Shorter suffix/prefix matches are likely coincidence (a shared word), not splitter overlap
+MIN_TEXT_OVERLAP_CHARS = 20
+
+
+class TokenCounter:
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from transformers import AutoTokenizer
+
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            except Exception as exc:
+                logger.warning("Could not load tokenizer %s (%s); estimating tokens", tokenizer_name, exc)
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from a real tokenizer rather than the estimate."""
+        return self.tokenizer is not None
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return sum(_piece_tokens(m.group()) for m in _PIECES.finditer(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if max_tokens <= 0:
+            return ""
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+            return self.tokenizer.decode(ids)
+        used = 0
+        for m in _PIECES.finditer(text):
+            used += _piece_tokens(m.group())
+            if used > max_tokens:
+                return text[: m.start()]
+        return text
+
+
+def _piece_tokens(piece: str) -> int:
+    return math.ceil(len(piece) / CHARS_PER_TOKEN) if piece[0].isalpha() else 1
+
+
+@dataclass
+class PackedContext:
+    text: str
+    nodes: List = field(default_factory=list)  # nodes that made it into the prompt
+    tokens: int = 0
+    dropped: int = 0
+    trimmed_chars: int = 0
+
+
+def _page(node) -> Optional[str]:
+    return node.ref_doc_id or (node.metadata or {}).get("url")
+
+
+def _span(node, text: str) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` of ``text`` in its page, if the node's offsets describe it exactly."""
+    start, end = node.start_char_idx, node.end_char_idx
+    if start is None or end is None or len(text) != end - start:
+        return None
+    return start, end
+
+
+def _text_overlap(head: str, tail: str) -> int:
+    """Length of the longest suffix of ``head`` that is a prefix of ``tail``."""
+    n = min(len(head), len(tail))
+    if n < MIN_TEXT_OVERLAP_CHARS:
+        return 0
+    # KMP failure function over tail-prefix + separator + head-suffix
+    s = tail[:n] + "\0" + head[-n:]
+    fail = [0] * len(s)
+    for i in range(1, len(s)):
+        k = fail[i - 1]
+        while k and s[i] != s[k]:
+            k = fail[k - 1]
+        if s[i] == s[k]:
+            k += 1
+        fail[i] = k
+    return fail[-1] if fail[-1] >= MIN_TEXT_OVERLAP_CHARS else 0
+
+
+class _PackedPages:
+    """What has been packed per page: offset spans and, for the fallback, texts."""
+
+    def __init__(self):
+        self.spans: Dict[str, List[Tuple[int, int]]] = {}
+        self.texts: Dict[str, List[str]] = {}
+
+    def strip(self, node, text: str) -> Tuple[str, int]:
+        """Cut the parts of ``text`` already covered by packed chunks of the same page."""
+        page = _page(node)
+        if page is None:
+            return text, 0
+        span = _span(node, text)
+        if span is not None and page in self.spans:
+            start, end = span
+            lo, hi = start, end
+            for a, b in self.spans[page]:
+                if a <= lo < b:  # head already packed
+                    lo = b
+                if a < hi <= b:  # tail already packed
+                    hi = a
+            if lo >= hi:
+                return "", len(text)
+            return text[lo - start:hi - start], (lo - start) + (end - hi)
+        out = text
+        for packed in self.texts.get(page, []):
+            if out in packed:
+                return "", len(text)
+            head = _text_overlap(packed, out)
+            out = out[head:]
+            tail = _text_overlap(out, packed)
+            out = out[:len(out) - tail]
+        return out, len(text) - len(out)
+
+    def add(self, node, text: str) -> None:
+        page = _page(node)
+        if page is None:
+            return
+        span = _span(node, text)
+        if span is not None:
+            self.spans.setdefault(page, []).append(span)
+        self.texts.setdefault(page, []).append(text)
+
+
+class ContextPacker:
+    def __init__(self, budget: int, counter: Optional[TokenCounter] = None,
+                 render: Optional[Callable] = None):
+        self.budget = budget
+        self.counter = counter or TokenCounter()
+        # render(node, text) -> prompt block; defaults to the bare text
+        self.render = render or (lambda node, text: text)
+
+    def pack(self, nodes: Sequence, budget: Optional[int] = None) -> PackedContext:
+        """Pack ``nodes`` in order into ``budget`` tokens (default: the packer's budget)."""
+        budget = self.budget if budget is None else budget
+        out = PackedContext(text="")
+        blocks: List[str] = []
+        sep_tokens = self.counter.count(CONTEXT_SEPARATOR)
+        packed = _PackedPages()
+        for node in nodes:
+            content = node.get_content()
+            text, trimmed = packed.strip(node, content)
+            if not text.strip():
+                out.trimmed_chars += trimmed
+                continue
+            block = self.render(node, text)
+            cost = self.counter.count(block) + (sep_tokens if blocks else 0)
+            remaining = budget - out.tokens
+            if cost > remaining:
+                if blocks and remaining < MIN_PARTIAL_TOKENS:
+                    out.dropped += 1
+                    continue
+                block = self.counter.truncate(block, remaining - (sep_tokens if blocks else 0))
+                if not block.strip():
+                    out.dropped += 1
+                    continue
+                cost = self.counter.count(block) + (sep_tokens if blocks else 0)
+            blocks.append(block)
+            out.nodes.append(node)
+            out.tokens += cost
+            out.trimmed_chars += trimmed
+            packed.add(node, content)
+        out.text = CONTEXT_SEPARATOR.join(blocks)
+        return out
+
+
+def context_budget(num_ctx: int, num_predict: int, reserve: int) -> int:
+    """Context budget: what is left of ``num_ctx`` after the answer
+    (``num_predict``), the prompt around the context (``reserve`` tokens,
+    counted for the actual question) and the chat template.
+
+    ``HEIBOT_CONTEXT_TOKENS`` overrides the result as is.
+    """
+    budget = env_int("HEIBOT_CONTEXT_TOKENS", 0)
+    if budget > 0:
+        return budget
+    return max(256, num_ctx - num_predict - reserve - CHAT_TEMPLATE_TOKENS)
@@ -0,0 +1,189 @@
+"""Conversation history stores for the legacy chatbot.
+
+``InMemoryConversationStore`` keeps the newest ``max_history`` messages of at
+most ``max_sessions`` sessions and forgets sessions idle for ``ttl`` seconds.
+``RedisConversationStore`` keeps the same shape in Redis lists so that every
+gunicorn worker sees the same history. Both write a whole turn (user and
+assistant message) in one operation.
+
+The engine is async and uses the ``a``-prefixed methods. The in-memory store
+answers them inline. The Redis store runs its blocking client calls in a
+worker thread, so a slow Redis does not stall every other stream.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .utils import env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+Message = Tuple[str, str]  # (role, content)
+
+
+class ConversationStore(ABC):
+    def __init__(self, max_history: int = 5, ttl: float = 1800.0, max_message_chars: int = 4000):
+        self.max_history = max_history
+        self.ttl = ttl
+        self.max_message_chars = max_message_chars
+
+    @abstractmethod
+    def get_conversation_histories(self, session_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+        """Return the history of each session id (empty list if unknown)."""
+
+    @abstractmethod
+    def add_messages(self, session_id: str, messages: Sequence[Message]) -> None:
+        """Append ``messages`` and trim the session to ``max_history``."""
+
+    @abstractmethod
+    def clear_conversation(self, session_id: str) -> None:
+        ...
+
+    def _clip(self, content: str) -> str:
+        # history only feeds keyword hints, so long answers need not be kept whole
+        return content[: self.max_message_chars] if self.max_message_chars > 0 else content
+
+    def get_conversation_history(self, session_id: str) -> List[Dict]:
+        return self.get_conversation_histories([session_id])[session_id]
+
+    def add_message(self, session_id: str, role: str, content: str) -> None:
+        self.add_messages(session_id, [(role, content)])
+
+    async def aget_conversation_history(self, session_id: str) -> List[Dict]:
+        return self.get_conversation_history(session_id)
+
+    async def aadd_messages(self, session_id: str, messages: Sequence[Message]) -> None:
+        self.add_messages(session_id, messages)
+
+
+class InMemoryConversationStore(ConversationStore):
+    def __init__(self, max_history: int = 5, ttl: float = 1800.0, max_sessions: int = 10000):
+        super().__init__(max_history, ttl)
+        self.max_sessions = max_sessions
+        # session id -> (last access, messages); least recently used first
+        self._sessions: "OrderedDict[str, Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _live(self, session_id: str, now: float):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if self.ttl > 0 and now - entry[0] > self.ttl:
+            del self._sessions[session_id]
+            return None
+        return entry[1]
+
+    def get_conversation_histories(self, session_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+        now = time.monotonic()
+        out: Dict[str, List[Dict]] = {}
+        with self._lock:
+            for sid in session_ids:
+                hist = self._live(sid, now)
+                if hist is not None:
+                    self._sessions[sid] = (now, hist)
+                    self._sessions.move_to_end(sid)
+                out[sid] = list(hist or [])
+        return out
+
+    def add_messages(self, session_id: str, messages: Sequence[Message]) -> None:
+        now = time.monotonic()
+        stamp = datetime.now()
+        with self._lock:
+            hist = self._live(session_id, now) or []
+            hist.extend(
+                {"role": role, "content": self._clip(content), "timestamp": stamp} for role, content in messages
+            )
+            del hist[: max(0, len(hist) - self.max_history)]
+            self._sessions[session_id] = (now, hist)
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        if self.ttl > 0:
+            # oldest first, so stop at the first live session
+            while self._sessions:
+                sid, (last, _) = next(iter(self._sessions.items()))
+                if now - last <= self.ttl:
+                    break
+                del self._sessions[sid]
+
+    def clear_conversation(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class RedisConversationStore(ConversationStore):
+    """One Redis list per session, trimmed and expired on every write."""
+
+    def __init__(self, url: str, max_history: int = 5, ttl: float = 1800.0, prefix: str = "heibot:conv:"):
+        super().__init__(max_history, ttl)
+        try:
+            import redis
+        except ImportError as exc:  # pragma: no cover - depends on deployment
+            raise RuntimeError("HEIBOT_CONVERSATION_REDIS_URL is set but the redis package is not installed") from exc
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    @staticmethod
+    def _decode(raw) -> Dict:
+        msg = json.loads(raw)
+        msg["timestamp"] = datetime.fromisoformat(msg["timestamp"])
+        return msg
+
+    def get_conversation_histories(self, session_ids: Iterable[str]) -> Dict[str, List[Dict]]:
+        ids = list(session_ids)
+        pipe = self.client.pipeline(transaction=False)
+        for sid in ids:
+            pipe.lrange(self._key(sid), 0, -1)
+        return {sid: [self._decode(m) for m in raw] for sid, raw in zip(ids, pipe.execute())}
+
+    def add_messages(self, session_id: str, messages: Sequence[Message]) -> None:
+        if not messages:
+            return
+        stamp = datetime.now().isoformat()
+        payloads = [
+            json.dumps({"role": role, "content": self._clip(content), "timestamp": stamp}, ensure_ascii=False)
+            for role, content in messages
+        ]
+        key = self._key(session_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(key, *payloads)
+        pipe.ltrim(key, -self.max_history, -1)
+        if self.ttl > 0:
+            pipe.expire(key, int(self.ttl))
+        pipe.execute()
+
+    def clear_conversation(self, session_id: str) -> None:
+        self.client.delete(self._key(session_id))
+
+    async def aget_conversation_history(self, session_id: str) -> List[Dict]:
+        return await asyncio.to_thread(self.get_conversation_history, session_id)
+
+    async def aadd_messages(self, session_id: str, messages: Sequence[Message]) -> None:
+        await asyncio.to_thread(self.add_messages, session_id, messages)
+
+
+def create_conversation_store(max_history: int = 5) -> ConversationStore:
+    """Pick the backend from the environment; Redis when a URL is configured."""
+    ttl = env_float("HEIBOT_CONVERSATION_TTL", 1800.0)
+    redis_url = os.getenv("HEIBOT_CONVERSATION_REDIS_URL")
+    if redis_url:
+        logger.info("Storing conversations in Redis")
+        return RedisConversationStore(redis_url, max_history=max_history, ttl=ttl)
+    max_sessions = env_int("HEIBOT_MAX_SESSIONS", 10000)
+    return InMemoryConversationStore(max_history=max_history, ttl=ttl, max_sessions=max_sessions)
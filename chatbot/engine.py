@@ -1,44 +1,54 @@
 import os
-import glob
 import pickle
 import logging
 import asyncio
 import re
 import time
-from datetime import datetime
+from dataclasses import dataclass
 from typing import List, Optional, Union, Dict
 from urllib.parse import urlparse, urlunparse
 import json
 import threading
 
-import aiohttp
-import requests
-import xml.etree.ElementTree as ET
 from bs4 import BeautifulSoup
 
 from llama_index.core import (
     Settings,
     Document,
-    VectorStoreIndex,
     QueryBundle,
-    load_index_from_storage,
 )
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.schema import NodeWithScore
-from llama_index.core.retrievers import VectorIndexRetriever, BaseRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.retrievers import BaseRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.core.storage import StorageContext
-from llama_index.vector_stores.faiss import FaissVectorStore
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.core.base.llms.types import LLMMetadata
 from llama_index.llms.ollama import Ollama
 from llama_index.core.llms import ChatMessage
 
-from sentence_transformers import CrossEncoder
 import faiss
-import torch
+import numpy as np
+
+from .utils import normalize_url, extract_url, clean_response_text, env_float, env_int
+from .keyword_index import BM25Index, load_aux_indexes, save_aux_indexes
+from .node_store import NodeStore, current_generation, write_node_store
+from .inference import run_inference
+from .rerank_service import RerankBatcher, RerankPolicy
+from .trace import RetrievalTrace, current_trace, use_trace
+from .cache import CachedAnswer, SemanticAnswerCache, TTLCache
+from .context_packer import ContextPacker, PackedContext, TokenCounter, context_budget
+from .conversation_store import create_conversation_store
+from .sitemap import SitemapLoader
+from .query_router import RAG, META, QueryRouter
+from .ann import (
+    FAISS_INDEX_FILE,
+    VECTORS_FILE,
+    AnnConfig,
+    build_index,
+    configure_search,
+    reconstruct_vectors,
+)
 
-from .utils import normalize_url, extract_url, clean_response_text
+logger = logging.getLogger(__name__)
 
 # ============================== DEBUG SETUP ================================= #
 
@@ -114,26 +124,10 @@ OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 
 # ---- Ollama runtime tuning ------------------------------------------------- #
 
-def _env_int(name: str, default: int) -> int:
-    try:
-        value = os.getenv(name)
-        return int(value) if value is not None else default
-    except (TypeError, ValueError):
-        return default
-
-
-def _env_float(name: str, default: float) -> float:
-    try:
-        value = os.getenv(name)
-        return float(value) if value is not None else default
-    except (TypeError, ValueError):
-        return default
-
-
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma3:27b")
-OLLAMA_TEMPERATURE = _env_float("OLLAMA_TEMPERATURE", 0.2)
-OLLAMA_NUM_PREDICT = _env_int("OLLAMA_NUM_PREDICT", 512)
-OLLAMA_NUM_CTX = _env_int("OLLAMA_NUM_CTX", 2048)
+OLLAMA_TEMPERATURE = env_float("OLLAMA_TEMPERATURE", 0.2)
+OLLAMA_NUM_PREDICT = env_int("OLLAMA_NUM_PREDICT", 512)
+OLLAMA_NUM_CTX = env_int("OLLAMA_NUM_CTX", 2048)
 OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
 
 ollama_options = {}
@@ -181,54 +175,212 @@ additional_kwargs = {"num_predict": OLLAMA_NUM_PREDICT, "num_ctx": OLLAMA_NUM_CT
 if ollama_options:
     additional_kwargs["options"] = ollama_options
 
-Settings.llm = PatchedOllama(
-    model=OLLAMA_MODEL,
-    base_url=OLLAMA_BASE_URL,
-    temperature=OLLAMA_TEMPERATURE,
-    system_prompt=SYSTEM_PROMPT,
-    additional_kwargs=additional_kwargs,
-    keep_alive=OLLAMA_KEEP_ALIVE,
-)
-
-logger = logging.getLogger(__name__)
-
 # --------------------------------------------------------------------------- #
-#                                Embeddings (DE/EN)                           #
+#                     Models (loaded on first use, see warmup())              #
 # --------------------------------------------------------------------------- #
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-Settings.embed_model = HuggingFaceEmbedding(
-    model_name="sentence-transformers/paraphrase-multilingual-mpnet-base-v2",
-    device=DEVICE,
+EMBED_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+RERANK_MODEL_NAME = "BAAI/bge-reranker-v2-m3"
+# "torch" (default) or "onnx" (int8 ONNX Runtime on CPU, see chatbot/onnx_backend.py)
+INFERENCE_BACKEND = os.getenv("HEIBOT_INFERENCE_BACKEND", "torch").lower()
+
+# One worker thread owns the cross-encoder: concurrent requests are coalesced
+# into larger predict batches instead of queueing behind a global lock.
+RERANKER_BATCH_WINDOW_MS = env_float("RERANKER_BATCH_WINDOW_MS", 5.0)
+RERANKER_MAX_BATCH_PAIRS = env_int("RERANKER_MAX_BATCH_PAIRS", 64)
+RERANKER_PREDICT_BATCH_SIZE = env_int("RERANKER_PREDICT_BATCH_SIZE", 16)
+RERANK_POLICY = RerankPolicy(
+    skip_margin=env_float("RERANKER_SKIP_MARGIN", 0.15),
+    chunk_size=env_int("RERANKER_CHUNK_SIZE", 8),
+    early_exit_score=env_float("RERANKER_EARLY_EXIT_SCORE", 0.0),
+    max_passage_chars=env_int("RERANKER_MAX_PASSAGE_CHARS", 1200),
 )
 
-# --------------------------------------------------------------------------- #
-#                         Cross-encoder reranker (multilingual)               #
-# --------------------------------------------------------------------------- #
+_MODEL_LOCK = threading.Lock()
+_llm = None
+_embed_model = None
+_rerank_model = None
+_rerank_service = None
+_device = None
+
+def get_device() -> str:
+    global _device
+    if _device is None:
+        import torch
+
+        _device = "cuda" if torch.cuda.is_available() else "cpu"
+        if _device == "cuda":
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+    return _device
+
+def get_llm() -> PatchedOllama:
+    """The Ollama chat model; also installed as ``Settings.llm``."""
+    global _llm
+    if _llm is None:
+        with _MODEL_LOCK:
+            if _llm is None:
+                _llm = PatchedOllama(
+                    model=OLLAMA_MODEL,
+                    base_url=OLLAMA_BASE_URL,
+                    temperature=OLLAMA_TEMPERATURE,
+                    system_prompt=SYSTEM_PROMPT,
+                    additional_kwargs=additional_kwargs,
+                    keep_alive=OLLAMA_KEEP_ALIVE,
+                )
+                Settings.llm = _llm
+    return _llm
+
+def get_embed_model():
+    """The multilingual (DE/EN) embedding model; also ``Settings.embed_model``."""
+    global _embed_model
+    if _embed_model is None:
+        with _MODEL_LOCK:
+            if _embed_model is None:
+                start = time.perf_counter()
+                if INFERENCE_BACKEND == "onnx":
+                    _embed_model = _load_onnx("OnnxEmbedding", EMBED_MODEL_NAME)
+                if _embed_model is None:
+                    _embed_model = _load_torch_embedding()
+                Settings.embed_model = _embed_model
+                logger.info("Loaded %s in %.1fs", EMBED_MODEL_NAME, time.perf_counter() - start)
+    return _embed_model
+
+def _load_onnx(class_name: str, model_name: str, **kwargs):
+    """ONNX Runtime model from ``chatbot.onnx_backend``; ``None`` (torch fallback) if it cannot load."""
+    from . import onnx_backend
 
-rerank_model = CrossEncoder(
-    "BAAI/bge-reranker-v2-m3",
-    max_length=512,
-    device=DEVICE,
-)
+    try:
+        return getattr(onnx_backend, class_name)(model_name, **kwargs)
+    except (RuntimeError, OSError) as exc:
+        logger.warning("ONNX backend unavailable for %s (%s); falling back to PyTorch", model_name, exc)
+        return None
+
+def _load_torch_embedding():
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
-if DEVICE == "cuda":
-    torch.backends.cuda.matmul.allow_tf32 = True
-    torch.backends.cudnn.allow_tf32 = True
+    return HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME, device=get_device())
 
-    if os.getenv("RERANKER_FP16", "1").lower() not in {"0", "false", "no"}:
+def _load_torch_cross_encoder():
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(RERANK_MODEL_NAME, max_length=512, device=get_device())
+    if get_device() == "cuda" and os.getenv("RERANKER_FP16", "1").lower() not in {"0", "false", "no"}:
         try:
-            rerank_model.model.half()
+            model.model.half()
         except AttributeError:
             logger.debug("Cross-encoder model does not support half precision")
+    return model
+
+def get_rerank_model():
+    """The multilingual cross-encoder reranker."""
+    global _rerank_model
+    if _rerank_model is None:
+        with _MODEL_LOCK:
+            if _rerank_model is None:
+                start = time.perf_counter()
+                if INFERENCE_BACKEND == "onnx":
+                    _rerank_model = _load_onnx("OnnxCrossEncoder", RERANK_MODEL_NAME, max_length=512)
+                if _rerank_model is None:
+                    _rerank_model = _load_torch_cross_encoder()
+                logger.info("Loaded %s in %.1fs", RERANK_MODEL_NAME, time.perf_counter() - start)
+    return _rerank_model
+
+def get_rerank_service() -> RerankBatcher:
+    global _rerank_service
+    if _rerank_service is None:
+        model = get_rerank_model()
+        with _MODEL_LOCK:
+            if _rerank_service is None:
+                _rerank_service = RerankBatcher(
+                    model,
+                    window_ms=RERANKER_BATCH_WINDOW_MS,
+                    max_batch_pairs=RERANKER_MAX_BATCH_PAIRS,
+                    predict_batch_size=RERANKER_PREDICT_BATCH_SIZE,
+                    name="bge-reranker-v2-m3",
+                )
+    return _rerank_service
+
+def warmup() -> None:
+    """Load all models and run one dummy embedding and rerank.
 
-# Serialize cross-encoder calls across threads to avoid GPU/torch races
-_RERANK_LOCK = threading.Lock()
+    Call at startup so the first user request does not pay for model loading
+    and the first (slow) forward pass.
+    """
+    start = time.perf_counter()
+    get_llm()
+    get_embed_model().get_query_embedding("warmup")
+    get_rerank_service().score([("warmup", "warmup")])
+    if ROUTER_ENABLED:
+        query_router.warmup()
+    logger.info("Model warmup finished in %.1fs", time.perf_counter() - start)
+
+# (normalized query, node id) -> cross-encoder score; cleared with the index
+rerank_score_cache = TTLCache(
+    maxsize=env_int("RERANKER_CACHE_SIZE", 20000),
+    ttl=env_float("RERANKER_CACHE_TTL", 3600.0),
+    name="rerank_scores",
+)
 
 PERSIST_DIR = "index_store"
+# Pre-node-store pickle; converted offline by ``chatbot.build_index --migrate-pickle``
+LEGACY_NODES_FILE = "nodes.pkl"
+SITEMAP_URL = os.getenv("HEIBOT_SITEMAP_URL", "https://www.urz.uni-heidelberg.de/sitemap.xml")
+
+# Upper bound on BM25 candidates the keyword stage hands to the cross-encoder
+KEYWORD_TOP_N = env_int("KEYWORD_TOP_N", 10)
+# Rank offset for reciprocal rank fusion of vector, BM25 and keyword_map hits
+RRF_K = env_int("RRF_K", 60)
 
 RAG_CHAR_MIN = 300
 
+# Packs prompt context in rerank order; built on first use because loading
+# HEIBOT_CONTEXT_TOKENIZER is slow
+_context_packer: Optional[ContextPacker] = None
+
+CONTEXT_PROMPT = (
+    "Answer using ONLY the context below. If the context is insufficient, say so.\n\n"
+    "Context:\n{context}\n\nQuestion:\n{question}"
+)
+
+def _render_context_block(node, text: str) -> str:
+    metadata_str = node.get_metadata_str(mode=MetadataMode.ALL).strip()
+    if not metadata_str:
+        return text
+    return node.text_template.format(content=text, metadata_str=metadata_str).strip()
+
+def get_context_packer() -> ContextPacker:
+    global _context_packer
+    if _context_packer is None:
+        counter = TokenCounter(os.getenv("HEIBOT_CONTEXT_TOKENIZER"))
+        # upper bound; each turn packs into what its own prompt leaves over
+        budget = context_budget(OLLAMA_NUM_CTX, OLLAMA_NUM_PREDICT, reserve=0)
+        _context_packer = ContextPacker(budget, counter, render=_render_context_block)
+    return _context_packer
+
+def _pack_context(message: str, nodes: List[NodeWithScore]) -> PackedContext:
+    """Pack ``nodes`` into the window left after the answer and the prompt for ``message``."""
+    packer = get_context_packer()
+    reserve = packer.counter.count(CONTEXT_PROMPT.format(context="", question=message))
+    budget = context_budget(OLLAMA_NUM_CTX, OLLAMA_NUM_PREDICT, reserve)
+    return packer.pack([_as_node(n) for n in nodes], budget=budget)
+
+# Standalone questions whose embedding is this close to an answered one reuse
+# that answer (and its citations) without retrieval or generation.
+answer_cache = SemanticAnswerCache(
+    maxsize=env_int("ANSWER_CACHE_SIZE", 512),
+    ttl=env_float("ANSWER_CACHE_TTL", 6 * 3600.0),
+    threshold=env_float("ANSWER_CACHE_THRESHOLD", 0.92),
+)
+ANSWER_CACHE_STREAM_DELAY = env_float("ANSWER_CACHE_STREAM_DELAY", 0.01)
+
+# Meta and chit-chat turns skip retrieval and go straight to the LLM
+ROUTER_ENABLED = os.getenv("HEIBOT_ROUTER", "1") != "0"
+query_router = QueryRouter(
+    embed_batch=lambda texts: get_embed_model().get_text_embedding_batch(texts),
+    threshold=env_float("HEIBOT_ROUTER_THRESHOLD", 0.85),
+)
+
 INSUFFICIENT_PATTERNS = [
     "context provided does not contain",
     "i couldn’t find that information",
@@ -329,28 +481,7 @@ def _pronoun_only(q: str) -> bool:
 
 # --------------------------------------------------------------------------- #
 
-class ConversationManager:
-    def __init__(self, max_history: int = 5):
-        self.max_history = max_history
-        self.conversations: Dict[str, List[Dict]] = {}
-        self._lock = threading.RLock()
-
-    def add_message(self, session_id: str, role: str, content: str):
-        with self._lock:
-            hist = self.conversations.setdefault(session_id, [])
-            hist.append({"role": role, "content": content, "timestamp": datetime.now()})
-            if len(hist) > self.max_history:
-                hist.pop(0)
-
-    def get_conversation_history(self, session_id: str):
-        with self._lock:
-            return list(self.conversations.get(session_id, []))
-
-    def clear_conversation(self, session_id: str):
-        with self._lock:
-            self.conversations.pop(session_id, None)
-
-conversation_manager = ConversationManager()
+conversation_manager = create_conversation_store()
 
 # --------------------------------------------------------------------------- #
 #                               Helpers & gates                               #
@@ -359,6 +490,10 @@ conversation_manager = ConversationManager()
 def _as_node(x):
     return x.node if isinstance(x, NodeWithScore) else x
 
+def _normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used as a cache key."""
+    return " ".join((text or "").lower().split()).rstrip("?!. ")
+
 def _tokenize_query(text: str) -> List[str]:
     toks = re.findall(r"[A-Za-zÄÖÜäöüß\-]{3,}", (text or "").lower())
     return [t for t in toks if t not in STOPWORDS_DE_EN]
@@ -414,16 +549,70 @@ def _used_rag_meaningfully(query: str, answer: str, nodes: List[NodeWithScore])
 #                          Retrieval wrappers / chain                          #
 # --------------------------------------------------------------------------- #
 
+def reciprocal_rank_fusion(ranked_lists, weights=None, k: int = RRF_K) -> List[NodeWithScore]:
+    """Fuse ranked node lists: each node scores ``sum(w / (k + rank))``.
+
+    Nodes are identified by ``node_id``; ties keep first-seen order.
+    """
+    fused: Dict[str, float] = {}
+    by_id: Dict[str, object] = {}
+    for li, ranked in enumerate(ranked_lists):
+        w = weights[li] if weights else 1.0
+        for rank, n in enumerate(ranked, start=1):
+            node = _as_node(n)
+            fused[node.node_id] = fused.get(node.node_id, 0.0) + w / (k + rank)
+            by_id.setdefault(node.node_id, node)
+    order = sorted(fused, key=fused.get, reverse=True)
+    return [NodeWithScore(node=by_id[i], score=fused[i]) for i in order]
+
+
+class FaissNodeRetriever(BaseRetriever):
+    """Dense search over the FAISS index, resolved through the node store.
+
+    FAISS row ``i`` is node store row ``i``, so no docstore is involved. Scores
+    are ``1 / (1 + L2 distance)``: higher is better.
+    """
+    def __init__(self, faiss_index, node_store: NodeStore, similarity_top_k: int = 8):
+        super().__init__()
+        self.faiss_index = faiss_index
+        self.node_store = node_store
+        self.similarity_top_k = similarity_top_k
+
+    def _search(self, embedding) -> List[NodeWithScore]:
+        if not self.faiss_index.ntotal:
+            return []
+        query = np.asarray(embedding, dtype="float32")[np.newaxis, :]
+        dists, idxs = self.faiss_index.search(query, self.similarity_top_k)
+        out = []
+        for dist, idx in zip(dists[0], idxs[0]):
+            if idx < 0:
+                continue
+            out.append(NodeWithScore(node=self.node_store[int(idx)], score=1.0 / (1.0 + float(dist))))
+        return out
+
+    def _retrieve(self, query_bundle: QueryBundle):
+        # the router may already have embedded this text for the turn
+        embedding = current_trace().embeddings.get(query_bundle.query_str)
+        if embedding is None:
+            embedding = get_embed_model().get_query_embedding(query_bundle.query_str)
+        return self._search(embedding)
+
+    async def _aretrieve(self, query_bundle: QueryBundle):
+        # embedding + FAISS search run on the inference pool, off the event loop
+        return await run_inference("vector_search", self._retrieve, query_bundle)
+
 class HistoryAwareVectorRetriever(BaseRetriever):
     """Augments latest query with compact topic hints (pronoun-aware).
 
-    DEBUG: stores last_query for inspection.
+    A standalone turn whose query is already embedded on the trace is searched
+    as asked: its hints would only repeat the query's own keywords, and the
+    stored embedding saves an embedder pass. Records the searched query as
+    ``vector_query`` on the request trace.
     """
-    def __init__(self, base: VectorIndexRetriever, max_chars: int = 512):
+    def __init__(self, base: BaseRetriever, max_chars: int = 512):
         super().__init__()
         self.base = base
         self.max_chars = max_chars
-        self.last_query: Optional[str] = None
 
     def _compose(self, latest_query: str, chat_history: Optional[str], history_for_keywords: Optional[str]) -> str:
         # Prefer current query keywords; fall back to history when the query is pronoun-like
@@ -449,19 +638,31 @@ class HistoryAwareVectorRetriever(BaseRetriever):
     def _to_text(self, qb: Union[QueryBundle, str]) -> str:
         return qb.query_str if isinstance(qb, QueryBundle) else str(qb)
 
+    def _vector_query(self, trace: RetrievalTrace, query_bundle: Union[QueryBundle, str], user_context) -> str:
+        latest = self._to_text(query_bundle)
+        if not user_context and latest in trace.embeddings:
+            return latest
+        return self._compose(latest, None, user_context)
+
     def _retrieve(self, query_bundle: Union[QueryBundle, str], **kwargs):
-        user_context = kwargs.get("user_context", "")
-        full_q = self._compose(self._to_text(query_bundle), None, user_context)
-        self.last_query = full_q
+        trace = current_trace()
+        full_q = self._vector_query(trace, query_bundle, kwargs.get("user_context", ""))
+        trace.set("vector_query", full_q)
         fwd = {k: v for k, v in kwargs.items() if k not in ("chat_history", "user_context")}
-        return self.base.retrieve(full_q, **fwd)
+        with trace.timed("history"):
+            nodes = self.base.retrieve(full_q, **fwd)
+        trace.count("vector", len(nodes))
+        return nodes
 
     async def aretrieve(self, query_bundle: Union[QueryBundle, str], **kwargs):
-        user_context = kwargs.get("user_context", "")
-        full_q = self._compose(self._to_text(query_bundle), None, user_context)
-        self.last_query = full_q
+        trace = current_trace()
+        full_q = self._vector_query(trace, query_bundle, kwargs.get("user_context", ""))
+        trace.set("vector_query", full_q)
         fwd = {k: v for k, v in kwargs.items() if k not in ("chat_history", "user_context")}
-        return await self.base.aretrieve(full_q, **fwd)
+        with trace.timed("history"):
+            nodes = await self.base.aretrieve(full_q, **fwd)
+        trace.count("vector", len(nodes))
+        return nodes
 
 class UniqueUrlRetriever(BaseRetriever):
     def __init__(self, base: BaseRetriever, max_unique: int = 10):
@@ -483,46 +684,52 @@ class UniqueUrlRetriever(BaseRetriever):
         return filtered
 
     def _retrieve(self, query_bundle: QueryBundle, **kwargs):
-        nodes = self.base.retrieve(query_bundle, **kwargs)
-        return self._filter_unique(nodes)
+        trace = current_trace()
+        with trace.timed("unique_url"):
+            nodes = self._filter_unique(self.base.retrieve(query_bundle, **kwargs))
+        trace.count("unique_url", len(nodes))
+        return nodes
 
     async def aretrieve(self, query_bundle: QueryBundle, **kwargs):
-        nodes = await self.base.aretrieve(query_bundle, **kwargs)
-        return self._filter_unique(nodes)
+        trace = current_trace()
+        with trace.timed("unique_url"):
+            nodes = self._filter_unique(await self.base.aretrieve(query_bundle, **kwargs))
+        trace.count("unique_url", len(nodes))
+        return nodes
 
 class KeywordFallbackRetriever(BaseRetriever):
-    """Primary results + token/keyword matches. DEBUG: stores last tokens & urls."""
+    """Primary results + BM25/keyword matches, fused by reciprocal rank.
+
+    The async path runs the vector chain and the BM25 lookup concurrently.
+    Tokens, URLs, counts and stage timings go to the request trace.
+    """
+    # keyword_map hits are curated, so they weigh more in the fusion
+    fusion_weights = (2.0, 1.0, 1.0)  # keyword_map, BM25, vector
     def __init__(
         self,
         primary: BaseRetriever,
         nodes,
         url_map,
-        token_index,
+        keyword_index: BM25Index,
         keyword_map=None,
         token_node_limit=None,
-        fallback_limit=None,
     ):
         super().__init__()
         self.primary = primary
         self.nodes = nodes
         self.url_map = url_map
-        self.token_index = token_index
+        self.keyword_index = keyword_index
         self.keyword_map = {}
-        self.token_node_limit = token_node_limit or len(nodes)
-        self.fallback_limit = fallback_limit or len(nodes)
+        self.token_node_limit = token_node_limit or KEYWORD_TOP_N
         self._token_pattern = re.compile(r"[A-Za-zÄÖÜäöüß]{4,}")
         self._url_pattern = re.compile(r"https?://[^\s]+")
-        # debug
-        self.last_tokens: List[str] = []
-        self.last_priority_urls: List[str] = []
-        self.last_combined_urls: List[str] = []
 
         if keyword_map:
             for key, urls in keyword_map.items():
                 merged = []
                 for u in urls:
                     norm = normalize_url(u)
-                    merged.extend(url_map.get(norm, []))
+                    merged.extend(nodes[i] for i in url_map.get(norm, []))
                 if merged:
                     self.keyword_map[key] = merged
 
@@ -551,13 +758,15 @@ class KeywordFallbackRetriever(BaseRetriever):
         q_full = f"{user_ctx or ''}\n{history or ''}\n{q}".lower()
 
         # explicit URL presence
+        trace = current_trace()
         for url in self._url_pattern.findall(q_full):
             norm = normalize_url(url)
             if norm in self.url_map:
-                nodes = [NodeWithScore(node=n) for n in self.url_map[norm]]
-                self.last_tokens = []
-                self.last_priority_urls = [norm]
-                self.last_combined_urls = [norm]
+                nodes = [NodeWithScore(node=self.nodes[i]) for i in self.url_map[norm]]
+                trace.set("keyword_tokens", [])
+                trace.set("priority_urls", [norm])
+                trace.set("combined_urls", [norm])
+                trace.count("fused", len(nodes))
                 return nodes
 
         priority = []
@@ -570,96 +779,180 @@ class KeywordFallbackRetriever(BaseRetriever):
                     if u: priority_urls.append(u)
 
         tokens = self._tokens_from_query_and_history(q, history, user_ctx)
-        self.last_tokens = tokens
+        trace.set("keyword_tokens", tokens)
+        trace.set("priority_urls", priority_urls)
 
         return priority, priority_urls, tokens
 
+    def _keyword_nodes(self, tokens: List[str]) -> List[NodeWithScore]:
+        hits = self.keyword_index.search(tokens, top_n=self.token_node_limit)
+        return [NodeWithScore(node=self.nodes[i], score=score) for i, score in hits]
+
     def _post(self, combined):
-        if combined:
-            filtered, seen_urls = [], set()
-            for n in combined:
-                url = extract_url(_as_node(n))
-                if url and url not in seen_urls:
-                    seen_urls.add(url)
-                    filtered.append(n if isinstance(n, NodeWithScore) else NodeWithScore(node=n))
-            self.last_combined_urls = list(seen_urls)
-            return filtered
-        self.last_combined_urls = []
-        return []
+        filtered, seen_urls = [], []
+        for n in combined:
+            url = extract_url(_as_node(n))
+            if url and url not in seen_urls:
+                seen_urls.append(url)
+                filtered.append(n if isinstance(n, NodeWithScore) else NodeWithScore(node=n))
+        current_trace().set("combined_urls", seen_urls)
+        return filtered
+
+    def _search_keywords(self, tokens: List[str]) -> List[NodeWithScore]:
+        trace = current_trace()
+        with trace.timed("keyword"):
+            nodes = self._keyword_nodes(tokens)
+        trace.count("keyword", len(nodes))
+        return nodes
+
+    def _fuse(self, priority, token_nodes, results):
+        trace = current_trace()
+        with trace.timed("fusion"):
+            fused = reciprocal_rank_fusion([priority, token_nodes, results or []], self.fusion_weights)
+            out = self._post(fused)
+        # raw dense scores for the reranker's skip margin; fused scores are RRF
+        trace.set("vector_scores", {n.node.node_id: n.score for n in results or []})
+        trace.count("fused", len(out))
+        return out
 
     def _retrieve(self, query_bundle: QueryBundle, **kwargs):
         res = self._retrieve_common(query_bundle, **kwargs)
         if isinstance(res, list):  # direct return
             return res
-        priority, priority_urls, tokens = res
+        priority, _, tokens = res
         results = self.primary.retrieve(query_bundle, **kwargs)
-        token_nodes = []
-        for t in tokens:
-            for n in self.token_index.get(t, []):
-                if n not in token_nodes:
-                    token_nodes.append(n)
-                if len(token_nodes) >= self.token_node_limit:
-                    break
-        self.last_priority_urls = priority_urls
-        return self._post(priority + token_nodes + (results or []))
+        token_nodes = self._search_keywords(tokens)
+        return self._fuse(priority, token_nodes, results)
 
     async def aretrieve(self, query_bundle: QueryBundle, **kwargs):
         res = self._retrieve_common(query_bundle, **kwargs)
         if isinstance(res, list):  # direct return
             return res
-        priority, priority_urls, tokens = res
-        results = await self.primary.aretrieve(query_bundle, **kwargs)
-        token_nodes = []
-        for t in tokens:
-            for n in self.token_index.get(t, []):
-                if n not in token_nodes:
-                    token_nodes.append(n)
-                if len(token_nodes) >= self.token_node_limit:
-                    break
-        self.last_priority_urls = priority_urls
-        return self._post(priority + token_nodes + (results or []))
+        priority, _, tokens = res
+        results, token_nodes = await asyncio.gather(
+            self.primary.aretrieve(query_bundle, **kwargs),
+            run_inference("keyword_search", self._search_keywords, tokens),
+        )
+        return self._fuse(priority, token_nodes, results)
+
+def _score_key(query: str):
+    # scores from an older index generation must not be reused after a rebuild
+    return current_trace().get("index_generation"), _normalize_query(query)
 
 class CrossEncoderReranker(BaseRetriever):
-    """DEBUG: stores last query and scored candidates."""
-    def __init__(self, base: BaseRetriever, model: CrossEncoder, top_k: int = 10):
+    """Cross-encoder rerank with an adaptive depth (see ``RerankPolicy``);
+    the query and scored candidates go to the request trace."""
+    def __init__(
+        self,
+        base: BaseRetriever,
+        scorer: RerankBatcher,
+        top_k: int = 10,
+        cache: Optional[TTLCache] = None,
+        policy: Optional[RerankPolicy] = None,
+    ):
         super().__init__()
         self.base = base
-        self.model = model
+        self.scorer = scorer
         self.top_k = top_k
-        self.last_query_text: Optional[str] = None
-        self.last_candidates: List[Dict] = []
+        self.cache = cache
+        self.policy = policy or RerankPolicy(skip_margin=0, chunk_size=0, early_exit_score=0, max_passage_chars=0)
 
     def _make_query(self, latest_query: str, chat_history: Optional[str], user_ctx: Optional[str]) -> str:
         # Drop history/topic hints here to avoid drift; vector stage handles pronouns.
-        self.last_query_text = latest_query
+        current_trace().set("reranker_query", latest_query)
         return latest_query
 
-    def _rerank(self, query: str, nodes):
-        if not nodes:
-            self.last_candidates = []
-            return []
-        bases = [_as_node(n) for n in nodes]
-        pairs = [(query, b.get_content()) for b in bases]
-        # serialize predict for thread-safety on shared GPU/CPU model
-        with _RERANK_LOCK:
-            scores = self.model.predict(pairs, batch_size=8)
-
-        order = sorted(range(len(bases)), key=lambda i: scores[i], reverse=True)[: self.top_k]
-        out = []
-        cands = []
-        for i in range(len(bases)):
-            url = extract_url(bases[i]) or "N/A"
-            cands.append({
+    def _pairs(self, query: str, bases):
+        """Return ``(scores, missing)``: cached scores filled in, the rest
+        listed as ``(position, pair)`` for the cross-encoder."""
+        scores: List[Optional[float]] = [None] * len(bases)
+        if self.cache is not None:
+            qkey = _score_key(query)
+            cached = self.cache.get_many((qkey, b.node_id) for b in bases)
+            for i, b in enumerate(bases):
+                scores[i] = cached.get((qkey, b.node_id))
+        missing = [
+            (i, (query, self.policy.passage(b.get_content()))) for i, b in enumerate(bases) if scores[i] is None
+        ]
+        return scores, missing
+
+    def _fill(self, query: str, bases, scores, missing, fresh):
+        for (i, _), score in zip(missing, fresh):
+            scores[i] = score
+        if self.cache is not None and missing:
+            qkey = _score_key(query)
+            self.cache.put_many({(qkey, bases[i].node_id): scores[i] for i, _ in missing})
+        return scores
+
+    def _order(self, bases, scores, policy: str, n_scored: int):
+        scored = [i for i in range(len(bases)) if scores[i] is not None]
+        order = sorted(scored, key=lambda i: scores[i], reverse=True)[: self.top_k]
+        cands = [
+            {
                 "idx": i,
-                "url": url,
+                "url": extract_url(bases[i]) or "N/A",
                 "score": float(scores[i]),
                 "preview": _snip(bases[i].get_content()),
-            })
-        self.last_candidates = sorted(cands, key=lambda x: x["score"], reverse=True)[: self.top_k]
+            }
+            for i in order
+        ]
+        trace = current_trace()
+        trace.set("rerank_policy", policy)
+        trace.set("reranker_candidates", cands)
+        trace.set("reranker_batcher", self.scorer.stats())
+        trace.count("rerank_scored", n_scored)
+        trace.count("rerank", len(order))
+        return [NodeWithScore(node=bases[i], score=float(scores[i])) for i in order]
+
+    def _skip_reason(self, nodes) -> Optional[str]:
+        vector_scores = current_trace().get("vector_scores") or {}
+        return self.policy.skip_reason([vector_scores.get(_as_node(n).node_id) for n in nodes], self.top_k)
+
+    def _skip(self, nodes, reason: str):
+        """Keep the first-stage order and scores."""
+        bases = [_as_node(n) for n in nodes]
+        scores = [float(getattr(n, "score", None) or 0.0) for n in nodes]
+        return self._order(bases, scores, reason, n_scored=0)
 
-        for i in order:
-            out.append(NodeWithScore(node=bases[i], score=float(scores[i])))
-        return out
+    def _rerank(self, query: str, nodes):
+        with current_trace().timed("rerank"):
+            reason = self._skip_reason(nodes)
+            if reason:
+                return self._skip(nodes, reason)
+            bases = [_as_node(n) for n in nodes]
+            scores: List[Optional[float]] = [None] * len(bases)
+            policy = "full"
+            chunks = self.policy.chunks(len(bases), self.top_k)
+            for ci, chunk in enumerate(chunks):
+                sub = [bases[i] for i in chunk]
+                sub_scores, missing = self._pairs(query, sub)
+                fresh = self.scorer.score([p for _, p in missing]) if missing else []
+                for i, score in zip(chunk, self._fill(query, sub, sub_scores, missing, fresh)):
+                    scores[i] = score
+                if ci < len(chunks) - 1 and self.policy.can_stop(scores, self.top_k):
+                    policy = "early_exit"
+                    break
+            return self._order(bases, scores, policy, n_scored=sum(s is not None for s in scores))
+
+    async def _arerank(self, query: str, nodes):
+        with current_trace().timed("rerank"):
+            reason = self._skip_reason(nodes)
+            if reason:
+                return self._skip(nodes, reason)
+            bases = [_as_node(n) for n in nodes]
+            scores: List[Optional[float]] = [None] * len(bases)
+            policy = "full"
+            chunks = self.policy.chunks(len(bases), self.top_k)
+            for ci, chunk in enumerate(chunks):
+                sub = [bases[i] for i in chunk]
+                sub_scores, missing = self._pairs(query, sub)
+                fresh = await self.scorer.ascore([p for _, p in missing]) if missing else []
+                for i, score in zip(chunk, self._fill(query, sub, sub_scores, missing, fresh)):
+                    scores[i] = score
+                if ci < len(chunks) - 1 and self.policy.can_stop(scores, self.top_k):
+                    policy = "early_exit"
+                    break
+            return self._order(bases, scores, policy, n_scored=sum(s is not None for s in scores))
 
     def _retrieve(self, query_bundle: QueryBundle, **kwargs):
         nodes = self.base.retrieve(query_bundle, **kwargs)
@@ -671,26 +964,68 @@ class CrossEncoderReranker(BaseRetriever):
         nodes = await self.base.aretrieve(query_bundle, **kwargs)
         latest = query_bundle.query_str if not isinstance(query_bundle, str) else query_bundle
         q = self._make_query(latest, kwargs.get("chat_history"), kwargs.get("user_context"))
-        return self._rerank(q, nodes)
-
-# -------------------------- chain walkers (debug) --------------------------- #
-
-def _get_chain_parts(top: BaseRetriever):
-    """Return (reranker, hybrid, unique, history_aware) where available."""
-    rer = top if isinstance(top, CrossEncoderReranker) else None
-    hyb = rer.base if rer and isinstance(rer.base, KeywordFallbackRetriever) else None
-    uniq = hyb.primary if hyb and isinstance(hyb.primary, UniqueUrlRetriever) else None
-    hist = uniq.base if uniq and isinstance(uniq.base, HistoryAwareVectorRetriever) else None
-    return rer, hyb, uniq, hist
+        return await self._arerank(q, nodes)
 
 # --------------------------------------------------------------------------- #
 #                              Chat processing                                 #
 # --------------------------------------------------------------------------- #
 
+async def _route_turn(message: str, chat_ctx: str, trace: RetrievalTrace):
+    """Return ``(route, embedding)``.
+
+    The embedding of the raw message is shared by the router's prototype
+    check, the answer cache and, through ``trace``, the vector search, so a
+    standalone turn is embedded once. Turns that lean on chat history are
+    neither cacheable nor embedded here.
+    """
+    rule_route = query_router.classify_rules(message) if ROUTER_ENABLED else None
+    embedding = None
+    wants_embedding = answer_cache.enabled or (ROUTER_ENABLED and query_router.uses_embeddings)
+    if rule_route is None and not chat_ctx and wants_embedding:
+        embedding = await run_inference("embed_query", get_embed_model().get_query_embedding, message)
+        trace.embeddings[message] = embedding
+    if not ROUTER_ENABLED:
+        return RAG, embedding
+    return query_router.route(message, embedding), embedding
+
+def _lookup_cached_answer(embedding, is_de: bool, generation: Optional[str]) -> Optional[CachedAnswer]:
+    if embedding is None or not answer_cache.enabled:
+        return None
+    return answer_cache.lookup(embedding, is_de, generation)
+
+def _start_trace(turn: str, message: str, query_engine) -> RetrievalTrace:
+    """New turn trace tagged with the published index generation.
+
+    The answer and score caches are keyed on that generation, so every worker
+    stops serving cached results as soon as a rebuild or refresh publishes a
+    new one, not only the process that wrote it.
+    """
+    trace = RetrievalTrace(turn=turn, message=message)
+    trace.set("index_generation", current_generation(getattr(query_engine, "persist_dir", PERSIST_DIR)))
+    return trace
+
+def _direct_message(message: str, route: str) -> ChatMessage:
+    """Prompt for routed turns: no library context, no sources."""
+    kind = "a question about you or this system" if route == META else "small talk"
+    return ChatMessage(
+        role="user",
+        content=(
+            f"The following message is {kind}. Answer briefly without library context "
+            f"and without a Sources section.\n\n{message}"
+        ),
+    )
+
+async def _replay_answer(text: str, words_per_chunk: int = 4):
+    """Yield a cached answer in small chunks so the UI still renders a stream."""
+    words = re.findall(r"\S+\s*", text)
+    for i in range(0, len(words), words_per_chunk):
+        yield "".join(words[i:i + words_per_chunk])
+        await asyncio.sleep(ANSWER_CACHE_STREAM_DELAY)
+
 async def process_query(message: str, query_engine: RetrieverQueryEngine, session_id: str):
     """Non-streaming path; same-language user history, topic-switch reset, pronoun-aware vector hints."""
     try:
-        history = conversation_manager.get_conversation_history(session_id)
+        history = await conversation_manager.aget_conversation_history(session_id)
 
         # topic-switch logic (reset unless same topic or pronoun-only)
         is_de = _is_german(message)
@@ -707,12 +1042,33 @@ async def process_query(message: str, query_engine: RetrieverQueryEngine, sessio
             chat_ctx = format_user_history_same_lang(history, message)
             user_ctx = recent_user_text(history)
 
+        trace = _start_trace("process_query", message, query_engine)
+        with trace.timed("route"):
+            route, cache_embedding = await _route_turn(message, chat_ctx, trace)
+        trace.set("route", route)
+
+        if route != RAG:
+            with trace.timed("llm_total"):
+                resp = await get_llm().achat([_direct_message(message, route)])
+            raw_answer = (getattr(resp, "message", None) and getattr(resp.message, "content", "")) or str(resp)
+            main_answer, think_text = clean_response_text(raw_answer or "")
+            if DEBUG_RAG:
+                logger.debug(_jdump(trace.as_dict()))
+            await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", main_answer)])
+            return {"answer": main_answer, "think": think_text, "citations": []}
+
+        cached = _lookup_cached_answer(cache_embedding, is_de, trace.get("index_generation"))
+        if cached is not None:
+            await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", cached.answer)])
+            return {"answer": cached.answer, "think": cached.think, "citations": list(cached.citations)}
+
         # Retrieve (with the chosen history/user_ctx)
-        nodes_ws = await query_engine.retriever.aretrieve(
-            message,
-            chat_history=chat_ctx,
-            user_context=user_ctx,
-        )
+        with use_trace(trace):
+            nodes_ws = await query_engine.retriever.aretrieve(
+                message,
+                chat_history=chat_ctx,
+                user_context=user_ctx,
+            )
         base_nodes: List[NodeWithScore] = [
             n if isinstance(n, NodeWithScore) else NodeWithScore(node=_as_node(n)) for n in nodes_ws
         ]
@@ -721,31 +1077,26 @@ async def process_query(message: str, query_engine: RetrieverQueryEngine, sessio
         if library_size == 0:
             is_german = _is_german(message)
             response_text = _library_empty_message(is_german)
-            conversation_manager.add_message(session_id, "user", message)
-            conversation_manager.add_message(session_id, "assistant", response_text)
+            await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", response_text)])
             return response_text
 
-        context = "\n\n".join(_as_node(n).get_content(metadata_mode="node_only") for n in base_nodes)
+        packed = _pack_context(message, base_nodes)
 
         # LLM call (context-constrained)
         user_msg = ChatMessage(
             role="user",
-            content=(
-                "Answer using ONLY the context below. If the context is insufficient, say so.\n\n"
-                f"Context:\n{context}\n\nQuestion:\n{message}"
-            ),
+            content=CONTEXT_PROMPT.format(context=packed.text, question=message),
         )
-        resp = await Settings.llm.achat([user_msg])
+        with trace.timed("llm_total"):
+            resp = await get_llm().achat([user_msg])
         raw_answer = (getattr(resp, "message", None) and getattr(resp.message, "content", "")) or str(resp)
         main_answer, think_text = clean_response_text(raw_answer or "")
 
-        conversation_manager.add_message(session_id, "user", message)
-
         # Citations
         citations: List[str] = []
         seen: set = set()
-        for node in base_nodes:
-            url = extract_url(_as_node(node))
+        for node in packed.nodes:
+            url = extract_url(node)
             if url and url not in seen:
                 seen.add(url); citations.append(url)
 
@@ -754,22 +1105,23 @@ async def process_query(message: str, query_engine: RetrieverQueryEngine, sessio
             header = "Quellen" if _is_german(message) else "Sources"
             links = "\n".join(f"- [{u}]({u})" for u in citations)
             main_answer = f"{main_answer}\n\n**{header}:**\n{links}"
+            if cache_embedding is not None:
+                answer_cache.add(
+                    cache_embedding,
+                    is_de,
+                    CachedAnswer(message, main_answer, think_text, citations),
+                    generation=trace.get("index_generation"),
+                )
 
         # ---------- DEBUG TRACE ----------
         if DEBUG_RAG:
-            rer, hyb, uniq, hist = _get_chain_parts(query_engine.retriever)
             dbg = {
-                "turn": "process_query",
-                "message": message,
+                **trace.as_dict(),
                 "same_lang_user_history": chat_ctx,
                 "user_ctx_for_keywords": user_ctx,
-                "vector_query": (hist and hist.last_query) or "",
-                "reranker_query": (rer and rer.last_query_text) or "",
-                "reranker_candidates": (rer and rer.last_candidates) or [],
-                "keyword_tokens": (hyb and hyb.last_tokens) or [],
-                "priority_urls": (hyb and hyb.last_priority_urls) or [],
-                "combined_urls": (hyb and hyb.last_combined_urls) or [],
                 "context_len": len(context),
+                "context_tokens": packed.tokens,
+                "context_dropped_chunks": packed.dropped,
                 "context_preview": _snip(context, 600),
                 "llm_prompt_preview": _snip(user_msg.content, 600),
                 "citations": citations,
@@ -782,7 +1134,7 @@ async def process_query(message: str, query_engine: RetrieverQueryEngine, sessio
                 )
         # ---------------------------------
 
-        conversation_manager.add_message(session_id, "assistant", main_answer)
+        await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", main_answer)])
         return {"answer": main_answer, "think": think_text, "citations": citations}
 
     except Exception as exc:
@@ -791,7 +1143,7 @@ async def process_query(message: str, query_engine: RetrieverQueryEngine, sessio
 
 async def stream_query(message: str, query_engine: RetrieverQueryEngine, session_id: str):
     """Streaming path; same behavior as non-streaming for history/topic handling."""
-    history = conversation_manager.get_conversation_history(session_id)
+    history = await conversation_manager.aget_conversation_history(session_id)
 
     is_de = _is_german(message)
     last_same_lang = ""
@@ -807,11 +1159,42 @@ async def stream_query(message: str, query_engine: RetrieverQueryEngine, session
         chat_ctx = format_user_history_same_lang(history, message)
         user_ctx = recent_user_text(history)
 
-    nodes_ws = await query_engine.retriever.aretrieve(
-        message,
-        chat_history=chat_ctx,
-        user_context=user_ctx,
-    )
+    trace = _start_trace("stream_query", message, query_engine)
+    with trace.timed("route"):
+        route, cache_embedding = await _route_turn(message, chat_ctx, trace)
+    trace.set("route", route)
+
+    if route != RAG:
+        llm_start = time.perf_counter()
+        stream = await get_llm().astream_chat([_direct_message(message, route)])
+        main_buf = ""
+        async for chunk in stream:
+            text = (getattr(chunk, "delta", None) or "")
+            if text:
+                if not main_buf:
+                    trace.record("llm_ttft", time.perf_counter() - llm_start)
+                main_buf += text
+                yield text
+        trace.record("llm_total", time.perf_counter() - llm_start)
+        if DEBUG_RAG:
+            logger.debug(_jdump(trace.as_dict()))
+        await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", main_buf.strip())])
+        return
+
+    cached = _lookup_cached_answer(cache_embedding, is_de, trace.get("index_generation"))
+    if cached is not None:
+        async for piece in _replay_answer(cached.answer):
+            yield piece
+        await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", cached.answer)])
+        return
+
+    # no yield inside the block: the generator may resume in another context
+    with use_trace(trace):
+        nodes_ws = await query_engine.retriever.aretrieve(
+            message,
+            chat_history=chat_ctx,
+            user_context=user_ctx,
+        )
     base_nodes: List[NodeWithScore] = [
         n if isinstance(n, NodeWithScore) else NodeWithScore(node=_as_node(n)) for n in nodes_ws
     ]
@@ -819,37 +1202,36 @@ async def stream_query(message: str, query_engine: RetrieverQueryEngine, session
     library_size = getattr(query_engine, "library_size", None)
     if library_size == 0:
         response_text = _library_empty_message(is_de)
-        conversation_manager.add_message(session_id, "user", message)
-        conversation_manager.add_message(session_id, "assistant", response_text)
+        await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", response_text)])
         yield response_text
         return
 
-    context = "\n\n".join(_as_node(n).get_content(metadata_mode="node_only") for n in base_nodes)
+    packed = _pack_context(message, base_nodes)
 
     user_msg = ChatMessage(
         role="user",
-        content=(
-            "Answer using ONLY the context below. If the context is insufficient, say so.\n\n"
-            f"Context:\n{context}\n\nQuestion:\n{message}"
-        ),
+        content=CONTEXT_PROMPT.format(context=packed.text, question=message),
     )
 
-    stream = await Settings.llm.astream_chat([user_msg])
+    llm_start = time.perf_counter()
+    stream = await get_llm().astream_chat([user_msg])
 
     main_buf = ""
     async for chunk in stream:
         text = (getattr(chunk, "delta", None) or "")
         if text:
+            if not main_buf:
+                trace.record("llm_ttft", time.perf_counter() - llm_start)
             main_buf += text
             yield text
+    trace.record("llm_total", time.perf_counter() - llm_start)
 
     main_answer = main_buf.strip()
-    conversation_manager.add_message(session_id, "user", message)
 
     citations: List[str] = []
     seen: set = set()
-    for node in base_nodes:
-        url = extract_url(_as_node(node))
+    for node in packed.nodes:
+        url = extract_url(node)
         if url and url not in seen:
             seen.add(url)
             citations.append(url)
@@ -860,22 +1242,23 @@ async def stream_query(message: str, query_engine: RetrieverQueryEngine, session
         citations_text = f"\n\n**{header}:**\n{links}"
         yield citations_text
         main_answer = f"{main_answer}{citations_text}"
+        if cache_embedding is not None:
+            answer_cache.add(
+                cache_embedding,
+                is_de,
+                CachedAnswer(message, main_answer, "", citations),
+                generation=trace.get("index_generation"),
+            )
 
     # ---------- DEBUG TRACE ----------
     if DEBUG_RAG:
-        rer, hyb, uniq, hist = _get_chain_parts(query_engine.retriever)
         dbg = {
-            "turn": "stream_query",
-            "message": message,
+            **trace.as_dict(),
             "same_lang_user_history": chat_ctx,
             "user_ctx_for_keywords": user_ctx,
-            "vector_query": (hist and hist.last_query) or "",
-            "reranker_query": (rer and rer.last_query_text) or "",
-            "reranker_candidates": (rer and rer.last_candidates) or [],
-            "keyword_tokens": (hyb and hyb.last_tokens) or [],
-            "priority_urls": (hyb and hyb.last_priority_urls) or [],
-            "combined_urls": (hyb and hyb.last_combined_urls) or [],
             "context_len": len(context),
+            "context_tokens": packed.tokens,
+            "context_dropped_chunks": packed.dropped,
             "context_preview": _snip(context, 600),
             "llm_prompt_preview": _snip(user_msg.content, 600),
             "citations": citations,
@@ -887,7 +1270,7 @@ async def stream_query(message: str, query_engine: RetrieverQueryEngine, session
             main_answer = f"{main_answer}{dbg_block}"
     # ---------------------------------
 
-    conversation_manager.add_message(session_id, "assistant", main_answer)
+    await conversation_manager.aadd_messages(session_id, [("user", message), ("assistant", main_answer)])
 
 # --------------------------------------------------------------------------- #
 #                 CONCURRENCY-SAFE SYNC WRAPPERS FOR WSGI SERVERS            #
@@ -941,106 +1324,242 @@ def stream_query_sync(message: str, query_engine: RetrieverQueryEngine, session_
 #                           Crawling / Index building                          #
 # --------------------------------------------------------------------------- #
 
-async def fetch_and_clean_html(session, url, exclude_selectors=None):
+EXCLUDE_SELECTORS = ["header", "footer", "nav", ".breadcrumbs"]
+
+@dataclass
+class FetchedPage:
+    """Result of a (conditional) page fetch; ``document`` is set on 200 only."""
+    url: str
+    status: int
+    document: Optional[Document] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+async def fetch_page(session, url, exclude_selectors=None, etag=None, last_modified=None) -> Optional[FetchedPage]:
+    """GET ``url``; sends If-None-Match / If-Modified-Since when validators are given.
+
+    Returns ``None`` on network errors.
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     try:
-        async with session.get(url, timeout=60) as response:
+        async with session.get(url, timeout=60, headers=headers) as response:
+            if response.status == 304:
+                return FetchedPage(url, 304, etag=etag, last_modified=last_modified)
             if response.status != 200:
-                return None
+                return FetchedPage(url, response.status)
             html = await response.text()
             soup = BeautifulSoup(html, "html.parser")
             for selector in exclude_selectors or []:
                 for tag in soup.select(selector):
                     tag.decompose()
             text = soup.get_text(separator=" ", strip=True)
-            return Document(text=text, metadata={"url": url})
+            return FetchedPage(
+                url,
+                200,
+                Document(text=text, metadata={"url": url}),
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+            )
     except Exception as exc:
         logger.warning("Failed to fetch %s: %s", url, exc)
         return None
 
-async def load_documents_from_urls(urls, exclude_selectors=None):
-    async with aiohttp.ClientSession() as session:
-        tasks = [fetch_and_clean_html(session, u, exclude_selectors) for u in urls]
-        results = await asyncio.gather(*tasks)
-    return [doc for doc in results if doc is not None]
+SITEMAP_ALLOWED_SEGMENTS = ["/support", "/service-catalogue", "/service-katalog", "/anleitungen"]
 
-def clean_sitemap_urls(sitemap_url: str):
-    response = requests.get(sitemap_url)
-    root = ET.fromstring(response.content)
-    namespaces = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-    cleaned = []
-    for url_element in root.findall(".//sm:url", namespaces):
-        loc = url_element.find("sm:loc", namespaces)
-        if loc is None or loc.text is None:
-            continue
-        url = loc.text.strip()
+SITEMAP_CACHE_FILE = "sitemap_cache.json"
+# Seconds a cached sitemap is used without even a conditional request
+SITEMAP_MAX_AGE = env_float("HEIBOT_SITEMAP_MAX_AGE", 3600.0)
+
+def _filter_sitemap(raw: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    entries: Dict[str, Optional[str]] = {}
+    for url, lastmod in raw.items():
         parsed = urlparse(url)
         path_lower = parsed.path.lower()
-        allowed = ["/support", "/service-catalogue", "/service-katalog", "/anleitungen"]
-        if not any(seg in path_lower for seg in allowed):
+        if not any(seg in path_lower for seg in SITEMAP_ALLOWED_SEGMENTS):
             continue
         clean_url = urlunparse((parsed.scheme, parsed.netloc, parsed.path, "", "", ""))
-        cleaned.append(clean_url)
-    return cleaned
+        entries.setdefault(clean_url, lastmod)
+    return entries
+
+async def async_sitemap_entries(sitemap_url: str, persist_dir: str = PERSIST_DIR) -> Dict[str, Optional[str]]:
+    """Return ``{clean_url: lastmod}`` for allowed sitemap URLs, in sitemap order.
+
+    Follows sitemap indexes; unchanged sitemaps come from the disk cache.
+    """
+    loader = SitemapLoader(os.path.join(persist_dir, SITEMAP_CACHE_FILE), max_age=SITEMAP_MAX_AGE)
+    return _filter_sitemap(await loader.load(sitemap_url))
+
+def sitemap_entries(sitemap_url: str, persist_dir: str = PERSIST_DIR) -> Dict[str, Optional[str]]:
+    """Blocking wrapper of ``async_sitemap_entries`` for scripts."""
+    return asyncio.run(async_sitemap_entries(sitemap_url, persist_dir))
+
+def clean_sitemap_urls(sitemap_url: str):
+    return list(sitemap_entries(sitemap_url))
 
 # --------------------------------------------------------------------------- #
 #                                Init pipeline                                 #
 # --------------------------------------------------------------------------- #
 
-async def async_init(urls: List[str], persist_dir: str = PERSIST_DIR) -> RetrieverQueryEngine:
-    has_faiss = os.path.exists(os.path.join(persist_dir, "faiss.index"))
-    has_legacy_json = os.path.exists(os.path.join(persist_dir, "index_store.json"))
-    has_vector_json = len(glob.glob(os.path.join(persist_dir, "*__vector_store.json"))) > 0
-    has_docstore = os.path.exists(os.path.join(persist_dir, "docstore.json"))
-    has_vector = has_faiss or has_legacy_json or has_vector_json
-
-    if os.path.isdir(persist_dir) and has_vector and has_docstore:
-        logger.info("Loading existing FAISS index from %s", persist_dir)
-        faiss_store = FaissVectorStore.from_persist_dir(persist_dir)
-        storage_context = StorageContext.from_defaults(
-            vector_store=faiss_store, persist_dir=persist_dir
-        )
-        index = load_index_from_storage(storage_context)
-        with open(os.path.join(persist_dir, "nodes.pkl"), "rb") as f:
-            nodes = pickle.load(f)
-    else:
-        logger.info("Building FAISS index from scratch ...")
-        docs = await load_documents_from_urls(
-            urls, exclude_selectors=["header", "footer", "nav", ".breadcrumbs"]
-        )
-        parser = SentenceSplitter(chunk_size=256, chunk_overlap=32)
-        nodes = parser.get_nodes_from_documents(docs)
-        faiss_store = FaissVectorStore(faiss.IndexFlatL2(768))  # matches multilingual-mpnet
-        storage_context = StorageContext.from_defaults(vector_store=faiss_store)
-        index = VectorStoreIndex(nodes, storage_context=storage_context, show_progress=True)
-        storage_context.persist(persist_dir=persist_dir)
-        os.makedirs(persist_dir, exist_ok=True)
-        with open(os.path.join(persist_dir, "nodes.pkl"), "wb") as f:
-            pickle.dump(nodes, f)
-
-    # Helper maps
-    url_to_nodes = {}
-    for n in nodes:
-        u = extract_url(n)
+EMBED_DIM = 768  # paraphrase-multilingual-mpnet-base-v2
+ANN_CONFIG = AnnConfig.from_env()
+
+def embed_nodes(nodes, show_progress: bool = True) -> np.ndarray:
+    texts = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in nodes]
+    if not texts:
+        return np.zeros((0, EMBED_DIM), dtype="float32")
+    vectors = get_embed_model().get_text_embedding_batch(texts, show_progress=show_progress)
+    return np.asarray(vectors, dtype="float32")
+
+def _legacy_faiss_order(persist_dir: str) -> Optional[List[str]]:
+    """Node ids in FAISS row order, read from a llama-index ``index_store.json``."""
+    path = os.path.join(persist_dir, "index_store.json")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for entry in data.get("index_store/data", {}).values():
+            nodes_dict = json.loads(entry["__data__"]).get("nodes_dict") or {}
+            return [nodes_dict[k] for k in sorted(nodes_dict, key=int)]
+    except (OSError, ValueError, KeyError) as exc:
+        logger.warning("Cannot read legacy FAISS row order from %s: %s", path, exc)
+    return None
+
+def _load_legacy_nodes(persist_dir: str):
+    """Load ``nodes.pkl`` plus, when it lines up, the llama-index FAISS file.
+
+    Returns ``(nodes, faiss_index)`` with nodes in FAISS row order; the index
+    is ``None`` when it is missing or does not cover exactly these nodes.
+    """
+    with open(os.path.join(persist_dir, LEGACY_NODES_FILE), "rb") as f:
+        nodes = pickle.load(f)
+
+    vector_path = os.path.join(persist_dir, "default__vector_store.json")
+    order = _legacy_faiss_order(persist_dir) if os.path.exists(vector_path) else None
+    if not order:
+        return nodes, None
+
+    by_id = {n.node_id: n for n in nodes}
+    faiss_index = faiss.read_index(vector_path)
+    if faiss_index.ntotal != len(order) or any(node_id not in by_id for node_id in order):
+        logger.warning("Legacy FAISS index does not match nodes.pkl; re-embedding")
+        return nodes, None
+    return [by_id[node_id] for node_id in order], faiss_index
+
+def migrate_legacy_nodes(persist_dir: str) -> NodeStore:
+    """Convert ``nodes.pkl`` (and its FAISS file, if it lines up) into a node store.
+
+    Offline counterpart of the old startup migration; the pickle itself is
+    left untouched and is not read once a node store exists.
+    """
+    nodes, faiss_index = _load_legacy_nodes(persist_dir)
+    vectors = embed_nodes(nodes) if faiss_index is None else reconstruct_vectors(faiss_index)
+    node_store, _ = write_index_store(persist_dir, nodes, vectors)
+    return node_store
+
+def split_documents(docs) -> List:
+    parser = SentenceSplitter(chunk_size=256, chunk_overlap=32)
+    return parser.get_nodes_from_documents(docs)
+
+def write_index_store(persist_dir: str, nodes, vectors: np.ndarray):
+    """Persist nodes, vectors and FAISS index as one generation; return ``(node_store, faiss_index)``.
+
+    The generation is published in one step, so running workers keep serving
+    the previous one until they reload and never pair an index with the
+    wrong nodes.
+    """
+    os.makedirs(persist_dir, exist_ok=True)
+    faiss_index = build_index(vectors, ANN_CONFIG)
+    write_node_store(persist_dir, nodes, vectors=vectors, index=faiss_index)
+    for legacy in (FAISS_INDEX_FILE, VECTORS_FILE):
+        legacy_path = os.path.join(persist_dir, legacy)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+    invalidate_index_caches()
+    return NodeStore.open(persist_dir), faiss_index
+
+def _rebuild_index(persist_dir: str, node_store: NodeStore):
+    """Rebuild the FAISS index of a store that has none from its own generation."""
+    vectors = node_store.load_vectors()
+    nodes = list(node_store)
+    if vectors is None:
+        logger.warning("No vectors match the node store in %s; re-embedding %d nodes", persist_dir, len(nodes))
+        vectors = embed_nodes(nodes)
+    return write_index_store(persist_dir, nodes, np.asarray(vectors, dtype="float32"))
+
+def invalidate_index_caches() -> None:
+    """Drop cached results that were computed against a previous index."""
+    rerank_score_cache.clear()
+    answer_cache.clear()
+
+def ensure_aux_indexes(persist_dir: str, node_store: NodeStore):
+    """Load the keyword/url indexes for ``node_store``, rebuilding them if stale."""
+    aux = load_aux_indexes(persist_dir, node_store.fingerprint)
+    if aux is not None:
+        return aux
+    logger.info("Building keyword/url indexes for %d nodes", len(node_store))
+    url_to_nodes: Dict[str, List[int]] = {}
+    for i in range(len(node_store)):
+        u = node_store.url(i)
         if u:
             u = normalize_url(u)
-            url_to_nodes.setdefault(u, []).append(n)
+            url_to_nodes.setdefault(u, []).append(i)
+    keyword_index = BM25Index.build(node_store.text(i) for i in range(len(node_store)))
+    save_aux_indexes(persist_dir, node_store.fingerprint, keyword_index, url_to_nodes)
+    return keyword_index, url_to_nodes
+
+async def async_init(
+    urls: Union[List[str], Dict[str, Optional[str]]], persist_dir: str = PERSIST_DIR
+) -> RetrieverQueryEngine:
+    """Open (or build) the index under ``persist_dir`` and assemble the query engine.
+
+    ``urls`` is only crawled when there is no node store; passing the
+    sitemap's ``{url: lastmod}`` mapping records lastmod in the refresh manifest.
+    """
+    node_store = NodeStore.open(persist_dir)
+    faiss_index = node_store.read_index() if node_store is not None else None
+
+    if faiss_index is not None:
+        logger.info("Loading FAISS index and node store from %s", persist_dir)
+        invalidate_index_caches()
+    elif node_store is not None:
+        # an index from another generation would map rows to the wrong nodes
+        logger.info("Node store in %s has no matching FAISS index; rebuilding it", persist_dir)
+        node_store, faiss_index = _rebuild_index(persist_dir, node_store)
+    else:
+        from .ingest import build_index_from_urls
+
+        if os.path.exists(os.path.join(persist_dir, LEGACY_NODES_FILE)):
+            logger.warning(
+                "%s in %s is not read at startup; run `python -m chatbot.build_index --migrate-pickle` "
+                "to convert it instead of crawling",
+                LEGACY_NODES_FILE,
+                persist_dir,
+            )
+        logger.info("Building FAISS index from scratch ...")
+        node_store, faiss_index = await build_index_from_urls(urls, persist_dir)
 
-    token_pattern = re.compile(r"\w{3,}")
-    token_to_nodes = {}
-    for n in nodes:
-        tokens = set(token_pattern.findall(n.get_content().lower()))
-        for t in tokens:
-            token_to_nodes.setdefault(t, []).append(n)
+    faiss_index = configure_search(faiss_index, ANN_CONFIG)
+
+    # Helper maps (url -> node ids, BM25 index), persisted next to the vectors
+    keyword_index, url_to_nodes = ensure_aux_indexes(persist_dir, node_store)
 
     # Base vector retriever (history-aware wrapper)
-    vect_base = VectorIndexRetriever(index=index, similarity_top_k=8, fetch_k=8)
+    vect_base = FaissNodeRetriever(faiss_index, node_store, similarity_top_k=8)
     vect = HistoryAwareVectorRetriever(vect_base, max_chars=512)
 
     # Chain
     unique_vect = UniqueUrlRetriever(vect, max_unique=5)
-    hybrid = KeywordFallbackRetriever(unique_vect, nodes, url_to_nodes, token_to_nodes)
-    reranked = CrossEncoderReranker(hybrid, rerank_model, top_k=3)
+    hybrid = KeywordFallbackRetriever(unique_vect, node_store, url_to_nodes, keyword_index)
+    reranked = CrossEncoderReranker(
+        hybrid, get_rerank_service(), top_k=3, cache=rerank_score_cache, policy=RERANK_POLICY
+    )
 
+    # RetrieverQueryEngine builds its synthesizer from Settings.llm
+    get_llm()
     engine = RetrieverQueryEngine(retriever=reranked)
-    engine.library_size = len(nodes)
+    engine.library_size = len(node_store)
+    engine.persist_dir = persist_dir
     return engine
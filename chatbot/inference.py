@@ -0,0 +1,39 @@
+"""Bounded thread pool for model inference called from async code.
+
+HuggingFace embedding and FAISS search are synchronous; awaiting them on the
+event loop stalls every other stream. PyTorch and FAISS release the GIL while
+they compute, so a small thread pool keeps the loop free without copying the
+models into worker processes. The cross-encoder has its own single worker in
+``rerank_service``.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from .metrics import INFERENCE_LATENCY
+from .utils import env_int
+
+T = TypeVar("T")
+
+
+INFERENCE_WORKERS = max(1, env_int("INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+
+async def run_inference(op: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run ``fn(*args, **kwargs)`` on the inference pool and await the result.
+
+    Like ``asyncio.to_thread``, the caller's contextvars (e.g. the request
+    trace) are visible inside ``fn``.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_executor, functools.partial(ctx.run, fn, *args, **kwargs))
+    finally:
+        INFERENCE_LATENCY.labels(op).observe(time.perf_counter() - start)
@@ -0,0 +1,255 @@
+"""Streaming full build of the legacy index.
+
+Fetch workers pull URLs from a queue, with at most ``concurrency`` requests in
+flight overall and ``per_host`` per host, spaced ``host_delay`` seconds apart.
+Cleaned pages go through a bounded queue to a single consumer. The consumer
+splits each page as it arrives and embeds the chunks in batches on the
+inference pool, so fetching continues while the model runs.
+
+Every embedded batch is written to ``<persist_dir>/build_checkpoint/`` as one
+part file (its pages, nodes and vectors). An interrupted build restarts from
+the pages that are not in a part yet; the checkpoint is removed once the index
+has been written. The build also writes the refresh manifest (lastmod, HTTP
+validators and content hash per page), so the first ``chatbot.refresh`` run
+only refetches what changed::
+
+    python -m chatbot.ingest
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import pickle
+import shutil
+import sys
+import time
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+import aiohttp
+import numpy as np
+
+from .engine import (
+    EMBED_DIM,
+    EMBED_MODEL_NAME,
+    EXCLUDE_SELECTORS,
+    PERSIST_DIR,
+    SITEMAP_URL,
+    embed_nodes,
+    fetch_page,
+    sitemap_entries,
+    split_documents,
+    write_index_store,
+)
+from .inference import run_inference
+from .refresh import manifest_entry, save_manifest
+from .utils import atomic_write_path, env_float, env_int, normalize_url
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIRNAME = "build_checkpoint"
+CHECKPOINT_VERSION = 1
+
+CRAWL_CONCURRENCY = env_int("HEIBOT_CRAWL_CONCURRENCY", 8)
+CRAWL_PER_HOST = env_int("HEIBOT_CRAWL_PER_HOST", 4)
+CRAWL_HOST_DELAY = env_float("HEIBOT_CRAWL_HOST_DELAY", 0.05)
+EMBED_BATCH_NODES = env_int("HEIBOT_EMBED_BATCH", 64)
+
+
+class HostGate:
+    """Per-host concurrency limit plus a minimum spacing between request starts."""
+
+    def __init__(self, per_host: int, delay: float):
+        self.per_host = max(1, per_host)
+        self.delay = max(0.0, delay)
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._next_start: Dict[str, float] = {}
+
+    async def _acquire(self, host: str) -> None:
+        sem = self._sems.setdefault(host, asyncio.Semaphore(self.per_host))
+        await sem.acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.delay
+            if start > now:
+                await asyncio.sleep(start - now)
+        except BaseException:
+            # cancelled during the politeness delay: give the slot back
+            sem.release()
+            raise
+
+    async def fetch(self, session, url: str):
+        host = urlparse(url).netloc
+        await self._acquire(host)
+        try:
+            return await fetch_page(session, url, EXCLUDE_SELECTORS)
+        finally:
+            self._sems[host].release()
+
+
+class BuildCheckpoint:
+    """Part files of an in-progress build; each holds complete pages only."""
+
+    def __init__(self, persist_dir: str):
+        self.path = os.path.join(persist_dir, CHECKPOINT_DIRNAME)
+
+    def _parts(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.path, "part-*.pkl")))
+
+    def load(self, wanted: set) -> Tuple[Dict[str, Dict], List, List[np.ndarray]]:
+        """Return ``(done_pages, nodes, vector_blocks)`` of parts still usable for ``wanted``.
+
+        ``done_pages`` maps each finished url to its manifest entry.
+        """
+        done, nodes, blocks = {}, [], []
+        for part in self._parts():
+            try:
+                with open(part, "rb") as f:
+                    data = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as exc:
+                logger.warning("Ignoring unreadable checkpoint part %s: %s", part, exc)
+                continue
+            if data.get("version") != CHECKPOINT_VERSION or data.get("model") != EMBED_MODEL_NAME:
+                continue
+            keep = [i for i, n in enumerate(data["nodes"]) if normalize_url(n.metadata.get("url", "")) in wanted]
+            done.update((u, entry) for u, entry in data["pages"].items() if u in wanted)
+            nodes.extend(data["nodes"][i] for i in keep)
+            blocks.append(np.asarray(data["vectors"], dtype="float32")[keep])
+        return done, nodes, blocks
+
+    def write(self, pages: Dict[str, Dict], nodes: List, vectors: np.ndarray) -> None:
+        """Append a part with ``pages`` (url -> manifest entry), their nodes and vectors."""
+        os.makedirs(self.path, exist_ok=True)
+        index = len(self._parts())
+        path = os.path.join(self.path, f"part-{index:05d}.pkl")
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "model": EMBED_MODEL_NAME,
+            "pages": pages,
+            "nodes": nodes,
+            "vectors": vectors,
+        }
+        with atomic_write_path(path) as tmp, open(tmp, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+async def build_index_from_urls(
+    urls: Union[Sequence[str], Mapping[str, Optional[str]]],
+    persist_dir: str = PERSIST_DIR,
+    concurrency: int = CRAWL_CONCURRENCY,
+    per_host: int = CRAWL_PER_HOST,
+    host_delay: float = CRAWL_HOST_DELAY,
+    embed_batch: int = EMBED_BATCH_NODES,
+):
+    """Crawl ``urls``, embed them and write the index; returns ``(node_store, faiss_index)``.
+
+    ``urls`` may be the ``{url: lastmod}`` mapping of the sitemap, in which
+    case the lastmod values go into the refresh manifest.
+    """
+    start = time.perf_counter()
+    wanted = {normalize_url(u): u for u in urls}
+    lastmods = {normalize_url(u): lm for u, lm in urls.items()} if isinstance(urls, Mapping) else {}
+    checkpoint = BuildCheckpoint(persist_dir)
+    done, nodes, blocks = checkpoint.load(set(wanted))
+    if done:
+        logger.info("Resuming index build: %d of %d pages already embedded", len(done), len(wanted))
+
+    url_queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    for norm, url in wanted.items():
+        if norm not in done:
+            url_queue.put_nowait(url)
+    workers = max(1, concurrency)
+    for _ in range(workers):
+        url_queue.put_nowait(None)
+    # bounded so that a slow embedder throttles the crawl instead of buffering pages
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=2 * workers)
+    gate = HostGate(per_host, host_delay)
+    stats = dict.fromkeys(("fetched", "failed", "chunks", "parts"), 0)
+
+    async def fetch_worker(session):
+        while True:
+            url = await url_queue.get()
+            if url is None:
+                await page_queue.put(None)
+                return
+            page = await gate.fetch(session, url)
+            if page is None or page.document is None:
+                stats["failed"] += 1
+                continue
+            stats["fetched"] += 1
+            await page_queue.put(page)
+
+    async def flush(batch_pages: Dict[str, Dict], batch: List) -> None:
+        vectors = await run_inference("embed_batch", embed_nodes, batch, show_progress=False)
+        checkpoint.write(batch_pages, batch, vectors)
+        done.update(batch_pages)
+        nodes.extend(batch)
+        blocks.append(vectors)
+        stats["chunks"] += len(batch)
+        stats["parts"] += 1
+
+    async def consumer():
+        batch_pages: Dict[str, Dict] = {}
+        batch: List = []
+        finished = 0
+        while finished < workers:
+            page = await page_queue.get()
+            if page is None:
+                finished += 1
+                continue
+            norm = normalize_url(page.document.metadata["url"])
+            batch_pages[norm] = manifest_entry(page, lastmods.get(norm))
+            batch.extend(split_documents([page.document]))
+            if len(batch) >= embed_batch:
+                await flush(batch_pages, batch)
+                batch_pages, batch = {}, []
+        if batch_pages:
+            await flush(batch_pages, batch)
+
+    connector = aiohttp.TCPConnector(limit=workers)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [asyncio.ensure_future(consumer())]
+        tasks += [asyncio.ensure_future(fetch_worker(session)) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    vectors = np.vstack(blocks) if blocks else np.zeros((0, EMBED_DIM), dtype="float32")
+    result = write_index_store(persist_dir, nodes, vectors)
+    save_manifest(persist_dir, done)
+    checkpoint.clear()
+    logger.info(
+        "Index build: %s; %d rows in %.1fs", stats, len(nodes), time.perf_counter() - start
+    )
+    return result
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="Crawl the sitemap and build the legacy index (resumable).")
+    p.add_argument("--persist-dir", default=PERSIST_DIR)
+    p.add_argument("--sitemap", default=SITEMAP_URL)
+    p.add_argument("--concurrency", type=int, default=CRAWL_CONCURRENCY)
+    p.add_argument("--per-host", type=int, default=CRAWL_PER_HOST)
+    p.add_argument("--host-delay", type=float, default=CRAWL_HOST_DELAY)
+    p.add_argument("--batch", type=int, default=EMBED_BATCH_NODES, help="chunks per embedding batch")
+    args = p.parse_args(argv)
+
+    entries = sitemap_entries(args.sitemap, args.persist_dir)
+    store, _ = asyncio.run(build_index_from_urls(
+        entries, args.persist_dir, args.concurrency, args.per_host, args.host_delay, args.batch
+    ))
+    print(f"wrote {len(store)} rows to {args.persist_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""Compact BM25 inverted index used by the keyword fallback stage."""
+import glob
+import json
+import logging
+import os
+import re
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .packed_strings import StringArray, StringTable
+from .utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+# Same token definition the legacy ``token_to_nodes`` map used for documents.
+DOC_TOKEN_PATTERN = re.compile(r"\w{3,}")
+
+# Bump whenever the on-disk layout below changes; stale stores are rebuilt.
+AUX_INDEX_VERSION = 3
+AUX_INDEX_DIRNAME = "keyword_index"
+_META_FILE = "meta.json"
+_BM25_ARRAYS = ("offsets", "doc_ids", "tfs", "doc_lens", "idf")
+_VOCAB_ARRAYS = ("vocab_blob", "vocab_offsets", "vocab_ids")
+_URL_ARRAYS = ("url_blob", "url_key_offsets", "url_rows", "url_offsets", "url_nodes")
+_AUX_ARRAYS = _BM25_ARRAYS + _VOCAB_ARRAYS + _URL_ARRAYS
+
+
+def tokenize_document(text: str) -> List[str]:
+    return DOC_TOKEN_PATTERN.findall((text or "").lower())
+
+
+class BM25Index:
+    """Inverted index over integer node ids with CSR-style posting arrays.
+
+    ``offsets[t]:offsets[t + 1]`` slices ``doc_ids`` / ``tfs`` for term id ``t``.
+    IDF values and document lengths are precomputed at build time so a query
+    is a handful of vectorised numpy operations per query token. ``vocab``
+    is a dict while building and a mmap-backed ``StringTable`` once loaded.
+    """
+
+    def __init__(
+        self,
+        vocab: Mapping[str, int],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lens: np.ndarray,
+        idf: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.idf = idf
+        self.k1 = k1
+        self.b = b
+        self.avgdl = float(doc_lens.mean()) if len(doc_lens) else 0.0
+
+    @property
+    def num_docs(self) -> int:
+        return int(len(self.doc_lens))
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        post_docs: List[int] = []
+        post_tfs: List[int] = []
+        doc_lens: List[int] = []
+
+        for doc_id, text in enumerate(texts):
+            toks = tokenize_document(text)
+            doc_lens.append(len(toks))
+            for tok, tf in Counter(toks).items():
+                tid = vocab.setdefault(tok, len(vocab))
+                term_ids.append(tid)
+                post_docs.append(doc_id)
+                post_tfs.append(tf)
+
+        tids = np.asarray(term_ids, dtype=np.int32)
+        # stable sort keeps doc ids ascending inside each posting list
+        order = np.argsort(tids, kind="stable")
+        counts = np.bincount(tids, minlength=len(vocab)).astype(np.int64)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        n_docs = len(doc_lens)
+        df = counts.astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        return cls(
+            vocab=vocab,
+            offsets=offsets,
+            doc_ids=np.asarray(post_docs, dtype=np.int32)[order],
+            tfs=np.asarray(post_tfs, dtype=np.float32)[order],
+            doc_lens=np.asarray(doc_lens, dtype=np.float32),
+            idf=idf,
+            k1=k1,
+            b=b,
+        )
+
+    def search(self, tokens: Sequence[str], top_n: int = 10) -> List[Tuple[int, float]]:
+        """Return up to ``top_n`` ``(doc_id, score)`` pairs, best first.
+
+        Only the posting lists of the query terms are touched, so the cost is
+        proportional to their length rather than to the corpus size.
+        """
+        if top_n <= 0 or not self.num_docs:
+            return []
+        hit_ids: List[np.ndarray] = []
+        hit_scores: List[np.ndarray] = []
+        avgdl = self.avgdl or 1.0
+        for tok in dict.fromkeys(tokens):
+            tid = self.vocab.get(tok)
+            if tid is None:
+                continue
+            start, end = int(self.offsets[tid]), int(self.offsets[tid + 1])
+            ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            norm = self.k1 * (1.0 - self.b + self.b * self.doc_lens[ids] / avgdl)
+            hit_ids.append(ids)
+            hit_scores.append(self.idf[tid] * tf * (self.k1 + 1.0) / (tf + norm))
+        if not hit_ids:
+            return []
+
+        docs, inverse = np.unique(np.concatenate(hit_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(hit_scores)).astype(np.float32)
+        keep = np.flatnonzero(scores > 0)
+        if len(keep) > top_n:
+            keep = keep[np.argpartition(scores[keep], -top_n)[-top_n:]]
+        # best score first, ties broken by the lower doc id
+        keep = keep[np.lexsort((docs[keep], -scores[keep]))]
+        return [(int(docs[i]), float(scores[i])) for i in keep]
+
+
+class UrlNodeMap(Mapping[str, List[int]]):
+    """Read-only ``url -> node ids`` map over CSR arrays.
+
+    ``urls`` maps a normalized URL to its row; ``offsets[row]:offsets[row + 1]``
+    slices ``nodes`` for that row.
+    """
+
+    def __init__(self, urls: StringTable, offsets: np.ndarray, nodes: np.ndarray):
+        self.urls = urls
+        self.offsets = offsets
+        self.nodes = nodes
+
+    def __getitem__(self, url: str) -> List[int]:
+        row = self.urls[url]
+        return self.nodes[int(self.offsets[row]):int(self.offsets[row + 1])].tolist()
+
+    def __contains__(self, url: object) -> bool:
+        return url in self.urls
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.urls)
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+
+# --------------------------------------------------------------------------- #
+#                  Persistence (BM25 index + url -> node ids)                  #
+# --------------------------------------------------------------------------- #
+
+def _read_meta(meta_path: str) -> Optional[Dict]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable keyword index meta %s: %s", meta_path, exc)
+        return None
+
+
+def _remove_stale_generations(path: str, keep: Iterable[str]) -> None:
+    keep = set(keep)
+    # ``<name>.npy`` files are the unversioned layout written before generations
+    for pattern in [f"{name}-*.npy" for name in _AUX_ARRAYS] + [f"{name}.npy" for name in _AUX_ARRAYS]:
+        for file in glob.glob(os.path.join(path, pattern)):
+            if os.path.basename(file) not in keep:
+                try:
+                    os.remove(file)
+                except OSError as exc:
+                    logger.warning("Cannot remove stale keyword index file %s: %s", file, exc)
+
+
+def save_aux_indexes(
+    persist_dir: str,
+    fingerprint: str,
+    keyword_index: BM25Index,
+    url_map: Mapping[str, List[int]],
+) -> str:
+    """Write the keyword and url indexes as ``.npy`` arrays plus a JSON header.
+
+    Terms and URLs are stored as sorted string blobs (see
+    :mod:`chatbot.packed_strings`), so ``meta.json`` only holds file names
+    and counts and loading parses nothing per term or URL.
+
+    The arrays go to new generation-named files and ``meta.json`` is replaced
+    last, so readers see either the previous generation or the complete new
+    one. The previous generation is kept for readers that opened it just
+    before the swap, as in :mod:`chatbot.node_store`.
+    """
+    path = os.path.join(persist_dir, AUX_INDEX_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, _META_FILE)
+    previous = _read_meta(meta_path)
+    generation = uuid.uuid4().hex[:12]
+    files = {name: f"{name}-{generation}.npy" for name in _AUX_ARRAYS}
+
+    def _save(name: str, array: np.ndarray) -> None:
+        with atomic_write_path(os.path.join(path, files[name])) as tmp, open(tmp, "wb") as f:
+            np.save(f, array)
+
+    for name in _BM25_ARRAYS:
+        _save(name, getattr(keyword_index, name))
+
+    vocab_blob, vocab_offsets, vocab_ids = StringTable.pack(keyword_index.vocab)
+    _save("vocab_blob", vocab_blob)
+    _save("vocab_offsets", vocab_offsets)
+    _save("vocab_ids", vocab_ids)
+
+    urls = list(url_map.keys())
+    url_blob, url_key_offsets, url_rows = StringTable.pack({u: row for row, u in enumerate(urls)})
+    url_counts = np.asarray([len(url_map[u]) for u in urls], dtype=np.int64)
+    url_offsets = np.zeros(len(urls) + 1, dtype=np.int64)
+    np.cumsum(url_counts, out=url_offsets[1:])
+    url_nodes = np.asarray([i for u in urls for i in url_map[u]], dtype=np.int32)
+    _save("url_blob", url_blob)
+    _save("url_key_offsets", url_key_offsets)
+    _save("url_rows", url_rows)
+    _save("url_offsets", url_offsets)
+    _save("url_nodes", url_nodes)
+
+    meta = {
+        "version": AUX_INDEX_VERSION,
+        "fingerprint": fingerprint,
+        "k1": keyword_index.k1,
+        "b": keyword_index.b,
+        "files": files,
+        "num_terms": len(keyword_index.vocab),
+        "num_urls": len(urls),
+    }
+    with atomic_write_path(meta_path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    keep = list(files.values())
+    if previous and isinstance(previous.get("files"), dict):
+        keep += list(previous["files"].values())
+    _remove_stale_generations(path, keep)
+    return path
+
+
+def load_aux_indexes(
+    persist_dir: str, fingerprint: str
+) -> Optional[Tuple[BM25Index, Mapping[str, List[int]]]]:
+    """Memory-map persisted indexes; ``None`` if missing, stale or corrupt."""
+    path = os.path.join(persist_dir, AUX_INDEX_DIRNAME)
+    meta_path = os.path.join(path, _META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != AUX_INDEX_VERSION:
+            logger.info("Keyword index version %s != %s; rebuilding", meta.get("version"), AUX_INDEX_VERSION)
+            return None
+        if meta.get("fingerprint") != fingerprint:
+            logger.info("Keyword index fingerprint does not match node store; rebuilding")
+            return None
+        arrays = {
+            name: np.load(os.path.join(path, meta["files"][name]), mmap_mode="r")
+            for name in _AUX_ARRAYS
+        }
+        if len(arrays["vocab_ids"]) != meta["num_terms"] or len(arrays["url_rows"]) != meta["num_urls"]:
+            raise ValueError("string tables do not match meta.json counts")
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        logger.warning("Failed to load keyword index from %s: %s", path, exc)
+        return None
+
+    keyword_index = BM25Index(
+        vocab=StringTable(StringArray(arrays["vocab_blob"], arrays["vocab_offsets"]), arrays["vocab_ids"]),
+        offsets=arrays["offsets"],
+        doc_ids=arrays["doc_ids"],
+        tfs=arrays["tfs"],
+        doc_lens=arrays["doc_lens"],
+        idf=arrays["idf"],
+        k1=meta.get("k1", 1.2),
+        b=meta.get("b", 0.75),
+    )
+    url_map = UrlNodeMap(
+        StringTable(StringArray(arrays["url_blob"], arrays["url_key_offsets"]), arrays["url_rows"]),
+        arrays["url_offsets"],
+        arrays["url_nodes"],
+    )
+    return keyword_index, url_map
@@ -0,0 +1,73 @@
+"""Prometheus metrics for the legacy Flask chatbot."""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+RERANK_BATCHES = Counter(
+    "heibot_rerank_batches_total",
+    "Cross-encoder predict calls issued by the rerank batcher",
+    ("model",),
+)
+
+RERANK_BATCH_SIZE = Histogram(
+    "heibot_rerank_batch_size",
+    "Size of each cross-encoder batch, in pairs or in coalesced requests",
+    ("model", "unit"),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+RERANK_QUEUE_DEPTH = Histogram(
+    "heibot_rerank_queue_depth",
+    "Rerank requests still queued when a batch is dispatched",
+    ("model",),
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64),
+)
+
+RERANK_LATENCY = Histogram(
+    "heibot_rerank_latency_seconds",
+    "Time from submitting pairs to receiving their scores",
+    ("model",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+RERANK_SKIPS = Counter(
+    "heibot_rerank_skips_total",
+    "Requests whose cross-encoder pass was skipped or cut short, by reason",
+    ("reason",),
+)
+
+CACHE_REQUESTS = Counter(
+    "heibot_cache_requests_total",
+    "In-process cache lookups by cache and result (hit/miss)",
+    ("cache", "result"),
+)
+
+INFERENCE_LATENCY = Histogram(
+    "heibot_inference_seconds",
+    "Queue wait plus run time of work on the inference thread pool",
+    ("op",),
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+RETRIEVAL_STAGE_LATENCY = Histogram(
+    "heibot_retrieval_stage_seconds",
+    "Latency of individual retrieval stages",
+    ("stage",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+RETRIEVAL_CANDIDATES = Histogram(
+    "heibot_retrieval_candidates",
+    "Candidates produced by each retrieval stage",
+    ("stage",),
+    buckets=(0, 1, 2, 3, 5, 8, 10, 15, 20, 30, 50),
+)
+
+ROUTER_DECISIONS = Counter(
+    "heibot_router_decisions_total",
+    "Pre-retrieval routing of chat turns by route (rag/meta/chitchat) and deciding method",
+    ("route", "method"),
+)
+
+
+def render_latest():
+    """Return ``(body, content_type)`` for a ``/metrics`` response."""
+    return generate_latest(), CONTENT_TYPE_LATEST
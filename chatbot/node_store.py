@@ -0,0 +1,394 @@
+"""Memory-mapped columnar node store for the legacy FAISS index.
+
+Layout under ``<persist_dir>/node_store/``::
+
+    text-<gen>.bin          UTF-8 node texts, concatenated
+    offsets-<gen>.npy       int64 byte offsets into the text file (len == count + 1)
+    spans-<gen>.npy         int64 ``(start_char_idx, end_char_idx)`` rows, -1 for None
+    col<j>-<gen>.npy        UTF-8 blob of string column ``j``
+    col<j>-offsets-<gen>.npy  int64 offsets into that blob
+    vectors-<gen>.npy       float32 embeddings, one row per node
+    faiss-<gen>.index       FAISS index over those vectors
+    meta.json               version, generation id, fingerprint, count,
+                            column names and data file names
+
+Row ``i`` of the store is row ``i`` of the FAISS index. The string columns
+hold node ids, ref doc ids, the excluded metadata key lists and one column
+per metadata key; the last three are JSON-encoded per row, with an empty
+string for a missing value. Every data file is mmap-opened read-only, so
+worker processes share the same page-cache copy and nothing grows with the
+corpus per worker; ``TextNode`` objects are only built for rows a query
+returns.
+
+A rewrite puts its data files under a new generation name and publishes them
+by atomically replacing ``meta.json``. A worker that opens the store during a
+rebuild therefore sees the complete previous generation, never a missing or
+half-written store, and never an index from a different generation than its
+nodes. The previous generation is kept for readers that loaded the old
+``meta.json`` just before the swap. Older generations are removed.
+``current_generation`` reports the published generation id, so that other
+processes can tell that their cached results belong to an older one.
+"""
+import hashlib
+import json
+import logging
+import glob
+import mmap
+import os
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import faiss
+import numpy as np
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+
+from .ann import save_vectors, write_index
+from .packed_strings import StringArray, pack_strings
+from .utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+NODE_STORE_VERSION = 2
+NODE_STORE_DIRNAME = "node_store"
+_META_FILE = "meta.json"
+
+
+def node_fingerprint(node_ids: Iterable[str]) -> str:
+    """Stable identity of an ordered node list; derived indexes are keyed on it."""
+    ids = list(node_ids)
+    h = hashlib.sha1(str(len(ids)).encode("utf-8"))
+    for node_id in ids:
+        h.update(b"\0")
+        h.update(node_id.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _read_meta(meta_path: str) -> Optional[Dict]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+_STRING_COLUMNS = ("node_id", "ref_doc_id", "excluded_embed_metadata_keys", "excluded_llm_metadata_keys")
+
+
+def _data_files(meta: Dict) -> List[str]:
+    files = [meta["text_file"], meta["offsets_file"], meta["spans_file"]]
+    files += [meta[key] for key in ("vectors_file", "index_file") if meta.get(key)]
+    for column in list(meta["columns"].values()) + list(meta["metadata"].values()):
+        files += [column["blob"], column["offsets"]]
+    return files
+
+
+def _publish(path: str, meta: Dict, previous: Optional[Dict]) -> None:
+    # replacing meta.json last makes the new generation visible in one step
+    with atomic_write_path(os.path.join(path, _META_FILE)) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    keep = _data_files(meta)
+    if previous and previous.get("version") == NODE_STORE_VERSION:
+        keep += _data_files(previous)
+    _remove_stale_generations(path, keep)
+
+
+def _remove_stale_generations(path: str, keep: Iterable[str]) -> None:
+    keep = set(keep)
+    patterns = ("text-*.bin", "offsets-*.npy", "spans-*.npy", "col*-*.npy", "vectors-*.npy", "faiss-*.index")
+    for pattern in patterns:
+        for file in glob.glob(os.path.join(path, pattern)):
+            if os.path.basename(file) not in keep:
+                try:
+                    os.remove(file)
+                except OSError as exc:
+                    logger.warning("Cannot remove stale node store file %s: %s", file, exc)
+
+
+def _read_previous(path: str) -> Optional[Dict]:
+    meta_path = os.path.join(path, _META_FILE)
+    try:
+        return _read_meta(meta_path)
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable node store meta %s: %s", meta_path, exc)
+        return None
+
+
+def _encode(value) -> str:
+    return "" if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def _decode(raw: str):
+    return json.loads(raw) if raw else None
+
+
+def write_node_store(
+    persist_dir: str,
+    nodes: Sequence[TextNode],
+    vectors: Optional[np.ndarray] = None,
+    index: Optional[faiss.Index] = None,
+) -> str:
+    """Serialize ``nodes`` in order, with their vectors and index, and return the store fingerprint."""
+    if vectors is not None and len(vectors) != len(nodes):
+        raise ValueError(f"{len(vectors)} vectors for {len(nodes)} nodes")
+    if index is not None and index.ntotal != len(nodes):
+        raise ValueError(f"FAISS index has {index.ntotal} rows for {len(nodes)} nodes")
+    path = os.path.join(persist_dir, NODE_STORE_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    previous = _read_previous(path)
+
+    generation = uuid.uuid4().hex[:12]
+    text_file = f"text-{generation}.bin"
+    offsets_file = f"offsets-{generation}.npy"
+    offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+    with atomic_write_path(os.path.join(path, text_file)) as tmp, open(tmp, "wb") as f:
+        for i, n in enumerate(nodes):
+            data = (n.text or "").encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    with atomic_write_path(os.path.join(path, offsets_file)) as tmp, open(tmp, "wb") as f:
+        np.save(f, offsets)
+    vectors_file = index_file = None
+    if vectors is not None:
+        vectors_file = f"vectors-{generation}.npy"
+        save_vectors(os.path.join(path, vectors_file), vectors)
+    if index is not None:
+        index_file = f"faiss-{generation}.index"
+        write_index(index, os.path.join(path, index_file))
+
+    spans_file = f"spans-{generation}.npy"
+    spans = np.asarray(
+        [[-1 if idx is None else idx for idx in (n.start_char_idx, n.end_char_idx)] for n in nodes],
+        dtype=np.int64,
+    ).reshape(len(nodes), 2)
+    with atomic_write_path(os.path.join(path, spans_file)) as tmp, open(tmp, "wb") as f:
+        np.save(f, spans)
+
+    def _save_column(j: int, values: Iterable[str]) -> Dict[str, str]:
+        files = {"blob": f"col{j}-{generation}.npy", "offsets": f"col{j}-offsets-{generation}.npy"}
+        for name, array in zip(("blob", "offsets"), pack_strings(values)):
+            with atomic_write_path(os.path.join(path, files[name])) as tmp, open(tmp, "wb") as f:
+                np.save(f, array)
+        return files
+
+    metadata_keys: List[str] = []
+    for n in nodes:
+        for key in n.metadata:
+            if key not in metadata_keys:
+                metadata_keys.append(key)
+
+    node_ids = [n.node_id for n in nodes]
+    fingerprint = node_fingerprint(node_ids)
+    columns = {
+        "node_id": _save_column(0, node_ids),
+        "ref_doc_id": _save_column(1, (n.ref_doc_id or "" for n in nodes)),
+        "excluded_embed_metadata_keys": _save_column(
+            2, (_encode(n.excluded_embed_metadata_keys) for n in nodes)
+        ),
+        "excluded_llm_metadata_keys": _save_column(3, (_encode(n.excluded_llm_metadata_keys) for n in nodes)),
+    }
+    metadata = {
+        key: _save_column(len(_STRING_COLUMNS) + k, (_encode(n.metadata.get(key)) for n in nodes))
+        for k, key in enumerate(metadata_keys)
+    }
+    meta = {
+        "version": NODE_STORE_VERSION,
+        "generation": generation,
+        "fingerprint": fingerprint,
+        "count": len(nodes),
+        "text_file": text_file,
+        "offsets_file": offsets_file,
+        "spans_file": spans_file,
+        "vectors_file": vectors_file,
+        "index_file": index_file,
+        "columns": columns,
+        "metadata": metadata,
+    }
+    _publish(path, meta, previous)
+    return fingerprint
+
+
+def publish_index(persist_dir: str, index: faiss.Index, fingerprint: str) -> str:
+    """Replace the FAISS index of the store with ``fingerprint``; return the new file's path.
+
+    Raises ``RuntimeError`` if the store was rewritten in the meantime or the
+    index does not cover exactly its rows.
+    """
+    path = os.path.join(persist_dir, NODE_STORE_DIRNAME)
+    meta = _read_previous(path)
+    if meta is None or meta.get("fingerprint") != fingerprint:
+        raise RuntimeError(f"Node store in {persist_dir} changed; rebuild the index from the current store")
+    if index.ntotal != meta["count"]:
+        raise RuntimeError(f"FAISS index has {index.ntotal} rows but the node store has {meta['count']}")
+    previous = dict(meta)
+    # a new index can return different rows, so it is a new generation too
+    meta["generation"] = uuid.uuid4().hex[:12]
+    meta["index_file"] = f"faiss-{meta['generation']}.index"
+    index_path = write_index(index, os.path.join(path, meta["index_file"]))
+    _publish(path, meta, previous)
+    return index_path
+
+
+_generations: Dict[str, tuple] = {}
+
+
+def current_generation(persist_dir: str) -> Optional[str]:
+    """Generation id of the published store; ``None`` if there is none.
+
+    ``meta.json`` is only re-read when its inode, size or mtime changes, so
+    this is one ``stat`` per call.
+    """
+    meta_path = os.path.join(persist_dir, NODE_STORE_DIRNAME, _META_FILE)
+    try:
+        st = os.stat(meta_path)
+    except OSError:
+        return None
+    stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _generations.get(meta_path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    meta = _read_previous(os.path.dirname(meta_path))
+    generation = meta.get("generation") if meta else None
+    _generations[meta_path] = (stamp, generation)
+    return generation
+
+
+class NodeStore:
+    """Read-only, index-addressable view over a persisted node store."""
+
+    def __init__(
+        self,
+        path: str,
+        meta: Dict,
+        offsets: np.ndarray,
+        blob,
+        spans: np.ndarray,
+        columns: Dict[str, StringArray],
+        metadata: Dict[str, StringArray],
+    ):
+        self.path = path
+        self.fingerprint: str = meta["fingerprint"]
+        self._vectors_file: Optional[str] = meta.get("vectors_file")
+        self._index_file: Optional[str] = meta.get("index_file")
+        self._offsets = offsets
+        self._blob = blob
+        self._spans = spans
+        self._columns = columns
+        self._metadata = metadata
+        self._count = int(meta["count"])
+
+    @classmethod
+    def open(cls, persist_dir: str) -> Optional["NodeStore"]:
+        """Open the store under ``persist_dir``; ``None`` if absent or stale."""
+        path = os.path.join(persist_dir, NODE_STORE_DIRNAME)
+        meta_path = os.path.join(path, _META_FILE)
+
+        def _load(file: str) -> np.ndarray:
+            return np.load(os.path.join(path, file), mmap_mode="r")
+
+        def _column(files: Dict[str, str]) -> StringArray:
+            column = StringArray(_load(files["blob"]), _load(files["offsets"]))
+            if len(column) != meta["count"]:
+                raise ValueError(f"{files['offsets']} has {len(column)} rows, expected {meta['count']}")
+            return column
+
+        try:
+            meta = _read_meta(meta_path)
+            if meta is None:
+                return None
+            if meta.get("version") != NODE_STORE_VERSION:
+                logger.info("Node store version %s != %s; ignoring", meta.get("version"), NODE_STORE_VERSION)
+                return None
+            text_file = meta["text_file"]
+            offsets = _load(meta["offsets_file"])
+            spans = _load(meta["spans_file"])
+            columns = {name: _column(meta["columns"][name]) for name in _STRING_COLUMNS}
+            metadata = {key: _column(files) for key, files in meta["metadata"].items()}
+            with open(os.path.join(path, text_file), "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap stays valid after the file object is closed
+                blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.warning("Failed to open node store at %s: %s", path, exc)
+            return None
+        return cls(path, meta, offsets, blob, spans, columns, metadata)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def load_vectors(self) -> Optional[np.ndarray]:
+        """Embeddings of this generation, mmap-opened; ``None`` if absent or the wrong length."""
+        if not self._vectors_file:
+            return None
+        file = os.path.join(self.path, self._vectors_file)
+        try:
+            vectors = np.load(file, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(vectors) != self._count:
+            logger.warning("%s has %d rows but the node store has %d", file, len(vectors), self._count)
+            return None
+        return vectors
+
+    def read_index(self) -> Optional[faiss.Index]:
+        """The FAISS index published with this generation; ``None`` if absent or mismatched."""
+        if not self._index_file:
+            return None
+        file = os.path.join(self.path, self._index_file)
+        try:
+            index = faiss.read_index(file)
+        except RuntimeError as exc:
+            logger.warning("Cannot read FAISS index %s: %s", file, exc)
+            return None
+        if index.ntotal != self._count:
+            logger.warning("%s has %d rows but the node store has %d", file, index.ntotal, self._count)
+            return None
+        return index
+
+    def __getitem__(self, i: int) -> TextNode:
+        return self.node(i)
+
+    def __iter__(self) -> Iterator[TextNode]:
+        for i in range(self._count):
+            yield self.node(i)
+
+    def text(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._blob[start:end]).decode("utf-8")
+
+    def node_id(self, i: int) -> str:
+        return self._columns["node_id"][i]
+
+    def metadata(self, i: int) -> Dict:
+        values = {k: _decode(col[i]) for k, col in self._metadata.items()}
+        return {k: v for k, v in values.items() if v is not None}
+
+    def url(self, i: int) -> Optional[str]:
+        for key in ("url", "source"):
+            col = self._metadata.get(key)
+            value = _decode(col[i]) if col is not None else None
+            if value:
+                return value
+        return None
+
+    def node(self, i: int) -> TextNode:
+        """Materialize row ``i`` as a llama-index ``TextNode``."""
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        cols = self._columns
+        relationships = {}
+        ref_doc_id = cols["ref_doc_id"][i]
+        if ref_doc_id:
+            relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=ref_doc_id)
+        start, end = (int(idx) for idx in self._spans[i])
+        return TextNode(
+            id_=cols["node_id"][i],
+            text=self.text(i),
+            metadata=self.metadata(i),
+            relationships=relationships,
+            start_char_idx=None if start < 0 else start,
+            end_char_idx=None if end < 0 else end,
+            excluded_embed_metadata_keys=list(_decode(cols["excluded_embed_metadata_keys"][i]) or []),
+            excluded_llm_metadata_keys=list(_decode(cols["excluded_llm_metadata_keys"][i]) or []),
+        )
@@ -0,0 +1,292 @@
+"""ONNX Runtime (dynamic int8) backend for the embedder and the reranker.
+
+Selected with ``HEIBOT_INFERENCE_BACKEND=onnx``. Each model is exported once
+with ``torch.onnx.export``, its weights are quantized to int8 with
+``onnxruntime.quantization.quantize_dynamic`` and the result is cached under
+``ONNX_MODEL_DIR/<model name>/``. At query time only onnxruntime and the
+tokenizer are needed.
+
+Export ahead of time and check drift/latency against PyTorch::
+
+    python -m chatbot.onnx_backend export
+    python -m chatbot.onnx_backend compare --persist-dir index_store
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from pydantic import PrivateAttr
+
+from .utils import env_int
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "onnx_models")
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+_INPUT_NAMES = ("input_ids", "attention_mask", "token_type_ids")
+
+EMBED_MAX_LENGTH = 128  # max_seq_length of paraphrase-multilingual-mpnet-base-v2
+
+
+def _model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as exc:
+        raise RuntimeError(
+            "HEIBOT_INFERENCE_BACKEND=onnx needs the onnxruntime and onnx packages"
+        ) from exc
+    return onnxruntime
+
+
+def export_model(model_name: str, kind: str, force: bool = False) -> str:
+    """Export ``model_name`` to ONNX and quantize it; return the model directory.
+
+    ``kind`` is ``"embed"`` (encoder, last hidden state) or ``"rerank"``
+    (sequence classification logits).
+    """
+    out_dir = _model_dir(model_name)
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    if os.path.exists(int8_path) and not force:
+        return out_dir
+
+    _require_onnxruntime()
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model_cls = AutoModelForSequenceClassification if kind == "rerank" else AutoModel
+    model = model_cls.from_pretrained(model_name).eval()
+
+    if kind == "rerank":
+        sample = tokenizer(["query"], ["passage"], return_tensors="pt")
+        output_axes = {0: "batch"}
+    else:
+        sample = tokenizer(["text"], return_tensors="pt")
+        output_axes = {0: "batch", 1: "seq"}
+    names = [n for n in _INPUT_NAMES if n in sample]
+
+    start = time.perf_counter()
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in names),
+            fp32_path,
+            input_names=names,
+            output_names=["output"],
+            dynamic_axes={**{n: {0: "batch", 1: "seq"} for n in names}, "output": output_axes},
+            opset_version=17,
+        )
+    # bge-reranker-v2-m3 is > 2 GB in fp32, so weights go to external data
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, use_external_data_format=True)
+    tokenizer.save_pretrained(out_dir)
+    logger.info("Exported %s to %s in %.1fs", model_name, int8_path, time.perf_counter() - start)
+    return out_dir
+
+
+class _OnnxSession:
+    def __init__(self, model_dir: str):
+        ort = _require_onnxruntime()
+        from transformers import AutoTokenizer
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = env_int("ONNX_NUM_THREADS", 0)
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, INT8_FILE), opts, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def run(self, encoded) -> np.ndarray:
+        feeds = {k: np.asarray(v, dtype=np.int64) for k, v in encoded.items() if k in self.input_names}
+        return self.session.run(None, feeds)[0]
+
+
+class OnnxCrossEncoder:
+    """Drop-in for ``sentence_transformers.CrossEncoder.predict`` (single-logit models)."""
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        self.model_name = model_name
+        self.max_length = max_length
+        self._onnx = _OnnxSession(export_model(model_name, "rerank"))
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 16, **_: Any) -> np.ndarray:
+        scores = []
+        for i in range(0, len(pairs), batch_size):
+            chunk = pairs[i:i + batch_size]
+            encoded = self._onnx.tokenizer(
+                [q for q, _ in chunk],
+                [p for _, p in chunk],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            logits = self._onnx.run(encoded)[:, 0]
+            # CrossEncoder applies a sigmoid to single-label models by default
+            scores.append(1.0 / (1.0 + np.exp(-logits)))
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+
+
+class OnnxEmbedding(BaseEmbedding):
+    """Mean-pooled, L2-normalized sentence embeddings, as HuggingFaceEmbedding returns."""
+
+    max_length: int = EMBED_MAX_LENGTH
+    _onnx: Any = PrivateAttr()
+
+    def __init__(self, model_name: str, max_length: int = EMBED_MAX_LENGTH, **kwargs: Any):
+        super().__init__(model_name=model_name, max_length=max_length, **kwargs)
+        self._onnx = _OnnxSession(export_model(model_name, "embed"))
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "OnnxEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        encoded = self._onnx.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        hidden = self._onnx.run(encoded)
+        mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+# --------------------------------------------------------------------------- #
+#                       Drift and latency vs. PyTorch                         #
+# --------------------------------------------------------------------------- #
+
+SAMPLE_QUERIES = [
+    "Wie richte ich das VPN ein?",
+    "How do I connect to eduroam on Android?",
+    "Passwort für die Uni-ID zurücksetzen",
+    "How can I print from my own laptop?",
+    "Mehr Speicherplatz in heiBOX beantragen",
+]
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def _ranks(x: np.ndarray) -> np.ndarray:
+    return np.argsort(np.argsort(x)).astype(np.float64)
+
+
+def compare_backends(passages: List[str], queries: Optional[List[str]] = None, batch_size: int = 16) -> dict:
+    """Score the same inputs with PyTorch and ONNX; report drift and latency."""
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+
+    from .engine import EMBED_MODEL_NAME, RERANK_MODEL_NAME
+
+    queries = queries or SAMPLE_QUERIES
+    pairs = [(q, p) for q in queries for p in passages]
+
+    torch_ce = CrossEncoder(RERANK_MODEL_NAME, max_length=512, device="cpu")
+    onnx_ce = OnnxCrossEncoder(RERANK_MODEL_NAME, max_length=512)
+    # warm up both so one-off initialization is not timed
+    torch_ce.predict(pairs[:2])
+    onnx_ce.predict(pairs[:2])
+    ref, t_ref = _timed(torch_ce.predict, pairs, batch_size=batch_size)
+    got, t_got = _timed(onnx_ce.predict, pairs, batch_size=batch_size)
+    ref, got = np.asarray(ref, dtype=np.float64), np.asarray(got, dtype=np.float64)
+
+    n = len(passages)
+    top_k = min(3, n)
+    top_agree = []
+    for qi in range(len(queries)):
+        a = set(np.argsort(-ref[qi * n:(qi + 1) * n])[:top_k])
+        b = set(np.argsort(-got[qi * n:(qi + 1) * n])[:top_k])
+        top_agree.append(len(a & b) / top_k)
+
+    torch_emb = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")
+    onnx_emb = OnnxEmbedding(EMBED_MODEL_NAME)
+    texts = queries + passages
+    e_ref, te_ref = _timed(torch_emb.encode, texts, batch_size=batch_size, normalize_embeddings=True)
+    e_got, te_got = _timed(onnx_emb.get_text_embedding_batch, texts)
+    cos = np.sum(np.asarray(e_ref) * np.asarray(e_got), axis=1)
+
+    return {
+        "pairs": len(pairs),
+        "rerank_max_abs_diff": float(np.max(np.abs(ref - got))),
+        "rerank_rank_corr": float(np.corrcoef(_ranks(ref), _ranks(got))[0, 1]),
+        "rerank_top3_agreement": float(np.mean(top_agree)),
+        "rerank_torch_s": t_ref,
+        "rerank_onnx_s": t_got,
+        "rerank_speedup": t_ref / t_got if t_got else float("inf"),
+        "embed_min_cosine": float(cos.min()),
+        "embed_mean_cosine": float(cos.mean()),
+        "embed_torch_s": te_ref,
+        "embed_onnx_s": te_got,
+        "embed_speedup": te_ref / te_got if te_got else float("inf"),
+    }
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export and check the ONNX int8 models.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_export = sub.add_parser("export", help="export and quantize both models")
+    p_export.add_argument("--force", action="store_true")
+    p_cmp = sub.add_parser("compare", help="drift and latency against PyTorch")
+    p_cmp.add_argument("--persist-dir", default="index_store")
+    p_cmp.add_argument("--passages", type=int, default=40)
+    p_cmp.add_argument("--batch-size", type=int, default=16)
+    p_cmp.add_argument("--min-rank-corr", type=float, default=0.95)
+    p_cmp.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args(argv)
+
+    from .engine import EMBED_MODEL_NAME, RERANK_MODEL_NAME
+
+    if args.cmd == "export":
+        for name, kind in ((EMBED_MODEL_NAME, "embed"), (RERANK_MODEL_NAME, "rerank")):
+            print(export_model(name, kind, force=args.force))
+        return 0
+
+    from .node_store import NodeStore
+
+    store = NodeStore.open(args.persist_dir)
+    if store is None or not len(store):
+        print(f"No node store in {args.persist_dir}; passages are sampled from it", file=sys.stderr)
+        return 2
+    rows = np.linspace(0, len(store) - 1, num=min(args.passages, len(store)), dtype=int)
+    report = compare_backends([store.text(int(i)) for i in rows], batch_size=args.batch_size)
+    for key, value in report.items():
+        print(f"{key:24s} {value:.4f}" if isinstance(value, float) else f"{key:24s} {value}")
+    ok = report["rerank_rank_corr"] >= args.min_rank_corr and report["embed_min_cosine"] >= args.min_cosine
+    print("drift: OK" if ok else "drift: FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""String columns stored as a UTF-8 blob plus int64 offsets.
+
+Both arrays are saved as ``.npy`` files and opened with ``mmap_mode="r"``,
+so worker processes share them through the page cache instead of each
+parsing a JSON list into Python objects at startup. ``offsets[i]:offsets[i + 1]``
+slices the blob for entry ``i``.
+"""
+from typing import Iterable, Iterator, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+def pack_strings(strings: Iterable[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenate ``strings`` as UTF-8 and return ``(blob, offsets)``."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class StringArray(Sequence[str]):
+    """Read-only, index-addressable strings over ``(blob, offsets)``."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def raw(self, i: int) -> bytes:
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes()
+
+    def __getitem__(self, i: int) -> str:
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError(i)
+        return self.raw(i).decode("utf-8")
+
+
+class StringTable(Mapping[str, int]):
+    """``str -> int`` map whose keys are stored in UTF-8 byte order.
+
+    Lookups binary-search the key column, so nothing is materialized per
+    key when the table is opened.
+    """
+
+    def __init__(self, keys: StringArray, values: np.ndarray):
+        self.keys_array = keys
+        self.values = values
+
+    @staticmethod
+    def pack(mapping: Mapping[str, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return ``(blob, offsets, values)`` arrays for ``mapping``."""
+        items = sorted((key.encode("utf-8"), value) for key, value in mapping.items())
+        blob, offsets = pack_strings(key.decode("utf-8") for key, _ in items)
+        return blob, offsets, np.asarray([value for _, value in items], dtype=np.int64)
+
+    @classmethod
+    def from_dict(cls, mapping: Mapping[str, int]) -> "StringTable":
+        blob, offsets, values = cls.pack(mapping)
+        return cls(StringArray(blob, offsets), values)
+
+    def _find(self, key: object) -> int:
+        if not isinstance(key, str):
+            return -1
+        target = key.encode("utf-8")
+        lo, hi = 0, len(self.keys_array)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys_array.raw(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.keys_array) and self.keys_array.raw(lo) == target:
+            return lo
+        return -1
+
+    def __getitem__(self, key: str) -> int:
+        pos = self._find(key)
+        if pos < 0:
+            raise KeyError(key)
+        return int(self.values[pos])
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_array)
+
+    def __len__(self) -> int:
+        return len(self.keys_array)
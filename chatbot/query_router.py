@@ -0,0 +1,153 @@
+"""Pre-retrieval routing of chat turns.
+
+Greetings, thanks and questions about the assistant itself do not need the
+library. Routing them before retrieval saves the query embedding, the FAISS
+and BM25 searches and the cross-encoder. Keyword rules decide the obvious
+cases; an optional check compares the query embedding with a few prototype
+questions per route. The rules are deliberately stricter than
+``_looks_like_meta_or_oos`` in the engine, which only suppresses the Sources
+footer after the fact: a false positive here skips retrieval entirely.
+"""
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .metrics import ROUTER_DECISIONS
+
+RAG = "rag"
+META = "meta"
+CHITCHAT = "chitchat"
+
+# Matched against the whole (normalized) message only, like CHITCHAT_PATTERNS:
+# "what can you do if eduroam fails" or "which model of laptop can I borrow"
+# are library questions and must not match.
+META_PATTERNS = [
+    r"(who|what) are you", r"(wer|was) bist du", r"(wer|was) sind sie",
+    r"(what|which) (language )?model (are you|do you use)( based on| running on)?",
+    r"welches (sprach)?modell (bist du|nutzt du|verwendest du|steckt hinter dir)",
+    r"what('s| is) your system ?prompt", r"(wie lautet |zeig mir )?(dein|deinen|ihr|ihren) system ?prompt",
+    r"what can you do( for me)?", r"was kannst du( alles| so)?", r"was können sie( alles)?",
+    r"what are your capabilities", r"(was sind )?(deine|ihre) fähigkeiten",
+    r"how do you work", r"wie funktionierst du",
+    r"are you (a bot|an ai|human)", r"bist du (ein bot|eine ki|ein mensch)",
+]
+
+# Matched against the whole (normalized) message only
+CHITCHAT_PATTERNS = [
+    r"(hi|hey|hello|hallo|moin|servus|guten (morgen|tag|abend)|good (morning|afternoon|evening))( there)?",
+    r"(thanks?|thank you|thx|danke|vielen dank|danke schön|dankeschön)( (a lot|so much|very much|sehr))?",
+    r"(bye|goodbye|tschüss|tschüs|ciao|auf wiedersehen|bis bald)",
+    r"(ok|okay|alles klar|super|great|cool|perfekt|perfect)",
+    r"(how are you|wie geht('s| es)( dir| ihnen)?)",
+]
+
+PROTOTYPES: Dict[str, List[str]] = {
+    META: [
+        "Who are you?",
+        "What can you help me with?",
+        "Which language model are you based on?",
+        "Wer bist du?",
+        "Was kannst du alles?",
+        "Welches Sprachmodell steckt hinter dir?",
+    ],
+    CHITCHAT: [
+        "Hello, how are you?",
+        "Thank you, that helped a lot!",
+        "Hallo, wie geht es dir?",
+        "Danke, das hat geholfen!",
+    ],
+}
+
+_META_RE = re.compile(
+    r"(?:(hi|hey|hello|hallo)( there)?,? )?(?:%s)( (actually|exactly|eigentlich|genau|denn))?"
+    % "|".join(META_PATTERNS)
+)
+_CHITCHAT_RE = re.compile(r"(?:%s)" % "|".join(CHITCHAT_PATTERNS))
+
+
+def _normalize(text: str) -> str:
+    text = " ".join((text or "").lower().split())
+    return re.sub(r"[\s!?.,:;)(]+$", "", text).strip()
+
+
+class QueryRouter:
+    """Routes a turn to ``rag``, ``meta`` or ``chitchat``.
+
+    ``embed_batch`` turns a list of texts into embeddings; without it (or with
+    ``threshold <= 0``) only the keyword rules are used. Prototype embeddings
+    are computed on first use.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Optional[Callable[[List[str]], Sequence[Sequence[float]]]] = None,
+        threshold: float = 0.85,
+        prototypes: Optional[Dict[str, List[str]]] = None,
+        max_chitchat_words: int = 6,
+        max_meta_words: int = 8,
+    ):
+        self.embed_batch = embed_batch
+        self.threshold = threshold
+        self.prototypes = prototypes if prototypes is not None else PROTOTYPES
+        self.max_chitchat_words = max_chitchat_words
+        self.max_meta_words = max_meta_words
+        self._matrix: Optional[np.ndarray] = None
+        self._labels: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.embed_batch is not None and self.threshold > 0
+
+    def classify_rules(self, query: str) -> Optional[str]:
+        q = _normalize(query)
+        if not q:
+            return CHITCHAT
+        words = len(q.split())
+        if words <= self.max_meta_words and _META_RE.fullmatch(q):
+            return META
+        if words <= self.max_chitchat_words and _CHITCHAT_RE.fullmatch(q):
+            return CHITCHAT
+        return None
+
+    def warmup(self) -> None:
+        """Embed the prototypes now instead of on the first routed turn."""
+        if self.uses_embeddings:
+            self._prototype_matrix()
+
+    def _prototype_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    labels = [r for r, texts in self.prototypes.items() for _ in texts]
+                    texts = [t for ts in self.prototypes.values() for t in ts]
+                    mat = np.asarray(self.embed_batch(texts), dtype=np.float32)
+                    mat /= np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+                    self._labels = labels
+                    self._matrix = mat
+        return self._matrix
+
+    def classify_embedding(self, embedding: Sequence[float]) -> Optional[str]:
+        if not self.uses_embeddings or not self.prototypes:
+            return None
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if not norm:
+            return None
+        sims = self._prototype_matrix() @ (vec / norm)
+        i = int(np.argmax(sims))
+        return self._labels[i] if float(sims[i]) >= self.threshold else None
+
+    def route(self, query: str, embedding: Optional[Sequence[float]] = None) -> str:
+        """Rules first, then the prototype check when an embedding is given."""
+        route, method = self.classify_rules(query), "rules"
+        # the prototypes are short turns; longer messages are library questions
+        short = len(_normalize(query).split()) <= max(self.max_meta_words, self.max_chitchat_words)
+        if route is None and embedding is not None and short:
+            route, method = self.classify_embedding(embedding), "embedding"
+        if route is None:
+            route, method = RAG, "default"
+        ROUTER_DECISIONS.labels(route, method).inc()
+        return route
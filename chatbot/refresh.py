@@ -0,0 +1,223 @@
+"""Incremental refresh of the legacy index from the sitemap.
+
+Compares sitemap ``<lastmod>``, HTTP validators (ETag / Last-Modified) and a
+SHA-256 of each page's cleaned text against ``index_store/manifest.json``.
+Only new or changed pages are split and embedded; chunks whose text did not
+change keep their stored vectors. Rows of removed pages are dropped, and the
+FAISS index, node store and keyword/url indexes are rewritten from the kept
+rows (rebuilding the ANN structure from stored vectors takes seconds, unlike
+re-embedding)::
+
+    python -m chatbot.refresh
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Dict, List, Optional
+
+import aiohttp
+import faiss
+import numpy as np
+
+from .ann import reconstruct_vectors
+from .engine import (
+    EXCLUDE_SELECTORS,
+    PERSIST_DIR,
+    SITEMAP_URL,
+    embed_nodes,
+    ensure_aux_indexes,
+    fetch_page,
+    sitemap_entries,
+    split_documents,
+    write_index_store,
+)
+from .node_store import NodeStore
+from .utils import atomic_write_path, normalize_url
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+FETCH_CONCURRENCY = 8
+
+
+def load_manifest(persist_dir: str) -> Dict[str, Dict]:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable manifest %s: %s", path, exc)
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("pages", {})
+
+
+def save_manifest(persist_dir: str, pages: Dict[str, Dict]) -> None:
+    path = os.path.join(persist_dir, MANIFEST_FILE)
+    with atomic_write_path(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "pages": pages}, f, ensure_ascii=False, indent=1)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def manifest_entry(page, lastmod: Optional[str]) -> Dict:
+    """Manifest record of a page fetched with status 200."""
+    return {
+        "lastmod": lastmod,
+        "etag": page.etag,
+        "last_modified": page.last_modified,
+        "sha256": content_hash(page.document.text),
+    }
+
+
+def _load_current_vectors(store: NodeStore) -> np.ndarray:
+    vectors = store.load_vectors()
+    if vectors is not None:
+        return vectors
+    index = store.read_index()
+    if not isinstance(index, faiss.IndexFlat):
+        raise RuntimeError("Stored vectors are missing and the FAISS index is not flat; run a full rebuild")
+    return reconstruct_vectors(index)
+
+
+async def async_refresh_index(
+    entries: Dict[str, Optional[str]],
+    persist_dir: str = PERSIST_DIR,
+    concurrency: int = FETCH_CONCURRENCY,
+) -> Dict[str, int]:
+    """Bring ``persist_dir`` in line with ``entries`` (``{url: lastmod}``).
+
+    Returns counts of unchanged / changed / removed / failed pages and of
+    embedded / reused chunks.
+    """
+    store = NodeStore.open(persist_dir)
+    if store is None:
+        raise RuntimeError(f"No node store in {persist_dir}; run a full build first")
+    vectors = _load_current_vectors(store)
+    manifest = load_manifest(persist_dir)
+
+    rows_by_url: Dict[str, List[int]] = {}
+    orphan_rows: List[int] = []
+    for i in range(len(store)):
+        u = store.url(i)
+        if u:
+            rows_by_url.setdefault(normalize_url(u), []).append(i)
+        else:
+            orphan_rows.append(i)
+
+    wanted = {normalize_url(u): u for u in entries}
+    stats = dict.fromkeys(("unchanged", "changed", "removed", "failed", "embedded", "reused"), 0)
+    new_manifest: Dict[str, Dict] = {}
+    keep: List[str] = []
+    to_fetch = []
+    for norm, url in wanted.items():
+        entry = manifest.get(norm) or {}
+        lastmod = entries[url]
+        if lastmod and entry.get("lastmod") == lastmod and norm in rows_by_url:
+            keep.append(norm)
+            new_manifest[norm] = entry
+        else:
+            to_fetch.append((norm, url, entry))
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _fetch(session, url, entry):
+        async with sem:
+            return await fetch_page(
+                session,
+                url,
+                EXCLUDE_SELECTORS,
+                etag=entry.get("etag"),
+                last_modified=entry.get("last_modified"),
+            )
+
+    async with aiohttp.ClientSession() as session:
+        pages = await asyncio.gather(*(_fetch(session, url, entry) for _, url, entry in to_fetch))
+
+    changed_docs = {}
+    for (norm, url, entry), page in zip(to_fetch, pages):
+        lastmod = entries[url]
+        if page is not None and page.status in (404, 410):
+            continue  # gone upstream: drop its rows
+        if page is None or page.status not in (200, 304):
+            stats["failed"] += 1
+            if norm in rows_by_url:
+                keep.append(norm)
+                new_manifest[norm] = entry
+            continue
+        if page.status == 304 and norm in rows_by_url:
+            keep.append(norm)
+            new_manifest[norm] = {**entry, "lastmod": lastmod}
+            continue
+        if page.document is None:
+            continue
+        new_manifest[norm] = manifest_entry(page, lastmod)
+        if entry.get("sha256") == new_manifest[norm]["sha256"] and norm in rows_by_url:
+            keep.append(norm)
+        else:
+            changed_docs[norm] = page.document
+
+    stats["unchanged"] = len(keep)
+    stats["changed"] = len(changed_docs)
+    removed = set(rows_by_url) - set(keep) - set(changed_docs)
+    stats["removed"] = len(removed)
+
+    if not changed_docs and not removed:
+        save_manifest(persist_dir, new_manifest)
+        logger.info("Index refresh: nothing changed (%s)", stats)
+        return stats
+
+    keep_rows = sorted(orphan_rows + [i for norm in keep for i in rows_by_url[norm]])
+    new_nodes = split_documents(list(changed_docs.values()))
+
+    # Chunks whose text survived an edit keep their old vector.
+    old_rows_by_text = {}
+    for norm in changed_docs:
+        for i in rows_by_url.get(norm, []):
+            old_rows_by_text.setdefault((norm, store.text(i)), i)
+    reuse_rows = [old_rows_by_text.get((normalize_url(n.metadata["url"]), n.text)) for n in new_nodes]
+    to_embed = [n for n, row in zip(new_nodes, reuse_rows) if row is None]
+    stats["embedded"] = len(to_embed)
+    stats["reused"] = len(new_nodes) - len(to_embed)
+
+    fresh = iter(embed_nodes(to_embed)) if to_embed else iter(())
+    dim = vectors.shape[1]
+    new_vectors = np.empty((len(new_nodes), dim), dtype="float32")
+    for j, row in enumerate(reuse_rows):
+        new_vectors[j] = vectors[row] if row is not None else next(fresh)
+
+    nodes = [store[i] for i in keep_rows] + new_nodes
+    all_vectors = np.vstack([np.asarray(vectors[keep_rows], dtype="float32"), new_vectors])
+    node_store, _ = write_index_store(persist_dir, nodes, all_vectors)
+    ensure_aux_indexes(persist_dir, node_store)
+    save_manifest(persist_dir, new_manifest)
+    logger.info("Index refresh: %s; %d rows", stats, len(node_store))
+    return stats
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="Incrementally refresh the legacy index from the sitemap.")
+    p.add_argument("--persist-dir", default=PERSIST_DIR)
+    p.add_argument("--sitemap", default=SITEMAP_URL)
+    p.add_argument("--concurrency", type=int, default=FETCH_CONCURRENCY)
+    args = p.parse_args(argv)
+
+    entries = sitemap_entries(args.sitemap, args.persist_dir)
+    stats = asyncio.run(async_refresh_index(entries, args.persist_dir, args.concurrency))
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""Micro-batching front end for the shared cross-encoder.
+
+Concurrent requests submit their (query, passage) pairs; a single worker
+thread waits up to ``window_ms`` for more work, scores everything it collected
+in one ``predict`` call and resolves each request's future with its slice of
+the scores. The single worker also replaces the old global rerank lock.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from .metrics import RERANK_BATCHES, RERANK_BATCH_SIZE, RERANK_LATENCY, RERANK_QUEUE_DEPTH, RERANK_SKIPS
+
+logger = logging.getLogger(__name__)
+
+Pair = Tuple[str, str]
+
+
+@dataclass
+class _Request:
+    pairs: Sequence[Pair]
+    future: Future = field(default_factory=Future)
+    submitted: float = field(default_factory=time.perf_counter)
+
+
+class RerankBatcher:
+    """Scores (query, passage) pairs for many callers on one worker thread."""
+
+    def __init__(
+        self,
+        model,
+        window_ms: float = 5.0,
+        max_batch_pairs: int = 64,
+        predict_batch_size: int = 16,
+        name: str = "cross-encoder",
+    ):
+        self.model = model
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_pairs = max(1, max_batch_pairs)
+        self.predict_batch_size = max(1, predict_batch_size)
+        self.name = name
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # plain counters for debug output; Prometheus gets the same numbers
+        self.batches = 0
+        self.pairs_scored = 0
+        self.requests_served = 0
+        self.last_batch_pairs = 0
+        self.last_batch_requests = 0
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, pairs: Sequence[Pair]) -> Future:
+        """Queue ``pairs``; the future resolves to a list of float scores."""
+        req = _Request(list(pairs))
+        if not req.pairs:
+            req.future.set_result([])
+            return req.future
+        self._ensure_started()
+        self._queue.put(req)
+        return req.future
+
+    def score(self, pairs: Sequence[Pair]) -> List[float]:
+        return self.submit(pairs).result()
+
+    async def ascore(self, pairs: Sequence[Pair]) -> List[float]:
+        return await asyncio.wrap_future(self.submit(pairs))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "pairs_scored": self.pairs_scored,
+            "requests_served": self.requests_served,
+            "last_batch_pairs": self.last_batch_pairs,
+            "last_batch_requests": self.last_batch_requests,
+        }
+
+    # --------------------------------------------------------------- worker
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[_Request]:
+        """Block for the first live request, then gather more for ``window``.
+
+        Each request's future is moved to RUNNING as it is taken, so a caller
+        that gives up later can no longer cancel it under the worker; requests
+        already cancelled are dropped here.
+        """
+        batch: List[_Request] = []
+        n_pairs = 0
+        deadline = 0.0
+        while n_pairs < self.max_batch_pairs:
+            if not batch:
+                req = self._queue.get()
+            else:
+                timeout = deadline - time.perf_counter()
+                try:
+                    req = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if not req.future.set_running_or_notify_cancel():
+                continue
+            if not batch:
+                deadline = time.perf_counter() + self.window
+            batch.append(req)
+            n_pairs += len(req.pairs)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as exc:
+                # the only worker must survive; fail this batch and carry on
+                logger.exception("Cross-encoder batch of %d requests failed", len(batch))
+                for req in batch:
+                    if not req.future.done():
+                        req.future.set_exception(exc)
+
+    def _score(self, batch: List[_Request]) -> None:
+        pairs = [p for req in batch for p in req.pairs]
+        RERANK_QUEUE_DEPTH.labels(self.name).observe(self._queue.qsize())
+        scores = self.model.predict(pairs, batch_size=self.predict_batch_size)
+
+        self.batches += 1
+        self.pairs_scored += len(pairs)
+        self.requests_served += len(batch)
+        self.last_batch_pairs = len(pairs)
+        self.last_batch_requests = len(batch)
+        RERANK_BATCHES.labels(self.name).inc()
+        RERANK_BATCH_SIZE.labels(self.name, "pairs").observe(len(pairs))
+        RERANK_BATCH_SIZE.labels(self.name, "requests").observe(len(batch))
+
+        done = time.perf_counter()
+        offset = 0
+        for req in batch:
+            n = len(req.pairs)
+            req.future.set_result([float(s) for s in scores[offset:offset + n]])
+            offset += n
+            RERANK_LATENCY.labels(self.name).observe(done - req.submitted)
+
+
+@dataclass
+class RerankPolicy:
+    """How much cross-encoder work a request gets.
+
+    * ``skip_reason`` returns why the cross-encoder can be skipped entirely:
+      no more than ``top_k`` candidates, or a fused winner whose raw vector
+      score (``1 / (1 + L2)``) beats every other candidate's by at least
+      ``skip_margin`` (absolute, ``0`` disables). Fused RRF scores are not
+      used: with ``k=60`` a node that tops two lists already leads by ~50%.
+    * Otherwise every candidate is scored. Opting in to ``early_exit_score``
+      scores them in first-stage order, ``chunk_size`` at a time, and stops
+      once ``top_k`` candidates reach that score. This is a heuristic, not a
+      bound: sigmoid scores go up to 1.0 and nothing bounds an unscored
+      candidate below that, so it can still outrank the ones kept. It is
+      off by default (``0``) and relies on the first stage having put the
+      good candidates first.
+    * Passages are cut to ``max_passage_chars`` before scoring (``0`` keeps
+      them whole); the model truncates at its token limit anyway, this only
+      saves tokenizing text that would be thrown away.
+    """
+
+    skip_margin: float = 0.15
+    chunk_size: int = 8
+    early_exit_score: float = 0.0
+    max_passage_chars: int = 1200
+
+    def skip_reason(self, vector_scores: Sequence[Optional[float]], top_k: int) -> Optional[str]:
+        """``vector_scores`` follows the fused order; ``None`` for non-vector hits."""
+        reason = None
+        if len(vector_scores) <= top_k:
+            reason = "few_candidates"
+        elif self.skip_margin > 0 and vector_scores[0] is not None:
+            others = [s for s in vector_scores[1:] if s is not None]
+            if others and vector_scores[0] - max(others) >= self.skip_margin:
+                reason = "margin"
+        if reason:
+            RERANK_SKIPS.labels(reason).inc()
+        return reason
+
+    def chunks(self, n: int, top_k: int) -> List[range]:
+        if self.chunk_size <= 0 or self.early_exit_score <= 0:
+            return [range(n)]
+        first = max(top_k, self.chunk_size)
+        out = [range(0, min(first, n))]
+        for start in range(first, n, self.chunk_size):
+            out.append(range(start, min(start + self.chunk_size, n)))
+        return out
+
+    def can_stop(self, scores: Sequence[Optional[float]], top_k: int) -> bool:
+        """Call between chunks; a ``True`` result is counted as an early exit.
+
+        Heuristic: see the class docstring.
+        """
+        if self.early_exit_score <= 0:
+            return False
+        confident = sum(1 for s in scores if s is not None and s >= self.early_exit_score)
+        if confident < top_k:
+            return False
+        RERANK_SKIPS.labels("early_exit").inc()
+        return True
+
+    def passage(self, text: str) -> str:
+        if self.max_passage_chars > 0 and len(text) > self.max_passage_chars:
+            return text[: self.max_passage_chars]
+        return text
@@ -1,4 +1,3 @@
-import asyncio
 import uuid
 import logging
 from datetime import timedelta
@@ -18,11 +17,16 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from .engine import (
     async_init,
     stream_query,
-    clean_sitemap_urls,
+    async_sitemap_entries,
+    warmup,
     conversation_manager,
     PERSIST_DIR,
+    SITEMAP_URL,
 )
-from .utils import run_async
+from .async_bridge import LoopThread
+from .metrics import render_latest
+from .refresh import async_refresh_index
+from .utils import env_int
 
 logger = logging.getLogger(__name__)
 
@@ -35,13 +39,20 @@ def create_app():
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)
     app.wsgi_app = ProxyFix(app.wsgi_app, x_host=1)
 
-    app_loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(app_loop)
+    # One event loop per process, on its own thread; request threads submit to it
+    loop_thread = LoopThread(queue_size=env_int('HEIBOT_STREAM_QUEUE_SIZE', 64)).start()
 
-    urls = clean_sitemap_urls('https://www.urz.uni-heidelberg.de/sitemap.xml')
-    query_engine = run_async(async_init(urls, persist_dir=PERSIST_DIR))
+    entries = loop_thread.run(async_sitemap_entries(SITEMAP_URL, persist_dir=PERSIST_DIR))
+    if os.getenv('HEIBOT_REFRESH_ON_START', '0') == '1':
+        try:
+            loop_thread.run(async_refresh_index(entries, persist_dir=PERSIST_DIR))
+        except RuntimeError as exc:
+            logger.info('Skipping incremental index refresh: %s', exc)
+    query_engine = loop_thread.run(async_init(entries, persist_dir=PERSIST_DIR))
+    if os.getenv('HEIBOT_WARMUP', '1') == '1':
+        warmup()
     app.config['QUERY_ENGINE'] = query_engine
-    app.config['APP_LOOP'] = app_loop
+    app.config['LOOP_THREAD'] = loop_thread
 
     @app.route('/chat', methods=['POST'])
     def chat():
@@ -50,16 +61,11 @@ def create_app():
         if 'session_id' not in session:
             session['session_id'] = str(uuid.uuid4())
         qe = app.config['QUERY_ENGINE']
-        loop = app.config['APP_LOOP']
+        loop_thread = app.config['LOOP_THREAD']
+        session_id = session['session_id']
 
         def generate():
-            agen = stream_query(message, qe, session['session_id'])
-            ait = agen.__aiter__()
-            while True:
-                try:
-                    item = loop.run_until_complete(ait.__anext__())
-                except StopAsyncIteration:
-                    break
+            for item in loop_thread.stream(lambda: stream_query(message, qe, session_id)):
                 if isinstance(item, str):
                     yield f"data: {json.dumps({'token': item})}\n\n"
                 else:
@@ -77,6 +83,11 @@ def create_app():
             conversation_manager.clear_conversation(session['session_id'])
         return jsonify({'status': 'success'})
 
+    @app.route('/metrics')
+    def metrics():
+        body, content_type = render_latest()
+        return Response(body, mimetype=content_type.split(';')[0], content_type=content_type)
+
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def index(path):
@@ -0,0 +1,183 @@
+"""Async sitemap loading with a conditional-GET disk cache.
+
+Sitemaps are streamed through an incremental XML parser, so a large sitemap
+is never held as one document tree. ``<sitemapindex>`` files are followed
+recursively up to ``max_depth``. Each sitemap file is cached in a JSON file
+together with its ETag / Last-Modified validators:
+
+* a cache entry younger than ``max_age`` seconds is used without a request;
+* otherwise the file is re-requested with If-None-Match / If-Modified-Since,
+  and a ``304`` reuses the cached URLs without parsing anything;
+* on network or parse errors the cached URLs (if any) are used.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from .utils import atomic_write_path
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+FETCH_CONCURRENCY = 4
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(el: ET.Element, name: str) -> Optional[str]:
+    for child in el:
+        if _local(child.tag) == name and child.text and child.text.strip():
+            return child.text.strip()
+    return None
+
+
+class SitemapParser:
+    """Incremental parser for ``<urlset>`` and ``<sitemapindex>`` documents.
+
+    Feed raw bytes as they arrive; ``urls`` maps page URLs to ``<lastmod>``
+    and ``children`` lists the sitemaps referenced by an index.
+    """
+
+    def __init__(self, gzipped: bool = False):
+        self._parser = ET.XMLPullParser(events=("end",))
+        self._inflate = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        self.urls: Dict[str, Optional[str]] = {}
+        self.children: List[str] = []
+
+    def feed(self, data: bytes) -> None:
+        if self._inflate is not None:
+            data = self._inflate.decompress(data)
+        self._parser.feed(data)
+        self._drain()
+
+    def close(self) -> None:
+        if self._inflate is not None:
+            self._parser.feed(self._inflate.flush())
+        self._parser.close()
+        self._drain()
+
+    def _drain(self) -> None:
+        for _, el in self._parser.read_events():
+            tag = _local(el.tag)
+            if tag == "url":
+                loc = _child_text(el, "loc")
+                if loc:
+                    self.urls[loc] = _child_text(el, "lastmod")
+                el.clear()
+            elif tag == "sitemap":
+                loc = _child_text(el, "loc")
+                if loc:
+                    self.children.append(loc)
+                el.clear()
+
+
+def load_cache(path: str) -> Dict[str, Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable sitemap cache %s: %s", path, exc)
+        return {}
+    if data.get("version") != CACHE_VERSION:
+        return {}
+    return data.get("sitemaps", {})
+
+
+def save_cache(path: str, sitemaps: Dict[str, Dict]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with atomic_write_path(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CACHE_VERSION, "sitemaps": sitemaps}, f, ensure_ascii=False)
+
+
+class SitemapLoader:
+    def __init__(self, cache_path: str, max_age: float = 0.0, max_depth: int = 3, timeout: float = 60.0):
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.stats = dict.fromkeys(("cached", "not_modified", "parsed", "failed"), 0)
+
+    async def load(self, sitemap_url: str) -> Dict[str, Optional[str]]:
+        """Return ``{page_url: lastmod}`` for ``sitemap_url`` and every sitemap it indexes."""
+        cached = load_cache(self.cache_path)
+        visited: Dict[str, Dict] = {}
+        sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+        async with aiohttp.ClientSession() as session:
+            entries = await self._collect(session, sem, sitemap_url, cached, visited, depth=0)
+        if sitemap_url not in visited:
+            raise RuntimeError(f"Sitemap {sitemap_url} is unavailable and not cached")
+        if self.stats["not_modified"] or self.stats["parsed"] or set(visited) != set(cached):
+            save_cache(self.cache_path, visited)
+        logger.info("Sitemap %s: %d URLs (%s)", sitemap_url, len(entries), self.stats)
+        return entries
+
+    async def _collect(self, session, sem, url, cached, visited, depth) -> Dict[str, Optional[str]]:
+        if url in visited:
+            return {}
+        visited[url] = {}  # claim before awaiting so siblings do not fetch it twice
+        async with sem:
+            doc = await self._fetch(session, url, cached.get(url))
+        if doc is None:
+            del visited[url]
+            return {}
+        visited[url] = doc
+        entries = dict(doc["urls"])
+        children = doc["children"] if depth < self.max_depth else []
+        if doc["children"] and depth >= self.max_depth:
+            logger.warning("Not following %d sitemaps below %s: max depth %d", len(doc["children"]), url, self.max_depth)
+        results = await asyncio.gather(
+            *(self._collect(session, sem, child, cached, visited, depth + 1) for child in children)
+        )
+        for child_entries in results:
+            for page, lastmod in child_entries.items():
+                entries.setdefault(page, lastmod)
+        return entries
+
+    async def _fetch(self, session, url: str, entry: Optional[Dict]) -> Optional[Dict]:
+        now = time.time()
+        if entry and self.max_age > 0 and now - entry.get("fetched", 0) < self.max_age:
+            self.stats["cached"] += 1
+            return entry
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            async with session.get(url, headers=headers, timeout=timeout) as response:
+                if response.status == 304 and entry:
+                    self.stats["not_modified"] += 1
+                    return {**entry, "fetched": now}
+                response.raise_for_status()
+                parser = SitemapParser(gzipped=url.endswith(".gz"))
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    parser.feed(chunk)
+                parser.close()
+                self.stats["parsed"] += 1
+                return {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched": now,
+                    "urls": parser.urls,
+                    "children": parser.children,
+                }
+        except (aiohttp.ClientError, asyncio.TimeoutError, ET.ParseError, zlib.error) as exc:
+            self.stats["failed"] += 1
+            if entry:
+                logger.warning("Sitemap %s unavailable (%s); using the cached copy", url, exc)
+                return entry
+            logger.warning("Sitemap %s unavailable: %s", url, exc)
+            return None
@@ -0,0 +1,30 @@
+import faiss
+import numpy as np
+
+from chatbot.ann import evaluate_recall, perturbed_queries
+
+
+def _vectors(n=500, dim=16):
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((n, dim)).astype("float32")
+
+
+def test_perturbed_queries_are_not_stored_vectors():
+    vectors = _vectors()
+    queries = perturbed_queries(vectors, 50)
+    assert queries.shape == (50, vectors.shape[1])
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    dists, _ = flat.search(queries, 1)
+    assert (dists[:, 0] > 0).all()
+
+
+def test_evaluate_recall_of_exact_index_is_one():
+    vectors = _vectors()
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    report = evaluate_recall(index, vectors, k=5, num_queries=40)
+    assert report["recall"] == 1.0
+    assert report["queries"] == 40
+    real = evaluate_recall(index, vectors, k=5, queries=_vectors(n=7))
+    assert real["queries"] == 7
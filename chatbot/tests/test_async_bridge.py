@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from chatbot.async_bridge import LoopThread
+
+
+@pytest.fixture
+def loop_thread():
+    lt = LoopThread(queue_size=2).start()
+    yield lt
+    lt.stop()
+
+
+def test_stream_preserves_order(loop_thread) -> None:
+    async def numbers():
+        for i in range(50):
+            yield i
+            if i % 7 == 0:
+                await asyncio.sleep(0)
+
+    assert list(loop_thread.stream(numbers)) == list(range(50))
+
+
+def test_slow_consumer_throttles_the_producer(loop_thread) -> None:
+    produced = []
+
+    async def numbers():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    stream = loop_thread.stream(numbers)
+    assert next(stream) == 0
+    time.sleep(0.1)
+    # two queued items plus the one the producer is waiting to put
+    assert len(produced) <= 4
+
+    # the loop stays free for other work while the producer waits
+    assert loop_thread.run(asyncio.sleep(0, result="free"), timeout=1) == "free"
+    assert list(stream) == list(range(1, 20))
+
+
+def test_concurrent_streams_share_the_loop(loop_thread) -> None:
+    results = {}
+
+    async def letters(tag):
+        for i in range(30):
+            await asyncio.sleep(0.001)
+            yield f"{tag}{i}"
+
+    def consume(tag):
+        results[tag] = list(loop_thread.stream(lambda: letters(tag)))
+
+    threads = [threading.Thread(target=consume, args=(tag,)) for tag in "abc"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert results == {tag: [f"{tag}{i}" for i in range(30)] for tag in "abc"}
+
+
+def test_producer_exception_reaches_the_consumer(loop_thread) -> None:
+    async def failing():
+        yield "first"
+        raise ValueError("boom")
+
+    stream = loop_thread.stream(failing)
+    assert next(stream) == "first"
+    with pytest.raises(ValueError, match="boom"):
+        next(stream)
+
+
+def test_closing_the_stream_cancels_the_producer(loop_thread) -> None:
+    cancelled = threading.Event()
+
+    async def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            cancelled.set()
+
+    stream = loop_thread.stream(endless)
+    assert next(stream) == 0
+    stream.close()
+    assert cancelled.wait(2)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import TextNode
+
+from chatbot import cache as cache_module
+from chatbot.cache import CachedAnswer, SemanticAnswerCache, TTLCache
+from chatbot.engine import CrossEncoderReranker
+from chatbot.trace import RetrievalTrace, use_trace
+
+
+class _NoRetriever(BaseRetriever):
+    def _retrieve(self, query_bundle):
+        return []
+
+
+def _reranker(cache: TTLCache) -> CrossEncoderReranker:
+    return CrossEncoderReranker(_NoRetriever(), scorer=None, top_k=2, cache=cache)
+
+
+def test_score_cache_hits_across_case_and_whitespace_variants() -> None:
+    cache = TTLCache(maxsize=10, ttl=0, name="test_scores")
+    reranker = _reranker(cache)
+    bases = [TextNode(id_="n1", text="VPN einrichten"), TextNode(id_="n2", text="WLAN")]
+
+    scores, missing = reranker._pairs("Wie richte ich VPN ein?", bases)
+    assert scores == [None, None] and len(missing) == 2
+    reranker._fill("Wie richte ich VPN ein?", bases, scores, missing, [0.9, 0.1])
+
+    scores, missing = reranker._pairs("  wie richte ich  vpn ein ", bases)
+    assert scores == [0.9, 0.1] and missing == []
+    assert cache.hits == 2
+
+    # a different question or node id is a miss
+    scores, missing = reranker._pairs("Wie richte ich WLAN ein?", bases)
+    assert scores == [None, None]
+    scores, missing = reranker._pairs("wie richte ich vpn ein", [TextNode(id_="n3", text="VPN einrichten")])
+    assert scores == [None] and len(missing) == 1
+
+
+def test_score_cache_is_keyed_on_the_index_generation() -> None:
+    cache = TTLCache(maxsize=10, ttl=0, name="test_scores")
+    reranker = _reranker(cache)
+    bases = [TextNode(id_="n1", text="VPN einrichten")]
+    gen1 = RetrievalTrace(data={"index_generation": "gen1"})
+    gen2 = RetrievalTrace(data={"index_generation": "gen2"})
+
+    with use_trace(gen1):
+        scores, missing = reranker._pairs("vpn", bases)
+        reranker._fill("vpn", bases, scores, missing, [0.7])
+        assert reranker._pairs("vpn", bases)[0] == [0.7]
+    with use_trace(gen2):
+        assert reranker._pairs("vpn", bases)[0] == [None]
+
+
+def test_score_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(maxsize=2, ttl=0, name="test_scores")
+    cache.put_many({("q", "a"): 1.0, ("q", "b"): 2.0})
+    assert cache.get(("q", "a")) == 1.0  # "a" is now the most recently used
+    cache.put(("q", "c"), 3.0)
+    assert cache.get_many([("q", "a"), ("q", "b"), ("q", "c")]) == {("q", "a"): 1.0, ("q", "c"): 3.0}
+    assert len(cache) == 2
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1}
+
+
+def test_disabled_score_cache_stores_nothing() -> None:
+    cache = TTLCache(maxsize=0, ttl=0, name="test_scores")
+    cache.put(("q", "a"), 1.0)
+    assert cache.get(("q", "a")) is None and len(cache) == 0
+
+
+def _answer(text: str) -> CachedAnswer:
+    return CachedAnswer(question=text, answer=f"answer to {text}")
+
+
+def test_answer_cache_matches_above_threshold_only() -> None:
+    cache = SemanticAnswerCache(maxsize=10, ttl=0, threshold=0.9)
+    cache.add([1.0, 0.0, 0.0], is_german=True, answer=_answer("vpn"))
+
+    assert cache.lookup([2.0, 0.1, 0.0], is_german=True).question == "vpn"  # scale does not matter
+    assert cache.lookup([1.0, 1.0, 0.0], is_german=True) is None  # cosine ~0.71
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_answer_cache_is_partitioned_by_language() -> None:
+    cache = SemanticAnswerCache(maxsize=10, ttl=0, threshold=0.9)
+    cache.add([1.0, 0.0], is_german=True, answer=_answer("de"))
+    assert cache.lookup([1.0, 0.0], is_german=False) is None
+    cache.add([1.0, 0.0], is_german=False, answer=_answer("en"))
+    assert cache.lookup([1.0, 0.0], is_german=False).question == "en"
+    assert cache.lookup([1.0, 0.0], is_german=True).question == "de"
+
+
+def test_answer_cache_is_partitioned_by_index_generation() -> None:
+    cache = SemanticAnswerCache(maxsize=10, ttl=0, threshold=0.9)
+    cache.add([1.0, 0.0], is_german=True, answer=_answer("old"), generation="gen1")
+    assert cache.lookup([1.0, 0.0], is_german=True, generation="gen1").question == "old"
+    assert cache.lookup([1.0, 0.0], is_german=True, generation="gen2") is None
+
+
+def test_answer_cache_entries_expire(monkeypatch) -> None:
+    clock = [100.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+    cache = SemanticAnswerCache(maxsize=10, ttl=60, threshold=0.9)
+    cache.add([1.0, 0.0], is_german=True, answer=_answer("vpn"))
+    clock[0] += 59
+    assert cache.lookup([1.0, 0.0], is_german=True) is not None
+    clock[0] += 2
+    assert cache.lookup([1.0, 0.0], is_german=True) is None
+    assert len(cache) == 0
+
+    scores = TTLCache(maxsize=10, ttl=60, name="test_scores")
+    scores.put("k", 1.0)
+    clock[0] += 61
+    assert scores.get("k") is None and len(scores) == 0
+
+
+def test_answer_cache_evicts_least_recently_used() -> None:
+    cache = SemanticAnswerCache(maxsize=2, ttl=0, threshold=0.99)
+    cache.add([1.0, 0.0, 0.0], is_german=True, answer=_answer("a"))
+    cache.add([0.0, 1.0, 0.0], is_german=True, answer=_answer("b"))
+    assert cache.lookup([1.0, 0.0, 0.0], is_german=True).question == "a"  # "a" is now most recent
+    cache.add([0.0, 0.0, 1.0], is_german=True, answer=_answer("c"))
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0], is_german=True) is None
+    assert cache.lookup([1.0, 0.0, 0.0], is_german=True).question == "a"
+
+
+def test_disabled_answer_cache() -> None:
+    cache = SemanticAnswerCache(maxsize=0, ttl=0, threshold=0.9)
+    cache.add([1.0], is_german=True, answer=_answer("a"))
+    assert not cache.enabled and cache.lookup([1.0], is_german=True) is None
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from llama_index.core.schema import NodeRelationship, NodeWithScore, RelatedNodeInfo, TextNode
+
+from chatbot import engine
+from chatbot.context_packer import (
+    CHAT_TEMPLATE_TOKENS,
+    CONTEXT_SEPARATOR,
+    ContextPacker,
+    TokenCounter,
+    context_budget,
+)
+
+PAGE = (
+    "Das VPN des URZ verbindet Sie mit dem Netz der Universitaet. "
+    "Installieren Sie zuerst den Cisco Secure Client von der Downloadseite. "
+    "Melden Sie sich danach mit Ihrer Uni-ID und dem Passwort an."
+)
+OVERLAP_START = PAGE.index("Installieren")
+FIRST_END = PAGE.index(" Melden")
+
+
+def _node(node_id: str, start: int, end: int, with_offsets: bool = True) -> TextNode:
+    node = TextNode(
+        id_=node_id,
+        text=PAGE[start:end],
+        metadata={"url": "https://www.urz.uni-heidelberg.de/vpn"},
+        start_char_idx=start if with_offsets else None,
+        end_char_idx=end if with_offsets else None,
+    )
+    node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id="vpn-page")
+    return node
+
+
+def _pack(*nodes: TextNode):
+    return ContextPacker(budget=10_000).pack(nodes)
+
+
+def test_overlap_of_adjacent_chunks_is_packed_once() -> None:
+    first, second = _node("a", 0, FIRST_END), _node("b", OVERLAP_START, len(PAGE))
+    packed = _pack(second, first)
+    assert packed.text == CONTEXT_SEPARATOR.join([PAGE[OVERLAP_START:], PAGE[:OVERLAP_START]])
+    assert packed.trimmed_chars == FIRST_END - OVERLAP_START
+    assert packed.nodes == [second, first]
+
+
+def test_overlap_is_found_by_text_without_offsets() -> None:
+    first = _node("a", 0, FIRST_END, with_offsets=False)
+    second = _node("b", OVERLAP_START, len(PAGE), with_offsets=False)
+    packed = _pack(first, second)
+    assert packed.text == CONTEXT_SEPARATOR.join([PAGE[:FIRST_END], PAGE[FIRST_END:]])
+    assert packed.trimmed_chars == FIRST_END - OVERLAP_START
+
+
+def test_chunks_of_other_pages_are_not_trimmed() -> None:
+    first = _node("a", 0, FIRST_END)
+    other = TextNode(id_="c", text=PAGE[OVERLAP_START:], metadata={"url": "https://example.org"})
+    packed = _pack(first, other)
+    assert packed.trimmed_chars == 0
+    assert packed.text.endswith(PAGE[OVERLAP_START:])
+
+
+def test_estimate_counts_token_dense_text() -> None:
+    counter = TokenCounter()
+    url = "https://www.urz.uni-heidelberg.de/de/service-katalog/netzwerk/vpn?id=192.168.0.1"
+    # real tokenizers split URLs and numbers into ~2 characters per token
+    assert counter.count(url) >= len(url) / 2.5
+    # German prose stays near 3.5 characters per token
+    assert len(PAGE) / 4 <= counter.count(PAGE) <= len(PAGE) / 3
+    for limit in (1, 10, 25):
+        cut = counter.truncate(url, limit)
+        assert url.startswith(cut) and counter.count(cut) <= limit
+    assert counter.truncate(url, 1000) == url
+
+
+def test_budget_leaves_room_for_answer_and_prompt(monkeypatch) -> None:
+    monkeypatch.delenv("HEIBOT_CONTEXT_TOKENS", raising=False)
+    assert context_budget(8192, 1024, reserve=100) == 8192 - 1024 - 100 - CHAT_TEMPLATE_TOKENS
+    assert context_budget(1024, 1024, reserve=100) == 256
+
+    monkeypatch.setenv("HEIBOT_CONTEXT_TOKENS", "3000")
+    assert context_budget(8192, 1024, reserve=100) == 3000
+    monkeypatch.setenv("HEIBOT_CONTEXT_TOKENS", "lots")
+    assert context_budget(8192, 1024, reserve=100) == 8192 - 1024 - 100 - CHAT_TEMPLATE_TOKENS
+
+
+def test_default_window_packs_top_three_chunks(monkeypatch) -> None:
+    """2048/512 with estimated tokens fits three chunks at the ingest chunk size."""
+    monkeypatch.delenv("HEIBOT_CONTEXT_TOKENS", raising=False)
+    monkeypatch.delenv("HEIBOT_CONTEXT_TOKENIZER", raising=False)
+    monkeypatch.setattr(engine, "OLLAMA_NUM_CTX", 2048)
+    monkeypatch.setattr(engine, "OLLAMA_NUM_PREDICT", 512)
+    monkeypatch.setattr(engine, "_context_packer", None)
+    # ~256 tokens of prose each, the size of the largest chunks in index_store
+    body = (PAGE + " ") * 5
+    nodes = [
+        NodeWithScore(
+            node=TextNode(
+                id_=f"n{i}",
+                text=f"Schritt {i}: {body}",
+                metadata={
+                    "url": f"https://www.urz.uni-heidelberg.de/de/service-katalog/netzwerk/vpn-{i}",
+                    "title": "VPN einrichten - Universitaetsrechenzentrum Heidelberg",
+                },
+            ),
+            score=1.0 - i / 10,
+        )
+        for i in range(3)
+    ]
+
+    packed = engine._pack_context("Wie richte ich das VPN auf meinem Laptop unter Windows 11 ein?", nodes)
+    assert [n.node_id for n in packed.nodes] == ["n0", "n1", "n2"]
+    assert packed.trimmed_chars == 0
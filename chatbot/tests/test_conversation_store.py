@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+from chatbot.conversation_store import InMemoryConversationStore, RedisConversationStore, create_conversation_store
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def __getattr__(self, name):
+        def op(*args, **kwargs):
+            self.ops.append((name, args))
+        return op
+
+    def execute(self):
+        self.client.threads.append(threading.get_ident())
+        out = []
+        for name, args in self.ops:
+            if name == "rpush":
+                self.client.lists.setdefault(args[0], []).extend(args[1:])
+            elif name == "ltrim":
+                key, start, _ = args
+                self.client.lists[key] = self.client.lists.get(key, [])[start:]
+            out.append(list(self.client.lists.get(args[0], [])) if name == "lrange" else None)
+        return out
+
+
+class _Redis:
+    def __init__(self):
+        self.lists = {}
+        self.threads = []
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+def test_redis_store_calls_redis_off_the_event_loop():
+    store = RedisConversationStore("redis://localhost:6379/0", max_history=2)
+    store.client = _Redis()
+
+    async def turn():
+        await store.aadd_messages("s", [("user", "hallo"), ("assistant", "hi")])
+        await store.aadd_messages("s", [("user", "vpn?"), ("assistant", "siehe")])
+        return threading.get_ident(), await store.aget_conversation_history("s")
+
+    loop_thread, history = asyncio.run(turn())
+    assert [m["content"] for m in history] == ["vpn?", "siehe"]
+    assert store.client.threads and loop_thread not in store.client.threads
+
+
+def test_in_memory_store_async_methods():
+    store = InMemoryConversationStore(max_history=5)
+
+    async def turn():
+        await store.aadd_messages("s", [("user", "hallo"), ("assistant", "hi")])
+        return await store.aget_conversation_history("s")
+
+    assert [m["role"] for m in asyncio.run(turn())] == ["user", "assistant"]
+
+
+def test_malformed_settings_fall_back_to_defaults(monkeypatch) -> None:
+    monkeypatch.delenv("HEIBOT_CONVERSATION_REDIS_URL", raising=False)
+    monkeypatch.setenv("HEIBOT_CONVERSATION_TTL", "30m")
+    monkeypatch.setenv("HEIBOT_MAX_SESSIONS", "lots")
+    store = create_conversation_store()
+    assert isinstance(store, InMemoryConversationStore)
+    assert store.ttl == 1800.0 and store.max_sessions == 10000
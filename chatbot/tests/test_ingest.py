@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+
+from chatbot import ingest
+from chatbot.ingest import BuildCheckpoint, HostGate
+
+
+def _run_gate(gate: HostGate, urls, monkeypatch, hold: float = 0.0):
+    """Fetch ``urls`` through ``gate``; returns ``(start times, peak concurrency per host)``."""
+    starts, active, peak = [], {}, {}
+
+    async def fake_fetch(session, url, exclude_selectors=None):
+        host = url.split("/")[2]
+        loop = asyncio.get_running_loop()
+        starts.append((host, loop.time()))
+        active[host] = active.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), active[host])
+        await asyncio.sleep(hold)
+        active[host] -= 1
+        return url
+
+    monkeypatch.setattr(ingest, "fetch_page", fake_fetch)
+
+    async def main():
+        return await asyncio.gather(*(gate.fetch(None, u) for u in urls))
+
+    assert asyncio.run(main()) == list(urls)
+    return starts, peak
+
+
+def test_host_gate_limits_concurrency_per_host(monkeypatch) -> None:
+    urls = [f"https://a.example/{i}" for i in range(6)] + [f"https://b.example/{i}" for i in range(6)]
+    _, peak = _run_gate(HostGate(per_host=2, delay=0.0), urls, monkeypatch, hold=0.02)
+    assert peak == {"a.example": 2, "b.example": 2}
+
+
+def test_host_gate_spaces_request_starts(monkeypatch) -> None:
+    urls = [f"https://a.example/{i}" for i in range(4)] + ["https://b.example/0"]
+    starts, _ = _run_gate(HostGate(per_host=4, delay=0.03), urls, monkeypatch)
+    a_times = sorted(t for host, t in starts if host == "a.example")
+    gaps = np.diff(a_times)
+    assert len(gaps) == 3 and gaps.min() >= 0.025
+    # other hosts are not delayed by a.example
+    b_time = next(t for host, t in starts if host == "b.example")
+    assert b_time - a_times[0] < 0.025
+
+
+def test_host_gate_releases_slot_when_cancelled_during_delay() -> None:
+    gate = HostGate(per_host=1, delay=10.0)
+
+    async def main():
+        await gate._acquire("a.example")  # first request: no delay, holds the only slot
+        gate._sems["a.example"].release()
+        waiter = asyncio.ensure_future(gate._acquire("a.example"))  # sleeps ~10 s holding the slot
+        await asyncio.sleep(0.01)
+        assert gate._sems["a.example"].locked()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return gate._sems["a.example"].locked()
+
+    assert asyncio.run(main()) is False
+
+
+def test_failed_fetch_cancels_the_consumer(tmp_path, monkeypatch) -> None:
+    async def broken_fetch(session, url, exclude_selectors=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(ingest, "fetch_page", broken_fetch)
+
+    async def main():
+        with pytest.raises(RuntimeError, match="boom"):
+            await ingest.build_index_from_urls(
+                ["https://x/a", "https://x/b"], persist_dir=str(tmp_path), concurrency=2, host_delay=0.0
+            )
+        await asyncio.sleep(0.01)
+        return [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+
+    # the consumer waits for pages that will never come; it must not be left pending
+    assert asyncio.run(main()) == []
+
+
+def _node(url: str, i: int) -> TextNode:
+    return TextNode(id_=f"{url}#{i}", text=f"chunk {i}", metadata={"url": url})
+
+
+def test_checkpoint_round_trip_filters_to_wanted_pages(tmp_path) -> None:
+    checkpoint = BuildCheckpoint(str(tmp_path))
+    pages = {"https://x/a": {"sha256": "1"}, "https://x/b": {"sha256": "2"}}
+    nodes = [_node("https://x/a", 0), _node("https://x/a", 1), _node("https://x/b", 0)]
+    checkpoint.write(pages, nodes, np.arange(6, dtype="float32").reshape(3, 2))
+    checkpoint.write({"https://x/c": {"sha256": "3"}}, [_node("https://x/c", 0)], np.ones((1, 2), dtype="float32"))
+
+    done, loaded, blocks = checkpoint.load({"https://x/a", "https://x/c"})
+    assert done == {"https://x/a": {"sha256": "1"}, "https://x/c": {"sha256": "3"}}
+    assert [n.node_id for n in loaded] == ["https://x/a#0", "https://x/a#1", "https://x/c#0"]
+    np.testing.assert_array_equal(np.vstack(blocks), [[0, 1], [2, 3], [1, 1]])
+
+    checkpoint.clear()
+    assert checkpoint.load({"https://x/a"}) == ({}, [], [])
+
+
+def test_checkpoint_skips_parts_of_another_model_or_unreadable(tmp_path, monkeypatch) -> None:
+    checkpoint = BuildCheckpoint(str(tmp_path))
+    monkeypatch.setattr(ingest, "EMBED_MODEL_NAME", "old-model")
+    checkpoint.write({"https://x/a": {}}, [_node("https://x/a", 0)], np.zeros((1, 2), dtype="float32"))
+    monkeypatch.undo()
+    checkpoint.write({"https://x/b": {}}, [_node("https://x/b", 0)], np.zeros((1, 2), dtype="float32"))
+    (tmp_path / "build_checkpoint" / "part-00002.pkl").write_bytes(b"truncated")
+
+    done, loaded, _ = checkpoint.load({"https://x/a", "https://x/b"})
+    assert set(done) == {"https://x/b"}
+    assert [n.node_id for n in loaded] == ["https://x/b#0"]
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from chatbot.keyword_index import AUX_INDEX_DIRNAME, BM25Index, load_aux_indexes, save_aux_indexes
+
+
+def _data_files(path) -> set[str]:
+    return {f for f in os.listdir(path) if f != "meta.json"}
+
+
+def test_rewrite_publishes_new_generation_and_keeps_previous(tmp_path) -> None:
+    index_dir = tmp_path / AUX_INDEX_DIRNAME
+    save_aux_indexes(str(tmp_path), "fp1", BM25Index.build(["alpha beta", "gamma"]), {"https://x/0": [0]})
+    first = _data_files(index_dir)
+    old_index, old_urls = load_aux_indexes(str(tmp_path), "fp1")
+
+    save_aux_indexes(str(tmp_path), "fp2", BM25Index.build(["delta"]), {"https://x/1": [0]})
+    assert first < _data_files(index_dir)  # readers of the old meta.json can still open it
+    assert old_index.search(["alpha"])[0][0] == 0
+    assert old_urls == {"https://x/0": [0]}
+
+    assert load_aux_indexes(str(tmp_path), "fp1") is None
+    index, urls = load_aux_indexes(str(tmp_path), "fp2")
+    assert index.search(["delta"])[0][0] == 0
+    assert urls == {"https://x/1": [0]}
+
+    save_aux_indexes(str(tmp_path), "fp3", BM25Index.build(["epsilon"]), {})
+    assert not first & _data_files(index_dir)  # two generations back is removed
+
+
+def test_meta_only_references_complete_generation(tmp_path) -> None:
+    save_aux_indexes(str(tmp_path), "fp", BM25Index.build(["alpha"]), {})
+    index_dir = tmp_path / AUX_INDEX_DIRNAME
+    meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+    assert set(meta["files"].values()) == _data_files(index_dir)
+
+    os.remove(index_dir / meta["files"]["idf"])
+    assert load_aux_indexes(str(tmp_path), "fp") is None
+
+
+def test_unversioned_layout_is_rebuilt_and_removed(tmp_path) -> None:
+    index_dir = tmp_path / AUX_INDEX_DIRNAME
+    index_dir.mkdir()
+    np.save(index_dir / "idf.npy", np.zeros(1))
+    (index_dir / "meta.json").write_text(json.dumps({"version": 1, "fingerprint": "fp"}), encoding="utf-8")
+    assert load_aux_indexes(str(tmp_path), "fp") is None
+
+    save_aux_indexes(str(tmp_path), "fp", BM25Index.build(["alpha"]), {})
+    assert not (index_dir / "idf.npy").exists()
+    assert load_aux_indexes(str(tmp_path), "fp") is not None
+
+
+def test_bm25_ranks_by_term_frequency_and_length() -> None:
+    index = BM25Index.build([
+        "alpha alpha alpha beta",
+        "alpha beta gamma delta epsilon zeta",
+        "gamma delta",
+        "",
+    ])
+    hits = index.search(["alpha"])
+    assert [doc for doc, _ in hits] == [0, 1]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.search(["missing"]) == []
+    assert index.search(["alpha"], top_n=0) == []
+
+
+def test_bm25_sums_scores_over_query_terms_and_respects_top_n() -> None:
+    texts = [f"common filler{i}" for i in range(20)] + ["common rare"]
+    index = BM25Index.build(texts)
+    hits = index.search(["common", "rare", "common"], top_n=3)
+    assert len(hits) == 3
+    assert hits[0][0] == 20
+    single = dict(index.search(["common"], top_n=len(texts)))
+    assert hits[0][1] > single[20]
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+
+def test_bm25_matches_dense_reference_scores() -> None:
+    texts = ["red apple fruit", "green apple", "apple apple pie recipe", "banana fruit"]
+    index = BM25Index.build(texts)
+    query = ["apple", "fruit"]
+    avgdl = float(index.doc_lens.mean())
+    expected = {}
+    for doc, text in enumerate(texts):
+        toks = text.split()
+        score = 0.0
+        for term in query:
+            tf = toks.count(term)
+            if not tf:
+                continue
+            idf = float(index.idf[index.vocab[term]])
+            norm = index.k1 * (1 - index.b + index.b * len(toks) / avgdl)
+            score += idf * tf * (index.k1 + 1) / (tf + norm)
+        if score:
+            expected[doc] = score
+    got = dict(index.search(query, top_n=10))
+    assert got.keys() == expected.keys()
+    for doc, score in expected.items():
+        assert abs(got[doc] - score) < 1e-5
+
+
+def test_loaded_vocab_and_urls_are_mmapped_string_tables(tmp_path) -> None:
+    url_map = {"https://x/ü": [2, 0], "https://x/a": [1], "https://x/empty": []}
+    save_aux_indexes(str(tmp_path), "fp", BM25Index.build(["alpha beta", "gamma", "größe alpha"]), url_map)
+    meta = json.loads((tmp_path / AUX_INDEX_DIRNAME / "meta.json").read_text(encoding="utf-8"))
+    assert "terms" not in meta and "urls" not in meta
+    assert (meta["num_terms"], meta["num_urls"]) == (4, 3)
+
+    index, urls = load_aux_indexes(str(tmp_path), "fp")
+    assert isinstance(index.vocab.values, np.memmap)
+    assert dict(urls) == url_map
+    assert urls.get("https://x/missing", []) == []
+    assert "https://x/a" in urls and "https://x" not in urls
+    assert {doc for doc, _ in index.search(["alpha"])} == {0, 2}
+    assert index.search(["größe"])[0][0] == 2
+    assert index.vocab.get("missing") is None
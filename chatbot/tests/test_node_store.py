@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import os
+
+import faiss
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+
+from chatbot.node_store import (
+    NODE_STORE_DIRNAME,
+    NodeStore,
+    current_generation,
+    publish_index,
+    write_node_store,
+)
+
+
+def _nodes(*texts: str) -> list[TextNode]:
+    return [TextNode(id_=f"n{i}", text=t, metadata={"url": f"https://x/{i}"}) for i, t in enumerate(texts)]
+
+
+def _data_files(path: str) -> set[str]:
+    return {f for f in os.listdir(path) if f != "meta.json"}
+
+
+def test_rewrite_publishes_new_generation_and_keeps_previous(tmp_path) -> None:
+    store_dir = tmp_path / NODE_STORE_DIRNAME
+    write_node_store(str(tmp_path), _nodes("alpha", "beta"))
+    first = _data_files(store_dir)
+    old = NodeStore.open(str(tmp_path))
+
+    write_node_store(str(tmp_path), _nodes("gamma"))
+    second = _data_files(store_dir) - first
+    assert first < _data_files(store_dir)  # readers of the old meta.json can still open it
+    assert old.text(1) == "beta"
+    store = NodeStore.open(str(tmp_path))
+    assert len(store) == 1 and store.text(0) == "gamma"
+
+    write_node_store(str(tmp_path), _nodes("delta"))
+    assert not first & _data_files(store_dir)
+    assert second <= _data_files(store_dir)
+
+
+def test_store_without_generation_files_is_rejected(tmp_path) -> None:
+    write_node_store(str(tmp_path), _nodes("alpha"))
+    store_dir = tmp_path / NODE_STORE_DIRNAME
+    meta = json.loads((store_dir / "meta.json").read_text())
+    os.rename(store_dir / meta.pop("text_file"), store_dir / "text.bin")
+    (store_dir / "meta.json").write_text(json.dumps(meta))
+    assert NodeStore.open(str(tmp_path)) is None
+
+
+def test_index_and_vectors_belong_to_the_store_generation(tmp_path) -> None:
+    vectors = np.eye(2, 4, dtype="float32")
+    index = faiss.IndexFlatL2(4)
+    index.add(vectors)
+    fingerprint = write_node_store(str(tmp_path), _nodes("alpha", "beta"), vectors=vectors, index=index)
+    store = NodeStore.open(str(tmp_path))
+    assert store.read_index().ntotal == 2
+    assert np.asarray(store.load_vectors()).tolist() == vectors.tolist()
+
+    # a new index for the same rows is published through meta.json
+    other = faiss.IndexFlatL2(4)
+    other.add(vectors)
+    publish_index(str(tmp_path), other, fingerprint)
+    assert NodeStore.open(str(tmp_path)).read_index().ntotal == 2
+
+    # the store was rewritten without an index: nothing stale is paired with it
+    write_node_store(str(tmp_path), _nodes("gamma"))
+    store = NodeStore.open(str(tmp_path))
+    assert store.read_index() is None and store.load_vectors() is None
+    with pytest.raises(RuntimeError):
+        publish_index(str(tmp_path), other, fingerprint)
+
+
+def test_top_level_vectors_are_not_read(tmp_path) -> None:
+    write_node_store(str(tmp_path), _nodes("alpha", "beta"))
+    np.save(tmp_path / "vectors.npy", np.zeros((2, 4), dtype="float32"))
+    assert NodeStore.open(str(tmp_path)).load_vectors() is None
+
+
+def test_columns_are_mmapped_and_round_trip(tmp_path) -> None:
+    from llama_index.core.schema import NodeRelationship, RelatedNodeInfo
+
+    first = TextNode(
+        id_="a",
+        text="größe",
+        metadata={"url": "https://x/a", "page": 3, "tags": ["x", "y"]},
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id="doc-1")},
+        start_char_idx=0,
+        end_char_idx=5,
+        excluded_embed_metadata_keys=["url"],
+        excluded_llm_metadata_keys=["page", "tags"],
+    )
+    second = TextNode(id_="b", text="", metadata={"source": "https://x/b"})
+    write_node_store(str(tmp_path), [first, second])
+
+    meta = json.loads((tmp_path / NODE_STORE_DIRNAME / "meta.json").read_text(encoding="utf-8"))
+    assert "doc-1" not in json.dumps(meta) and "https://x/a" not in json.dumps(meta)
+
+    store = NodeStore.open(str(tmp_path))
+    assert isinstance(store._spans, np.memmap)
+    a, b = store.node(0), store.node(1)
+    assert (a.node_id, a.text, a.ref_doc_id) == ("a", "größe", "doc-1")
+    assert a.metadata == {"url": "https://x/a", "page": 3, "tags": ["x", "y"]}
+    assert (a.start_char_idx, a.end_char_idx) == (0, 5)
+    assert a.excluded_embed_metadata_keys == ["url"]
+    assert a.excluded_llm_metadata_keys == ["page", "tags"]
+    assert (b.node_id, b.text, b.ref_doc_id, b.metadata) == ("b", "", None, {"source": "https://x/b"})
+    assert (b.start_char_idx, b.end_char_idx) == (None, None)
+    assert [store.url(0), store.url(1)] == ["https://x/a", "https://x/b"]
+
+
+def test_truncated_column_is_rejected(tmp_path) -> None:
+    write_node_store(str(tmp_path), _nodes("alpha", "beta"))
+    store_dir = tmp_path / NODE_STORE_DIRNAME
+    meta = json.loads((store_dir / "meta.json").read_text(encoding="utf-8"))
+    np.save(store_dir / meta["columns"]["node_id"]["offsets"], np.zeros(2, dtype=np.int64))
+    assert NodeStore.open(str(tmp_path)) is None
+
+
+def test_current_generation_follows_published_meta(tmp_path) -> None:
+    assert current_generation(str(tmp_path)) is None
+    vectors = np.eye(2, 4, dtype="float32")
+    index = faiss.IndexFlatL2(4)
+    index.add(vectors)
+    fingerprint = write_node_store(str(tmp_path), _nodes("alpha", "beta"), vectors=vectors, index=index)
+    first = current_generation(str(tmp_path))
+    assert first and current_generation(str(tmp_path)) == first
+
+    publish_index(str(tmp_path), index, fingerprint)
+    second = current_generation(str(tmp_path))
+    assert second not in (None, first)
+
+    write_node_store(str(tmp_path), _nodes("gamma"))
+    assert current_generation(str(tmp_path)) not in (first, second)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from chatbot import engine, onnx_backend
+
+
+class _FakeTokenizer:
+    """Whitespace tokenizer returning padded numpy batches like a HF tokenizer."""
+
+    def __call__(self, texts, pairs=None, padding=True, truncation=True, max_length=None, return_tensors="np"):
+        if pairs is not None:
+            texts = [f"{q} {p}" for q, p in zip(texts, pairs)]
+        lengths = [min(len(t.split()), max_length or 10**6) for t in texts]
+        width = max(lengths)
+        mask = np.array([[1] * n + [0] * (width - n) for n in lengths], dtype=np.int64)
+        return {"input_ids": mask.copy(), "attention_mask": mask}
+
+
+class _FakeSession:
+    def __init__(self, outputs):
+        self.tokenizer = _FakeTokenizer()
+        self.outputs = outputs
+        self.batches = []
+
+    def run(self, encoded):
+        self.batches.append(len(encoded["attention_mask"]))
+        return self.outputs(encoded)
+
+
+@pytest.fixture
+def fake_sessions(monkeypatch):
+    monkeypatch.setattr(onnx_backend, "export_model", lambda name, kind, force=False: f"/models/{kind}")
+
+    def make_session(model_dir):
+        if model_dir.endswith("rerank"):
+            # one logit per pair: the number of tokens minus 3
+            return _FakeSession(lambda enc: enc["attention_mask"].sum(axis=1, keepdims=True).astype(np.float32) - 3)
+        # hidden state: token position on dim 0, 1 on dim 1, padding rows are garbage
+        def hidden(enc):
+            batch, seq = enc["attention_mask"].shape
+            out = np.full((batch, seq, 2), 100.0, dtype=np.float32)
+            out[..., 0] = np.arange(seq)
+            out[..., 1] = 1.0
+            return np.where(enc["attention_mask"][..., None] == 1, out, 100.0)
+        return _FakeSession(hidden)
+
+    monkeypatch.setattr(onnx_backend, "_OnnxSession", make_session)
+
+
+def test_cross_encoder_batches_and_applies_sigmoid(fake_sessions) -> None:
+    ce = onnx_backend.OnnxCrossEncoder("reranker")
+    pairs = [("a", "b c"), ("a", "b"), ("a b", "c d e f")]
+    scores = ce.predict(pairs, batch_size=2)
+    expected = 1.0 / (1.0 + np.exp(-np.array([0.0, -1.0, 3.0])))
+    np.testing.assert_allclose(scores, expected, rtol=1e-6)
+    assert ce._onnx.batches == [2, 1]
+    assert ce.predict([]).shape == (0,)
+
+
+def test_embedding_mean_pools_over_the_mask_and_normalizes(fake_sessions) -> None:
+    emb = onnx_backend.OnnxEmbedding("embedder")
+    short, longer = emb.get_text_embedding_batch(["one", "one two three"])
+    # padding rows (value 100) must not leak into the mean
+    np.testing.assert_allclose(short, [0.0, 1.0], atol=1e-6)
+    np.testing.assert_allclose(longer, np.array([1.0, 1.0]) / np.sqrt(2), atol=1e-6)
+    assert emb.get_query_embedding("one two three") == pytest.approx(longer)
+
+
+def test_malformed_thread_count_keeps_the_runtime_default(monkeypatch) -> None:
+    created = {}
+
+    class FakeOrt:
+        class GraphOptimizationLevel:
+            ORT_ENABLE_ALL = "all"
+
+        class SessionOptions:
+            intra_op_num_threads = 0
+
+        class InferenceSession:
+            def __init__(self, path, opts, providers):
+                created["threads"] = opts.intra_op_num_threads
+
+            def get_inputs(self):
+                return []
+
+    import transformers
+
+    monkeypatch.setattr(onnx_backend, "_require_onnxruntime", lambda: FakeOrt)
+    monkeypatch.setattr(transformers.AutoTokenizer, "from_pretrained", lambda path: _FakeTokenizer())
+    monkeypatch.setenv("ONNX_NUM_THREADS", "four")
+    onnx_backend._OnnxSession("/models/embed")
+    assert created["threads"] == 0
+    monkeypatch.setenv("ONNX_NUM_THREADS", "2")
+    onnx_backend._OnnxSession("/models/embed")
+    assert created["threads"] == 2
+
+
+@pytest.fixture
+def onnx_backend_selected(monkeypatch):
+    monkeypatch.setattr(engine, "INFERENCE_BACKEND", "onnx")
+    monkeypatch.setattr(engine, "_embed_model", None)
+    monkeypatch.setattr(engine, "_rerank_model", None)
+    monkeypatch.setattr(engine, "_load_torch_embedding", lambda: "torch-embedder")
+    monkeypatch.setattr(engine, "_load_torch_cross_encoder", lambda: "torch-reranker")
+
+
+def test_onnx_backend_is_used_when_available(onnx_backend_selected, fake_sessions) -> None:
+    assert isinstance(engine.get_rerank_model(), onnx_backend.OnnxCrossEncoder)
+
+
+def test_missing_onnxruntime_falls_back_to_torch(onnx_backend_selected, monkeypatch, tmp_path) -> None:
+    def missing():
+        raise RuntimeError("HEIBOT_INFERENCE_BACKEND=onnx needs the onnxruntime and onnx packages")
+
+    monkeypatch.setattr(onnx_backend, "_require_onnxruntime", missing)
+    monkeypatch.setattr(onnx_backend, "ONNX_MODEL_DIR", str(tmp_path))  # nothing exported yet
+    assert engine.get_rerank_model() == "torch-reranker"
+    assert engine._load_onnx("OnnxEmbedding", "embedder") is None
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from chatbot.packed_strings import StringArray, StringTable, pack_strings
+
+
+def test_string_array_round_trips_through_npy(tmp_path) -> None:
+    strings = ["alpha", "", "größe", "日本"]
+    blob, offsets = pack_strings(strings)
+    np.save(tmp_path / "blob.npy", blob)
+    np.save(tmp_path / "offsets.npy", offsets)
+    column = StringArray(np.load(tmp_path / "blob.npy", mmap_mode="r"), np.load(tmp_path / "offsets.npy", mmap_mode="r"))
+    assert list(column) == strings
+    assert column[-1] == "日本"
+    with pytest.raises(IndexError):
+        column[4]
+
+
+def test_string_table_binary_search() -> None:
+    mapping = {f"term{i}": i * 7 for i in range(500)}
+    mapping.update({"": -1, "Zebra": 3, "zebra": 4, "äpfel": 5})
+    table = StringTable.from_dict(mapping)
+    assert len(table) == len(mapping)
+    assert dict(table) == mapping
+    assert table["term499"] == 3493
+    assert table[""] == -1
+    assert "term500" not in table and 1 not in table
+    assert table.get("Zebr") is None
+    with pytest.raises(KeyError):
+        table["missing"]
+
+
+def test_empty_string_table() -> None:
+    table = StringTable.from_dict({})
+    assert len(table) == 0
+    assert "x" not in table
+    assert list(table) == []
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+
+from chatbot.query_router import CHITCHAT, META, RAG, QueryRouter
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Who are you?",
+        "Wer bist du eigentlich?",
+        "Hallo, was kannst du?",
+        "What can you do for me?",
+        "Which language model are you based on?",
+        "Bist du ein Mensch?",
+    ],
+)
+def test_meta_turns_are_routed(message: str) -> None:
+    assert QueryRouter().route(message) == META
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Was kannst du mir zum VPN sagen?",
+        "What can you do if eduroam fails?",
+        "Which model of laptop can I borrow?",
+        "Who are you supposed to contact when the printer is broken?",
+        "Wie funktionierst du die Zwei-Faktor-Authentifizierung ein?",
+    ],
+)
+def test_content_questions_are_not_routed_as_meta(message: str) -> None:
+    assert QueryRouter().route(message) == RAG
+
+
+def test_chitchat_and_word_caps() -> None:
+    router = QueryRouter()
+    assert router.route("Danke schön!") == CHITCHAT
+    assert router.route("Hallo, ich brauche Hilfe beim WLAN") == RAG
+
+
+def test_prototype_check_skips_long_messages() -> None:
+    router = QueryRouter(embed_batch=lambda texts: [[1.0, 0.0]] * len(texts), threshold=0.5)
+    assert router.route("Erzähl mir was über dich", embedding=[1.0, 0.0]) == META
+    long_question = "Can you tell me how the library loan period works for students in their first term?"
+    assert router.route(long_question, embedding=[1.0, 0.0]) == RAG
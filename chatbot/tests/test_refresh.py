@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import asyncio
+
+import numpy as np
+import pytest
+from llama_index.core import Document
+
+from chatbot import ingest, refresh
+from chatbot.engine import FetchedPage
+from chatbot.node_store import NodeStore
+from chatbot.refresh import async_refresh_index, load_manifest
+
+DIM = 4
+ABOUT = " ".join(f"Satz {i} über das Rechenzentrum und seine Dienste." for i in range(40))
+PRINTERS = " ".join(f"Neuer Abschnitt {i} zu Druckern und Netzwerken." for i in range(40))
+
+
+class FakeSite:
+    """Pages by url as ``(text, etag)``; answers conditional requests like a server."""
+
+    def __init__(self, pages):
+        self.pages = dict(pages)
+        self.requests = []
+
+    async def fetch_page(self, session, url, exclude_selectors=None, etag=None, last_modified=None):
+        self.requests.append((url, etag))
+        if url not in self.pages:
+            return FetchedPage(url, 404)
+        text, current = self.pages[url]
+        if etag and etag == current:
+            return FetchedPage(url, 304, etag=etag, last_modified=last_modified)
+        return FetchedPage(url, 200, Document(text=text, metadata={"url": url}), etag=current, last_modified="Mon")
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, nodes, show_progress=True):
+        self.embedded += len(nodes)
+        return np.asarray([[len(n.text), 1.0, 0.0, 0.0] for n in nodes], dtype="float32").reshape(-1, DIM)
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    site = FakeSite({
+        "https://x/a": ("Seite A über E-Mail.", "a1"),
+        "https://x/b": ("Seite B über VPN.", "b1"),
+        "https://x/c": (ABOUT, "c1"),
+        "https://x/d": ("Seite D über WLAN.", "d1"),
+    })
+    embedder = FakeEmbedder()
+    for module in (ingest, refresh):
+        monkeypatch.setattr(module, "fetch_page", site.fetch_page)
+        monkeypatch.setattr(module, "embed_nodes", embedder)
+    entries = {"https://x/a": "2026-01-01", "https://x/b": None, "https://x/c": "2026-01-01", "https://x/d": None}
+    asyncio.run(ingest.build_index_from_urls(entries, str(tmp_path), host_delay=0.0))
+    site.requests.clear()
+    embedder.embedded = 0
+    site.embedder = embedder
+    return site
+
+
+def test_full_build_writes_the_manifest(tmp_path, site) -> None:
+    manifest = load_manifest(str(tmp_path))
+    assert set(manifest) == {"https://x/a", "https://x/b", "https://x/c", "https://x/d"}
+    assert manifest["https://x/a"]["lastmod"] == "2026-01-01"
+    assert manifest["https://x/b"]["etag"] == "b1"
+    assert manifest["https://x/b"]["last_modified"] == "Mon"
+    assert manifest["https://x/d"]["sha256"] == refresh.content_hash("Seite D über WLAN.")
+
+
+def test_unchanged_pages_are_not_refetched_or_reembedded(tmp_path, site) -> None:
+    entries = {"https://x/a": "2026-01-01", "https://x/b": None, "https://x/c": "2026-01-01", "https://x/d": None}
+    stats = asyncio.run(async_refresh_index(entries, str(tmp_path)))
+
+    assert stats["unchanged"] == 4 and stats["changed"] == stats["removed"] == stats["embedded"] == 0
+    # same lastmod: no request; no lastmod: conditional request answered with 304
+    assert sorted(site.requests) == [("https://x/b", "b1"), ("https://x/d", "d1")]
+    assert site.embedder.embedded == 0
+
+
+def test_changed_hash_reembeds_only_new_chunks_and_removed_pages_are_dropped(tmp_path, site) -> None:
+    before = NodeStore.open(str(tmp_path))
+    old_c_rows = [i for i in range(len(before)) if before.url(i) == "https://x/c"]
+    site.pages["https://x/c"] = (ABOUT + " " + PRINTERS, "c2")
+    # new etag but the same text: hash matches, the rows are kept
+    site.pages["https://x/a"] = ("Seite A über E-Mail.", "a2")
+    entries = {"https://x/a": "2026-02-01", "https://x/b": None, "https://x/c": "2026-02-01"}
+
+    stats = asyncio.run(async_refresh_index(entries, str(tmp_path)))
+
+    assert (stats["unchanged"], stats["changed"], stats["removed"]) == (2, 1, 1)
+    assert stats["reused"] > 0 and stats["embedded"] > 0
+    assert site.embedder.embedded == stats["embedded"]
+
+    store = NodeStore.open(str(tmp_path))
+    urls = [store.url(i) for i in range(len(store))]
+    assert "https://x/d" not in urls
+    assert urls.count("https://x/c") > len(old_c_rows)
+    vectors = store.load_vectors()
+    old_vectors = {before.text(i): np.asarray(before.load_vectors()[i]) for i in old_c_rows}
+    for i, url in enumerate(urls):
+        if url == "https://x/c" and store.text(i) in old_vectors:
+            np.testing.assert_array_equal(vectors[i], old_vectors[store.text(i)])
+
+    manifest = load_manifest(str(tmp_path))
+    assert set(manifest) == {"https://x/a", "https://x/b", "https://x/c"}
+    assert manifest["https://x/a"]["etag"] == "a2"
+    assert manifest["https://x/c"]["sha256"] == refresh.content_hash(ABOUT + " " + PRINTERS)
+
+
+def test_pages_gone_upstream_are_removed(tmp_path, site) -> None:
+    del site.pages["https://x/b"]
+    entries = {"https://x/a": "2026-01-01", "https://x/b": None, "https://x/c": "2026-01-01", "https://x/d": None}
+    stats = asyncio.run(async_refresh_index(entries, str(tmp_path)))
+
+    assert stats["removed"] == 1
+    store = NodeStore.open(str(tmp_path))
+    assert "https://x/b" not in {store.url(i) for i in range(len(store))}
+    assert "https://x/b" not in load_manifest(str(tmp_path))
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from chatbot.rerank_service import RerankPolicy
+
+
+def test_margin_uses_vector_scores_not_rrf_scale() -> None:
+    policy = RerankPolicy()
+    # a node topping the vector and BM25 lists leads the fused list by ~50% in RRF
+    # terms; its vector score is close to the runner-up's, so the reranker runs
+    assert policy.skip_reason([0.71, 0.68, None, 0.64, 0.6], top_k=3) is None
+    assert policy.skip_reason([0.9, 0.6, None, 0.55, 0.5], top_k=3) == "margin"
+    # the fused winner came from keywords only: no vector evidence to skip on
+    assert policy.skip_reason([None, 0.9, 0.5, 0.4], top_k=3) is None
+    assert policy.skip_reason([0.5, 0.4], top_k=3) == "few_candidates"
+
+
+def test_early_exit_is_opt_in() -> None:
+    policy = RerankPolicy()
+    assert not policy.can_stop([0.99, 0.98, None], top_k=2)
+    assert policy.chunks(20, top_k=3) == [range(20)]
+
+
+def test_early_exit_needs_top_k_confident_scores() -> None:
+    policy = RerankPolicy(early_exit_score=0.9)
+    assert not policy.can_stop([0.95, 0.2, None], top_k=2)
+    assert policy.can_stop([0.95, 0.92, None], top_k=2)
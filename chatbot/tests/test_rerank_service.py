@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from chatbot.rerank_service import RerankBatcher
+
+
+class _Model:
+    """Scores a pair by its passage length; the first batch waits for ``release``."""
+
+    def __init__(self) -> None:
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.fail_next = False
+
+    def predict(self, pairs, batch_size=16):
+        self.started.set()
+        self.release.wait(5)
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError("boom")
+        return [float(len(passage)) for _, passage in pairs]
+
+
+def test_cancelled_request_does_not_stop_the_worker() -> None:
+    model = _Model()
+    batcher = RerankBatcher(model, window_ms=0)
+    first = batcher.submit([("q", "a")])
+    assert model.started.wait(5)
+
+    async def give_up() -> None:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(batcher.ascore([("q", "abc")]), timeout=0.01)
+
+    asyncio.run(give_up())
+    model.release.set()
+    assert first.result(timeout=5) == [1.0]
+    assert batcher.score([("q", "abcd")]) == [4.0]
+    assert batcher.requests_served == 2
+
+
+def test_failed_batch_does_not_stop_the_worker() -> None:
+    model = _Model()
+    model.release.set()
+    model.fail_next = True
+    batcher = RerankBatcher(model, window_ms=0)
+    with pytest.raises(RuntimeError):
+        batcher.score([("q", "a")])
+    assert batcher.score([("q", "ab")]) == [2.0]
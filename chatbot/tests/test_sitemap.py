@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+
+import aiohttp
+import pytest
+
+from chatbot import sitemap
+from chatbot.sitemap import SitemapLoader, SitemapParser, load_cache
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def _urlset(*pages):
+    body = "".join(f"<url><loc>{loc}</loc>{f'<lastmod>{lm}</lastmod>' if lm else ''}</url>" for loc, lm in pages)
+    return f'<?xml version="1.0"?><urlset {NS}>{body}</urlset>'.encode()
+
+
+def _index(*children):
+    body = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in children)
+    return f'<?xml version="1.0"?><sitemapindex {NS}>{body}</sitemapindex>'.encode()
+
+
+class _Content:
+    def __init__(self, body: bytes):
+        self._body = body
+
+    async def iter_chunked(self, size):
+        for i in range(0, len(self._body), 7):  # tiny chunks exercise the incremental parser
+            yield self._body[i:i + 7]
+
+
+class _Response:
+    def __init__(self, url, status, body=b"", headers=None):
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self.content = _Content(body)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientError(f"HTTP {self.status} for {self.url}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeServer:
+    """Serves sitemaps by url as ``(body, etag, last_modified)`` and answers conditional requests."""
+
+    def __init__(self, docs):
+        self.docs = dict(docs)
+        self.requests = []
+
+    def session(self):
+        server = self
+
+        class _Session:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def get(self, url, headers=None, timeout=None):
+                headers = headers or {}
+                server.requests.append((url, headers))
+                if url not in server.docs:
+                    return _Response(url, 404)
+                body, etag, last_modified = server.docs[url]
+                if (etag and headers.get("If-None-Match") == etag) or (
+                    last_modified and headers.get("If-Modified-Since") == last_modified
+                ):
+                    return _Response(url, 304)
+                validators = {k: v for k, v in (("ETag", etag), ("Last-Modified", last_modified)) if v}
+                return _Response(url, 200, body, validators)
+
+        return _Session()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer({
+        "https://x/sitemap.xml": (_index("https://x/a.xml", "https://x/b.xml.gz"), '"root1"', None),
+        "https://x/a.xml": (_urlset(("https://x/1", "2026-01-01"), ("https://x/2", None)), '"a1"', None),
+        "https://x/b.xml.gz": (gzip.compress(_index("https://x/c.xml")), None, "Mon, 01 Jun 2026 00:00:00 GMT"),
+        "https://x/c.xml": (_urlset(("https://x/3", "2026-02-01"), ("https://x/1", "1999-01-01")), None, None),
+    })
+    monkeypatch.setattr(sitemap.aiohttp, "ClientSession", server.session)
+    return server
+
+
+def _load(loader, url="https://x/sitemap.xml"):
+    return asyncio.run(loader.load(url))
+
+
+def test_parser_reads_urlset_and_index_in_chunks() -> None:
+    parser = SitemapParser()
+    doc = _urlset(("https://x/1", "2026-01-01"), ("https://x/2", None))
+    for i in range(0, len(doc), 5):
+        parser.feed(doc[i:i + 5])
+    parser.close()
+    assert parser.urls == {"https://x/1": "2026-01-01", "https://x/2": None}
+
+    parser = SitemapParser(gzipped=True)
+    parser.feed(gzip.compress(_index("https://x/a.xml", "https://x/b.xml")))
+    parser.close()
+    assert parser.children == ["https://x/a.xml", "https://x/b.xml"] and parser.urls == {}
+
+
+def test_index_is_followed_recursively_including_gzipped_children(tmp_path, server) -> None:
+    loader = SitemapLoader(str(tmp_path / "cache.json"))
+    entries = _load(loader)
+
+    # the first sitemap listing a page wins its lastmod
+    assert entries == {"https://x/1": "2026-01-01", "https://x/2": None, "https://x/3": "2026-02-01"}
+    assert sorted(url for url, _ in server.requests) == sorted(server.docs)
+    assert loader.stats["parsed"] == 4
+    assert set(load_cache(str(tmp_path / "cache.json"))) == set(server.docs)
+
+
+def test_max_depth_stops_recursion(tmp_path, server) -> None:
+    entries = _load(SitemapLoader(str(tmp_path / "cache.json"), max_depth=1))
+    assert entries == {"https://x/1": "2026-01-01", "https://x/2": None}
+    assert "https://x/c.xml" not in {url for url, _ in server.requests}
+
+
+def test_unchanged_sitemaps_are_revalidated_with_their_validators(tmp_path, server) -> None:
+    cache_path = str(tmp_path / "cache.json")
+    first = _load(SitemapLoader(cache_path))
+    cached = load_cache(cache_path)
+    assert cached["https://x/sitemap.xml"]["etag"] == '"root1"'
+    assert cached["https://x/b.xml.gz"]["last_modified"] == "Mon, 01 Jun 2026 00:00:00 GMT"
+    server.requests.clear()
+
+    loader = SitemapLoader(cache_path)
+    assert _load(loader) == first
+    headers = dict(server.requests)
+    assert headers["https://x/sitemap.xml"] == {"If-None-Match": '"root1"'}
+    assert headers["https://x/b.xml.gz"] == {"If-Modified-Since": "Mon, 01 Jun 2026 00:00:00 GMT"}
+    assert headers["https://x/c.xml"] == {}  # no validators: fetched and parsed again
+    assert loader.stats == {"cached": 0, "not_modified": 3, "parsed": 1, "failed": 0}
+
+
+def test_changed_sitemap_is_reparsed(tmp_path, server) -> None:
+    cache_path = str(tmp_path / "cache.json")
+    _load(SitemapLoader(cache_path))
+    server.docs["https://x/a.xml"] = (_urlset(("https://x/4", None)), '"a2"', None)
+
+    loader = SitemapLoader(cache_path)
+    entries = _load(loader)
+    assert "https://x/4" in entries and "https://x/2" not in entries
+    assert entries["https://x/1"] == "1999-01-01"  # now only listed by c.xml
+    assert load_cache(cache_path)["https://x/a.xml"]["etag"] == '"a2"'
+
+
+def test_fresh_cache_entries_skip_the_network(tmp_path, server) -> None:
+    cache_path = str(tmp_path / "cache.json")
+    first = _load(SitemapLoader(cache_path))
+    server.requests.clear()
+
+    loader = SitemapLoader(cache_path, max_age=3600)
+    assert _load(loader) == first
+    assert server.requests == []
+    assert loader.stats["cached"] == 4
+
+
+def test_failed_fetch_falls_back_to_the_cached_copy(tmp_path, server) -> None:
+    cache_path = str(tmp_path / "cache.json")
+    first = _load(SitemapLoader(cache_path))
+    del server.docs["https://x/a.xml"]
+
+    loader = SitemapLoader(cache_path)
+    assert _load(loader) == first
+    assert loader.stats["failed"] == 1
+    assert "https://x/a.xml" in load_cache(cache_path)
+
+
+def test_unavailable_uncached_root_raises(tmp_path, server) -> None:
+    with pytest.raises(RuntimeError, match="unavailable"):
+        _load(SitemapLoader(str(tmp_path / "cache.json")), "https://x/missing.xml")
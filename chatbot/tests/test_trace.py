@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import asyncio
+
+import faiss
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import TextNode
+
+from chatbot import engine
+from chatbot.engine import FaissNodeRetriever, HistoryAwareVectorRetriever
+from chatbot.node_store import NodeStore, write_node_store
+from chatbot.inference import run_inference
+from chatbot.trace import RetrievalTrace, current_trace, use_trace
+
+
+class _SlowRetriever(BaseRetriever):
+    """Records the query on the active trace from the inference pool, after yielding to the loop."""
+
+    def _retrieve(self, query):
+        current_trace().set("seen_by_pool", query)
+        return []
+
+    async def aretrieve(self, query, **kwargs):
+        await asyncio.sleep(0.01)
+        return await run_inference("test_search", self._retrieve, query)
+
+
+def test_concurrent_requests_get_separate_traces() -> None:
+    chain = HistoryAwareVectorRetriever(_SlowRetriever())
+    messages = [f"Frage {i} zum Drucken" for i in range(8)]
+
+    async def request(message):
+        trace = RetrievalTrace(turn="test", message=message)
+        with use_trace(trace):
+            await chain.aretrieve(message)
+        return trace
+
+    async def main():
+        return await asyncio.gather(*(request(m) for m in messages))
+
+    traces = asyncio.run(main())
+    for message, trace in zip(messages, traces):
+        assert trace.get("vector_query").startswith(message)
+        assert trace.get("seen_by_pool").startswith(message)
+        assert trace.counts["vector"] == 0
+        assert "history" in trace.timings_ms
+
+
+def test_untraced_calls_do_not_share_state() -> None:
+    current_trace().set("leak", 1)
+    assert current_trace().get("leak") is None
+
+
+class _CountingEmbedder:
+    def __init__(self):
+        self.queries = []
+
+    def get_query_embedding(self, text):
+        self.queries.append(text)
+        return [0.0, 1.0]
+
+
+def test_vector_search_reuses_the_routed_embedding(tmp_path, monkeypatch) -> None:
+    nodes = [TextNode(id_=f"n{i}", text=t, metadata={"url": f"https://x/{i}"}) for i, t in enumerate(("VPN", "WLAN"))]
+    write_node_store(str(tmp_path), nodes)
+    index = faiss.IndexFlatL2(2)
+    index.add(np.eye(2, dtype="float32"))
+    embedder = _CountingEmbedder()
+    monkeypatch.setattr(engine, "get_embed_model", lambda: embedder)
+    chain = HistoryAwareVectorRetriever(FaissNodeRetriever(index, NodeStore.open(str(tmp_path)), similarity_top_k=1))
+
+    message = "Wie richte ich VPN ein?"
+    trace = RetrievalTrace(turn="test", message=message)
+    trace.embeddings[message] = [1.0, 0.0]
+    with use_trace(trace):
+        hits = asyncio.run(chain.aretrieve(message))
+    assert embedder.queries == []
+    assert trace.get("vector_query") == message
+    assert [h.node.node_id for h in hits] == ["n0"]
+
+    # a follow-up composes history hints and needs its own embedding
+    with use_trace(trace):
+        hits = asyncio.run(chain.aretrieve(message, user_context="Frage zu WLAN Zugang"))
+    assert embedder.queries == [trace.get("vector_query")] and trace.get("vector_query") != message
+    assert [h.node.node_id for h in hits] == ["n1"]
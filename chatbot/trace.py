@@ -0,0 +1,82 @@
+"""Per-request retrieval trace.
+
+The retriever chain is shared by every request, so per-request debug data
+must not live on the retriever instances. Each turn creates a
+``RetrievalTrace`` and activates it with ``use_trace``; the stages look it up
+with ``current_trace()`` and record their inputs, candidate counts and
+timings. Stage timings and candidate counts also go to Prometheus. Query
+embeddings computed earlier in the turn are kept on the trace so that later
+stages reuse them instead of running the embedder again.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from .metrics import RETRIEVAL_CANDIDATES, RETRIEVAL_STAGE_LATENCY
+
+
+@dataclass
+class RetrievalTrace:
+    turn: str = ""
+    message: str = ""
+    data: Dict[str, Any] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    # query text -> embedding; not part of as_dict()
+    embeddings: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, key: str, value: Any) -> None:
+        self.data[key] = value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.data.get(key, default)
+
+    def count(self, stage: str, n: int) -> None:
+        self.counts[stage] = n
+        RETRIEVAL_CANDIDATES.labels(stage).observe(n)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings_ms[stage] = round(seconds * 1000, 2)
+        RETRIEVAL_STAGE_LATENCY.labels(stage).observe(seconds)
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "turn": self.turn,
+            "message": self.message,
+            **self.data,
+            "candidate_counts": dict(self.counts),
+            "stage_timings_ms": dict(self.timings_ms),
+        }
+
+
+_current: ContextVar[Optional[RetrievalTrace]] = ContextVar("heibot_retrieval_trace", default=None)
+
+
+def current_trace() -> RetrievalTrace:
+    """The active trace, or a throwaway one when retrieval runs untraced."""
+    trace = _current.get()
+    return trace if trace is not None else RetrievalTrace()
+
+
+@contextmanager
+def use_trace(trace: RetrievalTrace):
+    """Activate ``trace`` for the enclosed block.
+
+    Keep the block free of ``yield`` in async generators: each resumption may
+    run in a different context.
+    """
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
@@ -1,7 +1,12 @@
 import asyncio
+import logging
+import os
 import re
+from contextlib import contextmanager
 from urllib.parse import urlparse, urlunparse
 
+logger = logging.getLogger(__name__)
+
 
 def normalize_url(url: str, ignore_params: bool = True) -> str:
     """Normalize URLs by stripping query parameters and trailing slashes."""
@@ -64,3 +69,43 @@ def run_async(coro):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
     return loop.run_until_complete(coro)
+
+
+@contextmanager
+def atomic_write_path(path: str):
+    """Yield a temporary path that atomically replaces ``path`` on success.
+
+    Processes that still mmap the old file keep reading the old inode, so
+    index files can be rewritten underneath running workers.
+    """
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def env_int(name: str, default: int) -> int:
+    """Integer environment variable; unset or malformed values give ``default``."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning("Invalid %s=%s (expected int); using %s", name, value, default)
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    """Float environment variable; unset or malformed values give ``default``."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Invalid %s=%s (expected float); using %s", name, value, default)
+        return default
@@ -0,0 +1,75 @@
+"""Check that importing the legacy chatbot engine stays cheap.
+
+Imports ``chatbot.engine`` in a fresh interpreter, reports the wall time and
+fails if it exceeds the budget or if a model framework was imported eagerly::
+
+    python scripts/check_import_time.py --budget 4.0
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Loaded only by get_embed_model() / get_rerank_model() / warmup()
+FORBIDDEN_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "onnxruntime",
+    "llama_index.embeddings.huggingface",
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import chatbot.engine as engine
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [m for m in %r if m in sys.modules],
+    "models": [n for n in ("_llm", "_embed_model", "_rerank_model") if getattr(engine, n) is not None],
+}))
+"""
+
+
+def measure() -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(PROJECT_ROOT), os.getenv("PYTHONPATH")])))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % (FORBIDDEN_MODULES,)],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=float(os.getenv("HEIBOT_IMPORT_BUDGET_S", "4.0")))
+    args = parser.parse_args(argv)
+
+    result = measure()
+    print(f"import chatbot.engine: {result['seconds']:.2f}s (budget {args.budget:.2f}s)")
+    ok = True
+    if result["seconds"] > args.budget:
+        print("FAIL: over budget")
+        ok = False
+    if result["loaded"]:
+        print(f"FAIL: imported eagerly: {', '.join(result['loaded'])}")
+        ok = False
+    if result["models"]:
+        print(f"FAIL: models constructed at import: {', '.join(result['models'])}")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())